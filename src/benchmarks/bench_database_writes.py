@@ -0,0 +1,78 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.core.database import Database
+
+
+def synthetic_notes(count, vocabulary=500, keywords_per_note=5, content_chars=2000, seed=0):
+    # 关键词从固定词表中抽取，使不同笔记之间共享关键词，接近真实的关联分布
+    rng = random.Random(seed)
+    words = [f"关键词{i}" for i in range(vocabulary)]
+    body = "这是一段用于测试写入速度的正文。" * (content_chars // 16)
+    return [
+        {
+            'title': f"笔记 {i}",
+            'content': f"{i} {body}",
+            'url': f"https://example.com/{i}",
+            'domain': 'example.com',
+            'keywords': rng.sample(words, keywords_per_note),
+        }
+        for i in range(count)
+    ]
+
+
+def write_one_by_one(db, notes):
+    for note in notes:
+        db.add_note(note['title'], note['content'], note['url'], note['domain'], note['keywords'])
+
+
+def write_bulk(db, notes, batch_size):
+    for start in range(0, len(notes), batch_size):
+        db.add_notes(notes[start:start + batch_size])
+
+
+def bench(journal_mode, method, notes, batch_size):
+    # 每次在新的临时目录中建库，避免页缓存和已有数据影响结果
+    with tempfile.TemporaryDirectory() as work_dir:
+        db = Database(os.path.join(work_dir, 'bench.db'), journal_mode=journal_mode)
+        try:
+            start = time.perf_counter()
+            if method == 'add_note':
+                write_one_by_one(db, notes)
+            else:
+                write_bulk(db, notes, batch_size)
+            elapsed = time.perf_counter() - start
+            db.cursor.execute('SELECT COUNT(*) FROM notes')
+            assert db.cursor.fetchone()[0] == len(notes)
+        finally:
+            db.close()
+    return elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="比较逐条写入与批量写入、不同日志模式下的笔记写入吞吐")
+    parser.add_argument('-n', '--notes', type=int, default=2000, help="写入的笔记数")
+    parser.add_argument('-b', '--batch-size', type=int, default=500, help="add_notes 每批的条数")
+    parser.add_argument('-k', '--keywords', type=int, default=5, help="每条笔记的关键词数")
+    parser.add_argument('-c', '--content-chars', type=int, default=2000, help="每条笔记正文的字符数（全文索引的开销随之增长）")
+    parser.add_argument('-j', '--journal-modes', default='WAL,DELETE')
+    parser.add_argument('-m', '--methods', default='add_note,add_notes')
+    args = parser.parse_args(argv)
+
+    notes = synthetic_notes(args.notes, keywords_per_note=args.keywords, content_chars=args.content_chars)
+    print(f"笔记: {len(notes)} 条, 每条 {args.keywords} 个关键词, 批大小 {args.batch_size}")
+    print(f"{'日志模式':<10}{'写入方式':<12}{'总耗时(s)':>12}{'吞吐(条/s)':>14}")
+    for journal_mode in args.journal_modes.split(','):
+        for method in args.methods.split(','):
+            elapsed = bench(journal_mode, method, notes, args.batch_size)
+            print(f"{journal_mode:<10}{method:<12}{elapsed:>12.2f}{len(notes) / elapsed:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
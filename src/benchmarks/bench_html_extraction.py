@@ -0,0 +1,68 @@
+import argparse
+import glob
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.core.html_extractor import EXTRACTORS
+
+
+def synthetic_page(paragraphs=2000):
+    # 没有提供语料目录时，生成一个带导航、脚本和大量正文的页面
+    nav = "<nav>" + "".join(f"<a href='/{i}'>链接 {i}</a>" for i in range(200)) + "</nav>"
+    script = "<script>" + "var x = 1;" * 5000 + "</script>"
+    body = "".join(f"<p>第 {i} 段正文，包含一些文字，用于测试提取速度, and some English words too.</p>" for i in range(paragraphs))
+    return f"<html><head><title>Benchmark</title>{script}</head><body>{nav}<article>{body}</article></body></html>".encode('utf-8')
+
+
+def load_corpus(corpus_dir):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(corpus_dir, '*.htm*'))):
+        with open(path, 'rb') as f:
+            pages.append((os.path.basename(path), f.read()))
+    return pages
+
+
+def bench_engine(extract, pages, repeat):
+    start = time.perf_counter()
+    output_chars = 0
+    for _ in range(repeat):
+        for _, html in pages:
+            _, content = extract(html)
+            output_chars += len(content)
+    elapsed = time.perf_counter() - start
+
+    # tracemalloc 只统计 Python 层分配，lxml 在 C 层的内存不计入
+    tracemalloc.start()
+    for _, html in pages:
+        extract(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, output_chars // repeat, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="比较各正文提取引擎的速度和内存")
+    parser.add_argument('corpus', nargs='?', help="保存的网页目录（*.html）")
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('-e', '--engines', default=','.join(EXTRACTORS))
+    args = parser.parse_args(argv)
+
+    pages = load_corpus(args.corpus) if args.corpus else [('synthetic.html', synthetic_page())]
+    if not pages:
+        parser.error(f"目录中没有网页: {args.corpus}")
+    total_bytes = sum(len(html) for _, html in pages)
+    print(f"语料: {len(pages)} 个页面, {total_bytes / 1024:.0f} KiB, 重复 {args.repeat} 次")
+    print(f"{'引擎':<8}{'每页耗时(ms)':>14}{'吞吐(MiB/s)':>14}{'峰值内存(MiB)':>16}{'输出字符':>12}")
+    for name in args.engines.split(','):
+        elapsed, output_chars, peak = bench_engine(EXTRACTORS[name], pages, args.repeat)
+        per_page_ms = elapsed * 1000 / (len(pages) * args.repeat)
+        throughput = total_bytes * args.repeat / elapsed / (1024 * 1024)
+        print(f"{name:<8}{per_page_ms:>14.2f}{throughput:>14.2f}{peak / (1024 * 1024):>16.1f}{output_chars:>12}")
+
+
+if __name__ == "__main__":
+    main()
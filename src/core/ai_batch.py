@@ -0,0 +1,161 @@
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from src.core.logging_config import logger
+from src.core.database import Database
+from src.core.ai_handler import generate, get_cached_response, AIRequestError, DEFAULT_MODEL, DEFAULT_SYSTEM_MESSAGE
+from src.core.ai_chunking import needs_chunking, split_into_chunks, build_reduce_input, build_reduce_prompt, MAP_PROMPT_TEMPLATE
+
+# 与 DashScope 账号的 QPM 配额保持一致；突发最多 AI_RATE_BURST 个请求
+AI_RATE_LIMIT_RPM = float(os.environ.get('AI_RATE_LIMIT_RPM', 60))
+AI_RATE_BURST = int(os.environ.get('AI_RATE_BURST', 5))
+AI_BATCH_WORKERS = int(os.environ.get('AI_BATCH_WORKERS', 4))
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 2.0
+RETRY_MAX_DELAY = 60.0
+# 每完成这么多条就在一个事务内写回数据库
+FLUSH_SIZE = 20
+
+
+# 令牌桶限流：按固定速率补充令牌，acquire 在令牌不足时阻塞
+class TokenBucket:
+    def __init__(self, rate_per_minute=AI_RATE_LIMIT_RPM, capacity=AI_RATE_BURST):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def call_with_retry(content, prompt, limiter, model=DEFAULT_MODEL, system_message=DEFAULT_SYSTEM_MESSAGE, refresh=False):
+    # 先查缓存，命中时不占用限流令牌；只有真正发出的请求才取令牌
+    # 限流、服务端错误和空结果按指数退避（带抖动）重试
+    if not refresh:
+        cached = get_cached_response(content, prompt, model, system_message)
+        if cached is not None:
+            return cached
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.acquire()
+        try:
+            # 上面已查过缓存，这里直接请求，结果仍写入缓存
+            return generate(content, prompt, model, system_message, refresh=True)
+        except AIRequestError as e:
+            if not e.is_retryable() or attempt == MAX_RETRIES:
+                raise
+            delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)) * random.uniform(0.5, 1.0)
+            logger.warning(f"请求失败，{delay:.1f} 秒后重试: {e}")
+            time.sleep(delay)
+
+
+def process_note(content, prompt, limiter, model=DEFAULT_MODEL, refresh=False):
+    # 长笔记在本线程内分段处理后汇总；各请求都经过同一个限流器
+    if not needs_chunking(content):
+        return call_with_retry(content, prompt, limiter, model, refresh=refresh)
+    map_prompt = MAP_PROMPT_TEMPLATE.format(prompt=prompt)
+    partials = [call_with_retry(chunk, map_prompt, limiter, model, refresh=refresh) for chunk in split_into_chunks(content)]
+    return call_with_retry(build_reduce_input(partials), build_reduce_prompt(prompt), limiter, model, refresh=refresh)
+
+
+def run_ai_batch(db, batch_id, max_workers=AI_BATCH_WORKERS, limiter=None, retry_failed=False, refresh=False,
+                 progress_callback=None, should_stop=None):
+    # 处理批次中未完成的笔记；可重复调用，已完成的条目不会重新请求
+    # 数据库只在调用线程中访问，工作线程只负责调用模型
+    batch = db.get_ai_batch(batch_id)
+    if batch is None:
+        raise ValueError(f"批量任务不存在: {batch_id}")
+    db.skip_deleted_ai_batch_items(batch_id)
+    items = db.get_pending_ai_batch_items(batch_id, retry_failed=retry_failed)
+    limiter = limiter or TokenBucket()
+    pending_results = []
+    done = 0
+    stopped = False
+
+    def flush():
+        if pending_results:
+            db.record_ai_batch_results(batch_id, batch['prompt'], pending_results)
+            pending_results.clear()
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {executor.submit(process_note, item['content'] or '', batch['prompt'], limiter, batch['model'], refresh): item['note_id']
+                   for item in items}
+        for future in as_completed(futures):
+            note_id = futures[future]
+            try:
+                pending_results.append((note_id, future.result(), None))
+            except Exception as e:
+                logger.warning(f"批量 AI 处理笔记 {note_id} 失败: {e}")
+                pending_results.append((note_id, None, str(e)))
+            done += 1
+            if len(pending_results) >= FLUSH_SIZE:
+                flush()
+            if progress_callback:
+                progress_callback(done, len(items))
+            if should_stop and should_stop():
+                stopped = True
+                break
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        flush()
+
+    if not stopped and not db.get_ai_batch(batch_id)['pending']:
+        db.finish_ai_batch(batch_id)
+    return db.get_ai_batch(batch_id)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="对匹配关键词或搜索条件的笔记批量调用大模型")
+    parser.add_argument('query', nargs='?', help="关键词或搜索词")
+    parser.add_argument('-p', '--prompt', help="应用到每条笔记的 prompt")
+    parser.add_argument('--db', default='notes.db', help="数据库路径")
+    parser.add_argument('--model', default=DEFAULT_MODEL)
+    parser.add_argument('--resume', type=int, help="继续未完成的批次")
+    parser.add_argument('--retry-failed', action='store_true', help="继续时重新处理失败的条目")
+    parser.add_argument('--list', action='store_true', help="列出未完成的批次")
+    parser.add_argument('-w', '--workers', type=int, default=AI_BATCH_WORKERS, help="并发数")
+    args = parser.parse_args(argv)
+
+    db = Database(args.db)
+    try:
+        if args.list:
+            for batch in db.get_unfinished_ai_batches():
+                print(f"{batch['id']}\t待处理 {batch['pending']}\t完成 {batch['done']}\t失败 {batch['failed']}\t{batch['query']}\t{batch['prompt']}")
+            return 0
+        if args.resume:
+            batch_id = args.resume
+        else:
+            if not args.query or not args.prompt:
+                parser.error("需要提供搜索词和 --prompt，或使用 --resume")
+            note_ids = db.get_note_ids_matching(args.query)
+            if not note_ids:
+                print("没有匹配的笔记", file=sys.stderr)
+                return 1
+            batch_id = db.create_ai_batch(args.prompt, args.model, note_ids, query=args.query)
+            print(f"已创建批次 {batch_id}: {len(note_ids)} 条笔记", file=sys.stderr)
+
+        batch = run_ai_batch(db, batch_id, max_workers=args.workers, retry_failed=args.retry_failed,
+                             progress_callback=lambda done, total: print(f"[{done}/{total}]", file=sys.stderr))
+        print(f"批次 {batch_id}: 完成 {batch['done']}，失败 {batch['failed']}，待处理 {batch['pending']}", file=sys.stderr)
+        return 1 if batch['failed'] else 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
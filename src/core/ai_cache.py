@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from src.utils.file_utils import data_path
+
+# 未设置时为数据库所在目录下的 ai_cache.db
+AI_CACHE_PATH = os.environ.get('AI_CACHE_PATH')
+# 最多保留的条目数，超出时按最近访问时间淘汰；TTL 为 0 表示永不过期
+AI_CACHE_MAX_ENTRIES = int(os.environ.get('AI_CACHE_MAX_ENTRIES', 2000))
+AI_CACHE_TTL = float(os.environ.get('AI_CACHE_TTL', 0))
+
+_cache = None
+_lock = threading.Lock()
+
+
+def make_cache_key(content, prompt, model, system_message):
+    payload = json.dumps([content, prompt, model, system_message], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+# 大模型响应缓存：相同的内容、prompt、模型和系统消息直接返回上次的结果
+class AICache:
+    def __init__(self, path=None, max_entries=AI_CACHE_MAX_ENTRIES, ttl=AI_CACHE_TTL):
+        self.path = path or AI_CACHE_PATH or data_path('ai_cache.db')
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        with self.lock:
+            self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS ai_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT,
+                created_at REAL,
+                last_access REAL
+            )
+            ''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_ai_cache_last_access ON ai_cache(last_access)')
+            self.conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute('SELECT response, created_at FROM ai_cache WHERE key = ?', (key,)).fetchone()
+            if row is not None and self.ttl and now - row[1] > self.ttl:
+                self.conn.execute('DELETE FROM ai_cache WHERE key = ?', (key,))
+                self.conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute('UPDATE ai_cache SET last_access = ? WHERE key = ?', (now, key))
+            self.conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, model, response):
+        now = time.time()
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO ai_cache (key, model, response, created_at, last_access) VALUES (?, ?, ?, ?, ?)',
+                              (key, model, response, now, now))
+            self.evict()
+            self.conn.commit()
+
+    def evict(self):
+        # 调用方持有锁；先清理过期条目，再按最近访问时间淘汰超出上限的部分
+        if self.ttl:
+            self.conn.execute('DELETE FROM ai_cache WHERE created_at < ?', (time.time() - self.ttl,))
+        count = self.conn.execute('SELECT COUNT(*) FROM ai_cache').fetchone()[0]
+        if count > self.max_entries:
+            self.conn.execute('''
+            DELETE FROM ai_cache WHERE key IN (
+                SELECT key FROM ai_cache ORDER BY last_access LIMIT ?
+            )
+            ''', (count - self.max_entries,))
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute('DELETE FROM ai_cache')
+            self.conn.commit()
+
+    def stats(self):
+        with self.lock:
+            entries = self.conn.execute('SELECT COUNT(*) FROM ai_cache').fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': entries
+        }
+
+
+def get_ai_cache():
+    global _cache
+    with _lock:
+        if _cache is None:
+            _cache = AICache()
+        return _cache
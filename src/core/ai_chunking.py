@@ -0,0 +1,126 @@
+import hashlib
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from src.core.ai_handler import call_ai_model, DEFAULT_MODEL, DEFAULT_SYSTEM_MESSAGE
+
+# 每段的 token 预算（为 prompt 和输出留出余量）以及同时进行的模型调用数
+CHUNK_TOKEN_BUDGET = int(os.environ.get('AI_CHUNK_TOKENS', 6000))
+AI_MAX_CONCURRENCY = int(os.environ.get('AI_MAX_CONCURRENCY', 4))
+
+# map 阶段的 prompt 不包含段号：段落位置变化时，内容未变的段仍能命中缓存
+MAP_PROMPT_TEMPLATE = "以下内容是一篇长文档中的一部分。请只根据这一部分完成任务，输出简洁的要点，供之后汇总使用。\n\n任务: {prompt}"
+REDUCE_PROMPT_TEMPLATE = "以下是对一篇长文档各部分分别处理得到的结果，按原文顺序排列。请将它们汇总为一个完整的回答。\n\n任务: {prompt}"
+
+CJK_PATTERN = re.compile(r'[\u3000-\u9fff\uac00-\ud7af\uff00-\uffef]')
+
+
+def estimate_tokens(text):
+    # 粗略估计：中日韩字符约一个 token，其余字符约四个一个 token
+    cjk = len(CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk) // 4 + 1
+
+
+def split_oversized(text, max_tokens):
+    # 单个段落超出预算时先按行切分，单行仍超出则按字符硬切
+    pieces = []
+    for line in text.split('\n'):
+        if estimate_tokens(line) <= max_tokens:
+            pieces.append(line)
+            continue
+        step = max(1, len(line) * max_tokens // estimate_tokens(line))
+        pieces.extend(line[start:start + step] for start in range(0, len(line), step))
+    return pieces
+
+
+def is_chunk_boundary(unit, tokens, target_tokens):
+    # 由段落自身的内容决定其后是否切分（内容定义的切分点），与它在全文中的位置无关：
+    # 前面的段落被修改后，后面的切分点不变，各段文本和缓存键也就不变。概率按段落长度加权，平均每段约 target_tokens
+    digest = hashlib.blake2b(unit.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') / 2 ** 64 < tokens / target_tokens
+
+
+def split_into_chunks(content, max_tokens=CHUNK_TOKEN_BUDGET):
+    # 以空行（段落/页）为单位，在内容定义的切分点处分段；每段不少于预算的 1/4（避免过碎），超出预算时强制切分，
+    # 强制切分只影响到下一个切分点为止
+    units = []
+    for paragraph in re.split(r'\n\s*\n', content):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph) > max_tokens:
+            units.extend(split_oversized(paragraph, max_tokens))
+        else:
+            units.append(paragraph)
+
+    target_tokens = max_tokens // 2
+    min_tokens = max_tokens // 4
+    chunks = []
+    current = []
+    current_tokens = 0
+    for unit in units:
+        tokens = estimate_tokens(unit)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append("\n\n".join(current))
+            current = []
+            current_tokens = 0
+        current.append(unit)
+        current_tokens += tokens
+        if current_tokens >= min_tokens and is_chunk_boundary(unit, tokens, target_tokens):
+            chunks.append("\n\n".join(current))
+            current = []
+            current_tokens = 0
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def needs_chunking(content, max_tokens=CHUNK_TOKEN_BUDGET):
+    return estimate_tokens(content) > max_tokens
+
+
+def map_chunks(chunks, prompt, model=DEFAULT_MODEL, system_message=DEFAULT_SYSTEM_MESSAGE, refresh=False,
+               max_workers=AI_MAX_CONCURRENCY, progress_callback=None):
+    # 并发处理各段，结果按原文顺序返回；每段结果经 call_ai_model 缓存，重跑时只重新计算变化的段
+    map_prompt = MAP_PROMPT_TEMPLATE.format(prompt=prompt)
+    results = [None] * len(chunks)
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {executor.submit(call_ai_model, chunk, map_prompt, model, system_message, True, refresh): index
+                   for index, chunk in enumerate(chunks)}
+        done = 0
+        for future in as_completed(futures):
+            index = futures[future]
+            result = future.result()
+            if not result:
+                raise RuntimeError(f"第 {index + 1}/{len(chunks)} 段处理失败")
+            results[index] = result
+            done += 1
+            if progress_callback:
+                progress_callback(done, len(chunks))
+    finally:
+        # 出错或被取消时不再启动排队中的段
+        executor.shutdown(wait=False, cancel_futures=True)
+    return results
+
+
+def build_reduce_input(partials):
+    return "\n\n".join(f"[第 {index + 1} 部分]\n{partial}" for index, partial in enumerate(partials))
+
+
+def build_reduce_prompt(prompt):
+    return REDUCE_PROMPT_TEMPLATE.format(prompt=prompt)
+
+
+def map_reduce_ai(content, prompt, model=DEFAULT_MODEL, system_message=DEFAULT_SYSTEM_MESSAGE, refresh=False,
+                  max_tokens=CHUNK_TOKEN_BUDGET, max_workers=AI_MAX_CONCURRENCY, progress_callback=None):
+    # 短内容直接调用；长内容先分段 map，再用一次调用 reduce。失败时返回 None
+    if not needs_chunking(content, max_tokens):
+        return call_ai_model(content, prompt, model, system_message, refresh=refresh)
+    try:
+        chunks = split_into_chunks(content, max_tokens)
+        partials = map_chunks(chunks, prompt, model, system_message, refresh, max_workers, progress_callback)
+        return call_ai_model(build_reduce_input(partials), build_reduce_prompt(prompt), model, system_message, refresh=refresh)
+    except Exception as e:
+        print(f"分段调用 AI 模型时出错: {e}")
+        return None
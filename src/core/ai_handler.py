@@ -2,29 +2,100 @@ import dashscope
 from http import HTTPStatus
 import os
 from dotenv import load_dotenv
+from src.core.ai_cache import get_ai_cache, make_cache_key
 
 load_dotenv()
 
 API_KEY = os.getenv('DASHSCOPE_API_KEY')
 dashscope.api_key = API_KEY
 
-def call_ai_model(content, prompt):
+DEFAULT_MODEL = 'qwen-turbo'
+DEFAULT_SYSTEM_MESSAGE = 'You are a helpful assistant.'
+# 请求成功但没有返回文本时使用的错误码，按可重试的失败处理，不写入缓存
+EMPTY_RESPONSE_CODE = 'EmptyResponse'
+
+def build_messages(content, prompt, system_message):
+    return [
+        {'role': 'system', 'content': system_message},
+        {'role': 'user', 'content': f"Content: {content}\n\nPrompt: {prompt}"}
+    ]
+
+class AIRequestError(Exception):
+    def __init__(self, status_code, code, message):
+        super().__init__(f'调用失败: {code}, {message}')
+        self.status_code = status_code
+        self.code = code
+
+    def is_throttled(self):
+        # 限流（429 / Throttling.*）和服务端错误可以重试，参数错误等不应重试
+        return (self.status_code == HTTPStatus.TOO_MANY_REQUESTS
+                or (self.status_code or 0) >= 500
+                or str(self.code or '').startswith('Throttling'))
+
+    def is_retryable(self):
+        return self.is_throttled() or self.code == EMPTY_RESPONSE_CODE
+
+def get_cached_response(content, prompt, model=DEFAULT_MODEL, system_message=DEFAULT_SYSTEM_MESSAGE):
+    return get_ai_cache().get(make_cache_key(content, prompt, model, system_message))
+
+def generate(content, prompt, model=DEFAULT_MODEL, system_message=DEFAULT_SYSTEM_MESSAGE, use_cache=True, refresh=False):
+    # 与 call_ai_model 相同，但失败时抛出 AIRequestError，供需要区分限流并重试的调用方使用
+    cache = get_ai_cache() if use_cache else None
+    cache_key = make_cache_key(content, prompt, model, system_message)
+    if cache and not refresh:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    response = dashscope.Generation.call(
+        model=model,
+        messages=build_messages(content, prompt, system_message),
+    )
+
+    if response.status_code != HTTPStatus.OK:
+        raise AIRequestError(response.status_code, response.code, response.message)
+    text = response.output.text if response.output else None
+    if not text:
+        raise AIRequestError(response.status_code, EMPTY_RESPONSE_CODE, '模型没有返回内容')
+    if cache:
+        cache.put(cache_key, model, text)
+    return text
+
+def call_ai_model(content, prompt, model=DEFAULT_MODEL, system_message=DEFAULT_SYSTEM_MESSAGE, use_cache=True, refresh=False):
+    # refresh=True 时跳过缓存查询重新调用，但仍用新结果覆盖缓存
     try:
-        messages = [
-            {'role': 'system', 'content': 'You are a helpful assistant.'},
-            {'role': 'user', 'content': f"Content: {content}\n\nPrompt: {prompt}"}
-        ]
-        
-        response = dashscope.Generation.call(
-            model='qwen-turbo',
-            messages=messages,
-        )
-        
-        if response.status_code == HTTPStatus.OK:
-            return response.output.text
-        else:
-            print(f'调用失败: {response.code}, {response.message}')
-            return None
+        return generate(content, prompt, model, system_message, use_cache, refresh)
+    except AIRequestError as e:
+        print(str(e))
+        return None
     except Exception as e:
         print(f"调用 AI 模型时出错: {e}")
         return None
+
+def stream_ai_model(content, prompt, model=DEFAULT_MODEL, system_message=DEFAULT_SYSTEM_MESSAGE, use_cache=True, refresh=False):
+    # 逐块产出增量文本；缓存命中时一次性产出完整结果。只有完整生成的结果才写入缓存
+    cache = get_ai_cache() if use_cache else None
+    cache_key = make_cache_key(content, prompt, model, system_message)
+    if cache and not refresh:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+
+    responses = dashscope.Generation.call(
+        model=model,
+        messages=build_messages(content, prompt, system_message),
+        stream=True,
+        incremental_output=True,
+    )
+    chunks = []
+    for response in responses:
+        if response.status_code != HTTPStatus.OK:
+            raise AIRequestError(response.status_code, response.code, response.message)
+        text = response.output.text
+        if text:
+            chunks.append(text)
+            yield text
+
+    if cache and chunks:
+        cache.put(cache_key, model, ''.join(chunks))
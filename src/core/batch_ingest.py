@@ -0,0 +1,177 @@
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from urllib.parse import urlparse, unquote
+from src.core.logging_config import logger
+from src.core.database import Database
+from src.core.web_scraper import scrape_webpage
+from src.core.pdf_handler import extract_pdf_info
+from src.utils.file_utils import calculate_file_hash
+
+DEFAULT_MAX_WORKERS = 8
+
+
+def format_creation_date(creation_date_str):
+    # 与手动添加笔记时相同的日期处理：无法解析时使用当前 UTC 时间
+    if creation_date_str:
+        try:
+            creation_date = datetime.strptime(creation_date_str, "%Y-%m-%d %H:%M:%S%z")
+        except ValueError:
+            creation_date = datetime.now(timezone.utc)
+    else:
+        creation_date = datetime.now(timezone.utc)
+    return creation_date.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def resolve_source(source):
+    # file:// 链接转换为本地路径，其余原样返回
+    parsed = urlparse(source)
+    if parsed.scheme == 'file':
+        return unquote(parsed.path)
+    return source
+
+
+def is_web_source(source):
+    return urlparse(source).scheme in ('http', 'https')
+
+
+def source_hash(source):
+    # PDF 的去重键是文件内容哈希，在解析之前计算；网页返回 None，按 URL 去重
+    source = resolve_source(source)
+    if is_web_source(source) or not os.path.isfile(source):
+        return None
+    return calculate_file_hash(source, 'sha256')
+
+
+def fetch_source(source, file_hash=None):
+    source = resolve_source(source)
+    if is_web_source(source):
+        result = scrape_webpage(source)
+    elif source.lower().endswith('.pdf'):
+        if not os.path.exists(source):
+            raise FileNotFoundError(f"文件不存在: {source}")
+        result = extract_pdf_info(source, file_hash=file_hash)
+    else:
+        raise ValueError(f"不支持的类型: {source}")
+    if not result:
+        raise RuntimeError(f"无法获取内容: {source}")
+    return result
+
+
+def ingest_batch(db, sources, keywords=None, max_workers=DEFAULT_MAX_WORKERS, progress_callback=None):
+    # 在有界线程池中并发抓取网页和解析 PDF，再通过 add_notes 在一个事务内批量写入
+    # 已导入过的链接或文件（规范化 URL 或文件哈希相同）不再抓取解析，只给已有笔记追加关键词
+    # 正文与已有笔记近似重复（MinHash）的仍然导入，但在 similar_to 中标出最相似的已有笔记 {'id', 'title', 'score'}
+    # 返回与 sources 顺序一致的结果列表：{'source', 'ok', 'note_id', 'title', 'error', 'duplicate', 'similar_to'}
+    results = [{'source': source, 'ok': False, 'note_id': None, 'title': None, 'error': None, 'duplicate': False,
+                'similar_to': None} for source in sources]
+    fetched = {}
+    done = 0
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        hashes = list(executor.map(source_hash, sources))
+        pending = []
+        duplicates = {}
+        for index, source in enumerate(sources):
+            resolved = resolve_source(source)
+            note_id = db.find_duplicate_note(url=resolved if is_web_source(resolved) else None, content_hash=hashes[index])
+            if note_id is None:
+                pending.append(index)
+            else:
+                duplicates[index] = note_id
+                done += 1
+        if progress_callback and done:
+            progress_callback(done, len(sources))
+
+        futures = {executor.submit(fetch_source, sources[index], hashes[index]): index for index in pending}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                fetched[index] = future.result()
+            except Exception as e:
+                results[index]['error'] = str(e)
+                logger.warning(f"批量导入失败: {sources[index]}: {e}")
+            done += 1
+            if progress_callback:
+                progress_callback(done, len(sources))
+    finally:
+        # progress_callback 抛出 JobCancelled 等异常时不再启动排队中的来源，也不等待正在抓取的
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    # 所有写入都在抓取解析结束之后进行，中途取消不会留下部分结果
+    titles = db.get_note_titles(duplicates.values())
+    for index, note_id in duplicates.items():
+        if keywords:
+            db.add_note_keywords(note_id, keywords)
+        results[index].update({'ok': True, 'note_id': note_id, 'duplicate': True, 'title': titles.get(note_id)})
+
+    indexes = sorted(fetched)
+    records = []
+    for index in indexes:
+        item = fetched[index]
+        similar = db.find_near_duplicates(item['content'], limit=1)
+        if similar:
+            results[index]['similar_to'] = similar[0]
+        records.append({
+            'title': item['title'],
+            'content': item['content'],
+            'url': item.get('url'),
+            'domain': item.get('domain'),
+            'author': item.get('author'),
+            'creation_date': format_creation_date(item.get('creation_date')),
+            'file_path': item.get('file_path'),
+            'content_hash': item.get('file_hash'),
+            'keywords': keywords or []
+        })
+
+    note_ids = db.add_notes(records) if records else []
+    for position, index in enumerate(indexes):
+        if note_ids is None:
+            results[index]['error'] = "写入数据库失败"
+            continue
+        results[index].update({'ok': True, 'note_id': note_ids[position], 'title': fetched[index]['title']})
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量导入网页链接和 PDF 文件")
+    parser.add_argument('sources', nargs='*', help="URL 或 PDF 路径")
+    parser.add_argument('-f', '--file', help="从文件读取来源列表，每行一个")
+    parser.add_argument('--db', default='notes.db', help="数据库路径")
+    parser.add_argument('-k', '--keywords', default='', help="为所有笔记添加的关键词，逗号分隔")
+    parser.add_argument('-w', '--workers', type=int, default=DEFAULT_MAX_WORKERS, help="并发数")
+    args = parser.parse_args(argv)
+
+    sources = list(args.sources)
+    if args.file:
+        with open(args.file, 'r', encoding='utf-8') as f:
+            sources.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+    if not sources:
+        parser.error("没有要导入的来源")
+
+    db = Database(args.db)
+    keywords = [kw.strip() for kw in args.keywords.replace('，', ',').split(',') if kw.strip()]
+    try:
+        results = ingest_batch(db, sources, keywords=keywords, max_workers=args.workers,
+                               progress_callback=lambda done, total: print(f"[{done}/{total}]", file=sys.stderr))
+    finally:
+        db.close()
+
+    failed = 0
+    for result in results:
+        if result['ok']:
+            similar = result['similar_to']
+            status = 'DUP' if result['duplicate'] else 'SIM' if similar else 'OK'
+            print(f"{status}\t{result['note_id']}\t{result['source']}\t{result['title']}"
+                  + (f"\t~{similar['id']} {similar['score']:.2f}" if similar else ''))
+        else:
+            failed += 1
+            print(f"FAIL\t-\t{result['source']}\t{result['error']}")
+    print(f"完成: 成功 {len(results) - failed}，失败 {failed}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,9 +4,24 @@ from dotenv import load_dotenv
 from src.core.logging_config import logger
 import sqlite3
 import hashlib
+from src.core.delta_sync import DeltaSync, DEFAULT_CHUNK_SIZE, ManifestConflict
+from src.core.sync_manifest import SyncManifest
+from src.core.transfer import TransferEngine
+from src.core.database import Database, discard_wal_files, reset_database_id
+from src.core.vector_index import discard_vector_file
+from src.utils.file_utils import calculate_file_hash
 
 load_dotenv()  # 加载 .env 文件中的环境变量
 
+
+def scaled_progress(callback, start, end):
+    # 把传输的 (已传字节, 总字节) 换算为 start-end 之间的百分比
+    def progress(consumed_bytes, total_bytes):
+        if total_bytes:
+            callback(start + (end - start) * consumed_bytes // total_bytes)
+    return progress
+
+
 class CloudStorage:
     def __init__(self):
         logger.info("初始化 CloudStorage")
@@ -32,19 +47,61 @@ class CloudStorage:
             logger.error(f"初始化 OSS Bucket 失败: {str(e)}")
             raise
 
-    def upload_database(self):
+        # 增量上传默认开启，设置 OSS_DELTA_SYNC=0 可退回整文件上传（下载总是以云端块清单为准）
+        self.delta_sync_enabled = os.environ.get('OSS_DELTA_SYNC', '1') != '0'
+        chunk_size = int(os.environ.get('OSS_DELTA_CHUNK_SIZE', DEFAULT_CHUNK_SIZE))
+        # 分片大小、并发数由 OSS_PART_SIZE / OSS_TRANSFER_THREADS 配置
+        self.transfer = TransferEngine.from_env(self.bucket, self.local_db_path)
+        self.delta_sync = DeltaSync(self.transfer, self.cloud_db_name, chunk_size)
+        self.sync_manifest = SyncManifest(self.local_db_path)
+
+    def upload_database(self, progress_callback=None, source_path=None):
+        # source_path 可指定本地数据库的一致性快照，默认上传 LOCAL_DB_PATH
+        source_path = source_path or self.local_db_path
+        if self.delta_sync_enabled:
+            try:
+                self.delta_sync.upload(source_path, progress_callback=progress_callback)
+                return
+            except ManifestConflict:
+                # 整文件上传会覆盖其他客户端刚写入的版本，冲突时不能退回
+                raise
+            except Exception as e:
+                logger.warning(f"增量上传失败，改为整文件上传: {str(e)}")
+        self.upload_database_full(progress_callback=progress_callback, source_path=source_path)
+
+    def download_database(self, progress_callback=None):
+        self.download_latest(self.local_db_path, progress_callback=progress_callback)
+        discard_wal_files(self.local_db_path)
+        discard_vector_file(self.local_db_path)
+        reset_database_id(self.local_db_path)
+
+    def download_latest(self, target_path, progress_callback=None):
+        # 增量上传不更新云端的 notes.db，存在块清单时它可能是旧版本：此时只能按清单下载，失败直接抛出，
+        # 不退回整文件下载；只有云端没有块清单（从未增量上传或最后一次是整文件上传）时才下载 notes.db
+        if self.delta_sync.download(target_path, seed_path=self.local_db_path, progress_callback=progress_callback):
+            return
+        logger.info("云端没有块清单，改为整文件下载")
+        if target_path == self.local_db_path:
+            self.download_database_full(progress_callback=progress_callback)
+        else:
+            self.transfer.download_file(self.cloud_db_name, target_path, progress_callback=progress_callback)
+
+    def upload_database_full(self, progress_callback=None, source_path=None):
         logger.info("开始上数据库")
         try:
-            self.bucket.put_object_from_file(self.cloud_db_name, self.local_db_path)
+            self.transfer.upload_file(self.cloud_db_name, source_path or self.local_db_path,
+                                      progress_callback=progress_callback)
             logger.info(f"数据库上传成功: {self.cloud_db_name}")
+            # 整文件上传后块清单已过期，删除它让其他客户端回退到整文件下载
+            self.delta_sync.delete_remote_manifest()
         except oss2.exceptions.OssError as e:
             logger.error(f"数据库上传失败. 错误: {str(e)}", exc_info=True)
             raise
 
-    def download_database(self):
+    def download_database_full(self, progress_callback=None):
         logger.info("开始下载数据库")
         try:
-            self.bucket.get_object_to_file(self.cloud_db_name, self.local_db_path)
+            self.transfer.download_file(self.cloud_db_name, self.local_db_path, progress_callback=progress_callback)
             logger.info(f"数据库下载成功: {self.local_db_path}")
         except oss2.exceptions.OssError as e:
             logger.error(f"数据库下载失败. 错误: {str(e)}", exc_info=True)
@@ -54,20 +111,93 @@ class CloudStorage:
         if not os.path.exists(self.local_db_path):
             logger.info(f"本地数据库不存在，尝试从云端下载: {self.local_db_path}")
             self.download_database()
+            self.record_sync()
         else:
             try:
-                cloud_meta = self.bucket.get_object_meta(self.cloud_db_name)
-                local_mtime = os.path.getmtime(self.local_db_path)
+                cloud_meta = self.get_cloud_database_meta()
+                # WAL 模式下最近的写入在 -wal 文件里，取两者中较新的修改时间
+                local_mtime = max(os.path.getmtime(path) for path in (self.local_db_path, self.local_db_path + '-wal')
+                                  if os.path.exists(path))
                 cloud_mtime = cloud_meta.last_modified
 
                 if cloud_mtime > local_mtime:
-                    logger.info("云端数据库较新，正在下载...")
-                    self.download_database()
+                    # 本地可能有尚未同步的修改，合并云端变更而不是用云端副本覆盖
+                    logger.info("云端数据库较新，正在合并云端变更...")
+                    self.sync_database()
                 else:
                     logger.info("本地数据库是最新的")
             except oss2.exceptions.NoSuchKey:
                 logger.info("云端数据库不存在，将上传本地数据库")
                 self.upload_database()
+                self.record_sync()
+
+    def sync_database(self, db_path=None, progress_callback=None, status_callback=None):
+        # 下载云端数据库到临时文件，把其中的变更合并进本地数据库（默认 LOCAL_DB_PATH），再上传合并后的一致性快照
+        # progress_callback(百分比)：下载占 0-45%，合并 45-55%，上传 55-100%，按实际传输字节推进
+        progress_callback = progress_callback or (lambda percent: None)
+        status_callback = status_callback or (lambda message: None)
+
+        status_callback("正在下载云端变更...")
+        cloud_db_path = self.download_database_temp(progress_callback=scaled_progress(progress_callback, 0, 45))
+        if cloud_db_path is None and self.head_cloud_database() is not None:
+            raise RuntimeError("下载云端数据库失败")
+
+        progress_callback(45)
+        status_callback("正在合并...")
+        db_path = db_path or self.local_db_path
+        local_db = Database(db_path)
+        snapshot_path = db_path + '.upload'
+        try:
+            if cloud_db_path:
+                # 下载的临时库只读取变更，保持原有日志模式，不生成 -wal 文件
+                cloud_db = Database(cloud_db_path, journal_mode=None)
+                try:
+                    local_db.merge_from(cloud_db)
+                finally:
+                    cloud_db.close()
+                    os.remove(cloud_db_path)
+            stat = local_db.snapshot_to(snapshot_path)
+        finally:
+            local_db.close()
+
+        progress_callback(55)
+        status_callback("正在上传...")
+        try:
+            self.upload_database(progress_callback=scaled_progress(progress_callback, 55, 100), source_path=snapshot_path)
+            self.record_sync({
+                'local_hash': calculate_file_hash(snapshot_path),
+                'local_size': stat.st_size,
+                'local_mtime_ns': stat.st_mtime_ns
+            })
+        finally:
+            os.remove(snapshot_path)
+
+    def get_cloud_database_meta(self):
+        # 存在块清单时它代表云端数据库的最新版本
+        try:
+            return self.bucket.get_object_meta(self.delta_sync.manifest_key)
+        except oss2.exceptions.NoSuchKey:
+            pass
+        return self.bucket.get_object_meta(self.cloud_db_name)
+
+    def head_cloud_database(self):
+        try:
+            return self.get_cloud_database_meta()
+        except oss2.exceptions.NoSuchKey:
+            return None
+
+    def needs_sync(self):
+        # 一次 HEAD 请求加本地 stat，只有 stat 变化时才分块重新计算本地哈希
+        cloud_meta = self.head_cloud_database()
+        if cloud_meta is None:
+            return True
+        return self.sync_manifest.local_changed() or self.sync_manifest.cloud_changed(cloud_meta)
+
+    def record_sync(self, local_state=None):
+        try:
+            self.sync_manifest.record(self.head_cloud_database(), local_state)
+        except (OSError, oss2.exceptions.OssError) as e:
+            logger.warning(f"记录同步清单失败: {str(e)}")
 
     def update_cloud_database(self):
         self.upload_database()
@@ -104,11 +234,13 @@ class CloudStorage:
             logger.error(f"获取云端文件哈希值时出错: {str(e)}")
             return None
 
-    def download_database_temp(self):
+    def download_database_temp(self, progress_callback=None):
         temp_path = self.local_db_path + '.temp'
         try:
-            self.bucket.get_object_to_file(self.cloud_db_name, temp_path)
+            # 以本地数据库为种子，只下载发生变化的块
+            self.download_latest(temp_path, progress_callback=progress_callback)
             logger.info(f"临时数据库下载成功: {temp_path}")
+            discard_wal_files(temp_path)
             return temp_path
         except Exception as e:
             logger.error(f"下载临时数据库时出错: {str(e)}")
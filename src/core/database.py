@@ -1,81 +1,514 @@
 import sqlite3
+from contextlib import contextmanager
 from datetime import datetime
 import os
+import uuid
 from src.core.logging_config import logger
+from src.core.migrations import apply_migrations, without_trigger, rebuild_term_stats, NOW_MS_SQL
+from src.core.note_body import compress_text, make_preview, register_functions
+from src.core.text_analysis import TOKENIZER, bigram_term, register_text_functions
+from src.core.vector_index import VectorIndex
+from src.core.minhash import NEAR_DUPLICATE_THRESHOLD, signature, band_buckets, similarity, from_blob, register_minhash_functions
+import numpy as np
+from src.utils.url_utils import normalize_url
+import hashlib
+import json
+
+# SQLite 单条语句的参数个数有上限，IN 查询按此大小分批
+SQL_BATCH_SIZE = 500
+
+# 连接参数：WAL 下读写互不阻塞，synchronous=NORMAL 每次提交不再 fsync；缓存大小按 KiB 计
+DB_JOURNAL_MODE = os.environ.get('DB_JOURNAL_MODE', 'WAL')
+DB_SYNCHRONOUS = os.environ.get('DB_SYNCHRONOUS', 'NORMAL')
+DB_CACHE_SIZE_KB = int(os.environ.get('DB_CACHE_SIZE_KB', 16384))
+DB_MMAP_SIZE = int(os.environ.get('DB_MMAP_SIZE', 64 * 1024 * 1024))
+DB_BUSY_TIMEOUT = float(os.environ.get('DB_BUSY_TIMEOUT', 10))
+
+# 同步时在数据库之间交换的笔记字段（id 是本地自增值，按 uid 对应）
+SYNC_NOTE_FIELDS = ['title', 'content', 'url', 'domain', 'author', 'creation_date', 'file_path', 'ai_prompt', 'ai_response']
+# content 存放在 note_bodies，其余字段是 notes 表的列
+NOTE_COLUMNS = [f for f in SYNC_NOTE_FIELDS if f != 'content']
+
+def discard_wal_files(db_path):
+    # 数据库文件被整体替换（如从云端下载）后，残留的 -wal/-shm 属于旧文件，必须删除
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+
+def reset_database_id(db_path):
+    # 整体下载得到的是其他客户端数据库的副本；删除其标识，下次打开时生成新的，
+    # 避免两个库以同一标识各自分配变更序号，使对端记录的同步水位失效
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            conn.execute("DELETE FROM sync_state WHERE key = 'db_id'")
+    except sqlite3.OperationalError:
+        # 尚未迁移的旧库没有 sync_state，打开时会创建
+        pass
+    finally:
+        conn.close()
+
+
+def escape_like(text):
+    # 配合 ESCAPE '\\' 使用，使 % 和 _ 按字面匹配
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def upsert_keywords(cursor, words):
+    # 批量插入不存在的关键词，再分批取回 id；返回 {word: id}
+    # 不用 ON CONFLICT DO UPDATE ... RETURNING：空更新也会触发同步日志触发器，改动已有关键词的版本
+    words = sorted(set(words))
+    cursor.executemany('INSERT OR IGNORE INTO keywords (word) VALUES (?)', [(word,) for word in words])
+    keyword_ids = {}
+    for start in range(0, len(words), SQL_BATCH_SIZE):
+        batch = words[start:start + SQL_BATCH_SIZE]
+        cursor.execute(f"SELECT id, word FROM keywords WHERE word IN ({', '.join(['?'] * len(batch))})", batch)
+        keyword_ids.update({row['word']: row['id'] for row in cursor.fetchall()})
+    return keyword_ids
+
+
+def link_keywords(cursor, note_id, keywords):
+    # 已存在的关联忽略，用于给已有笔记追加关键词
+    keyword_ids = upsert_keywords(cursor, keywords)
+    cursor.executemany('INSERT OR IGNORE INTO note_keyword (note_id, keyword_id) VALUES (?, ?)',
+                       [(note_id, keyword_ids[word]) for word in dict.fromkeys(keywords)])
+
+
+def lookup_note_ids(cursor, column, values):
+    # 按去重键批量查找已有笔记，返回 {键: note_id}
+    values = sorted({value for value in values if value})
+    found = {}
+    for start in range(0, len(values), SQL_BATCH_SIZE):
+        batch = values[start:start + SQL_BATCH_SIZE]
+        cursor.execute(f"SELECT id, {column} FROM notes WHERE {column} IN ({', '.join(['?'] * len(batch))})", batch)
+        found.update({row[column]: row['id'] for row in cursor.fetchall()})
+    return found
+
+
+def available_url_key(cursor, url, note_id=None):
+    # 同步进来的笔记可能与本地笔记 URL 重复，此时不设去重键，留给去重工具合并，避免违反唯一索引
+    normalized = normalize_url(url)
+    if not normalized:
+        return None
+    cursor.execute('SELECT id FROM notes WHERE normalized_url = ?', (normalized,))
+    row = cursor.fetchone()
+    return normalized if row is None or row['id'] == note_id else None
+
+
+def write_note_body(cursor, note_id, content):
+    # 已有正文时用 UPDATE 而不是 REPLACE，使全文索引触发器能用旧正文删除索引
+    cursor.execute('''
+    INSERT INTO note_bodies (note_id, body) VALUES (?, ?)
+    ON CONFLICT(note_id) DO UPDATE SET body = excluded.body
+    ''', (note_id, compress_text(content)))
+
+
+def note_row_to_dict(row):
+    note = dict(row)
+    # notes.content 是迁移前的旧列，已不再使用
+    note.pop('content', None)
+    note['keywords'] = note['keywords'].split(',') if note['keywords'] else []
+    return note
+
 
 class Database:
-    def __init__(self, db_path='notes.db'):
+    def __init__(self, db_path='notes.db', journal_mode=DB_JOURNAL_MODE):
         self.db_path = db_path
-        self.conn = sqlite3.connect(self.db_path)
+        self.conn = sqlite3.connect(self.db_path, timeout=DB_BUSY_TIMEOUT)
         self.conn.row_factory = sqlite3.Row
+        register_functions(self.conn)
+        register_text_functions(self.conn)
+        register_minhash_functions(self.conn)
         self.cursor = self.conn.cursor()
+        # 向量文件在第一次查询相似笔记时才打开或建立
+        self.vector_index = VectorIndex(self)
+        self.configure_connection(journal_mode)
         self.create_tables()
         self.print_table_info()
 
+    def configure_connection(self, journal_mode=DB_JOURNAL_MODE):
+        # journal_mode 写入数据库文件头，对之后打开它的连接都生效；其余 PRAGMA 只作用于当前连接
+        if journal_mode:
+            self.cursor.execute(f"PRAGMA journal_mode = {journal_mode}")
+        else:
+            self.cursor.execute("PRAGMA journal_mode")
+        self.journal_mode = self.cursor.fetchone()[0].lower()
+        self.cursor.execute(f"PRAGMA synchronous = {DB_SYNCHRONOUS}")
+        self.cursor.execute(f"PRAGMA cache_size = {-DB_CACHE_SIZE_KB}")
+        self.cursor.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+        self.cursor.execute("PRAGMA temp_store = MEMORY")
+
+    @contextmanager
+    def transaction(self):
+        # 多条语句作为一个事务执行：正常结束时提交，出错时回滚并继续抛出
+        # BEGIN IMMEDIATE 一开始就取得写锁，避免 WAL 下读事务升级为写事务时直接返回 SQLITE_BUSY
+        # 已处于事务中时并入外层事务，由外层负责提交
+        cursor = self.conn.cursor()
+        if self.conn.in_transaction:
+            yield cursor
+            return
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            yield cursor
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+
     def create_tables(self):
+        # 表结构由版本化迁移维护，旧数据库打开时自动升级
+        apply_migrations(self)
+        self.ensure_database_id()
+        self.cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'notes_fts'")
+        self.fts_enabled = self.cursor.fetchone() is not None
+        self.cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'note_bigrams'")
+        self.bigrams_enabled = self.cursor.fetchone() is not None
+        if not self.fts_enabled:
+            logger.warning("FTS5 全文索引不可用，搜索将使用 LIKE 查询")
+        # 词频统计由另一台机器（可能没有装 jieba）生成时，分词方式不同，须按本机的方式重建
+        if self.get_corpus_stat('tokenizer') != TOKENIZER:
+            with self.transaction() as cursor:
+                doc_count = rebuild_term_stats(cursor)
+            logger.info(f"已按 {TOKENIZER} 分词重建词频统计: {doc_count} 篇笔记")
+
+    def get_corpus_stat(self, key):
+        self.cursor.execute("SELECT value FROM corpus_stats WHERE key = ?", (key,))
+        row = self.cursor.fetchone()
+        return row[0] if row else None
+
+    def get_term_frequencies(self, terms):
+        # 返回 (笔记总数, {词: 文档频率})；词表以 JSON 数组传入，一条查询取回
         self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS notes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT,
-            content TEXT,
-            url TEXT,
-            domain TEXT,
-            author TEXT,
-            creation_date TEXT,
-            file_path TEXT,
-            ai_prompt TEXT,
-            ai_response TEXT
-        )
-        ''')
+        SELECT term, df FROM term_stats WHERE term IN (SELECT value FROM json_each(?)) AND df > 0
+        ''', (json.dumps(list(terms), ensure_ascii=False),))
+        frequencies = {row['term']: row['df'] for row in self.cursor.fetchall()}
+        return self.get_corpus_stat('doc_count') or 0, frequencies
+
+    def get_columns(self, table):
+        self.cursor.execute(f"PRAGMA table_info({table})")
+        return [row['name'] for row in self.cursor.fetchall()]
 
+    def ensure_column(self, table, column, definition):
+        if column not in self.get_columns(table):
+            self.cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    def get_database_id(self):
+        self.cursor.execute("SELECT value FROM sync_state WHERE key = 'db_id'")
+        row = self.cursor.fetchone()
+        return row['value'] if row else None
+
+    def ensure_database_id(self):
+        self.cursor.execute("INSERT OR IGNORE INTO sync_state (key, value) VALUES ('db_id', lower(hex(randomblob(16))))")
+        self.conn.commit()
+
+    def get_sync_watermark(self, peer_id):
+        # 已从对端数据库 peer_id 合并到的变更序号
+        self.cursor.execute("SELECT value FROM sync_state WHERE key = ?", (f'watermark:{peer_id}',))
+        row = self.cursor.fetchone()
+        return int(row['value']) if row else 0
+
+    def set_sync_watermark(self, peer_id, watermark):
+        self.cursor.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (f'watermark:{peer_id}', str(watermark)))
+        self.conn.commit()
+
+    def get_change_seq(self):
+        self.cursor.execute("SELECT MAX(seq) FROM sync_log")
+        return self.cursor.fetchone()[0] or 0
+
+    def get_changes_since(self, since):
+        # 从 sync_log 中序号大于 since 的记录出发，按主键取回对应的行；已删除的行由墓碑表示
+        fields = [f for f in NOTE_COLUMNS if f in self.get_columns('notes')]
+        self.cursor.execute(f'''
+        SELECT n.uid, n.updated_at, n.version, {', '.join('n.' + f for f in fields)}, note_text(b.body) AS content
+        FROM sync_log l
+        CROSS JOIN notes n ON n.uid = l.row_key
+        LEFT JOIN note_bodies b ON b.note_id = n.id
+        WHERE l.table_name = 'notes' AND l.seq > ?
+        ''', (since,))
+        notes = [dict(row) for row in self.cursor.fetchall()]
         self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS keywords (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            word TEXT UNIQUE
-        )
-        ''')
+        SELECT k.word, k.updated_at, k.version FROM sync_log l CROSS JOIN keywords k ON k.word = l.row_key
+        WHERE l.table_name = 'keywords' AND l.seq > ?
+        ''', (since,))
+        keywords = [dict(row) for row in self.cursor.fetchall()]
+        # note_keyword 和墓碑的 row_key 形如 "前缀/其余部分"，前缀（笔记 uid、表名）中不含 "/"
+        self.cursor.execute('''
+        SELECT n.uid AS note_uid, k.word, nk.updated_at
+        FROM sync_log l
+        CROSS JOIN notes n ON n.uid = substr(l.row_key, 1, instr(l.row_key, '/') - 1)
+        CROSS JOIN keywords k ON k.word = substr(l.row_key, instr(l.row_key, '/') + 1)
+        JOIN note_keyword nk ON nk.note_id = n.id AND nk.keyword_id = k.id
+        WHERE l.table_name = 'note_keyword' AND l.seq > ?
+        ''', (since,))
+        links = [dict(row) for row in self.cursor.fetchall()]
+        self.cursor.execute('''
+        SELECT t.table_name, t.row_key, t.deleted_at
+        FROM sync_log l
+        CROSS JOIN sync_tombstones t
+            ON t.table_name = substr(l.row_key, 1, instr(l.row_key, '/') - 1)
+           AND t.row_key = substr(l.row_key, instr(l.row_key, '/') + 1)
+        WHERE l.table_name = 'sync_tombstones' AND l.seq > ?
+        ''', (since,))
+        tombstones = [dict(row) for row in self.cursor.fetchall()]
+        return {'notes': notes, 'keywords': keywords, 'links': links, 'tombstones': tombstones}
+
+    @staticmethod
+    def change_order_key(row, fields):
+        # 冲突规则：updated_at 较新者胜，其次 version 较大者，最后按内容指纹比较，保证两端结果一致
+        fingerprint = hashlib.sha1(json.dumps([row.get(f) for f in fields], ensure_ascii=False).encode('utf-8')).hexdigest()
+        return (row['updated_at'] or 0, row['version'] or 0, fingerprint)
+
+    def get_tombstone_time(self, table_name, row_key):
+        self.cursor.execute("SELECT deleted_at FROM sync_tombstones WHERE table_name = ? AND row_key = ?", (table_name, row_key))
+        row = self.cursor.fetchone()
+        return row['deleted_at'] if row else None
 
+    def record_tombstone(self, table_name, row_key, deleted_at):
         self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS note_keyword (
-            note_id INTEGER,
-            keyword_id INTEGER,
-            FOREIGN KEY (note_id) REFERENCES notes (id),
-            FOREIGN KEY (keyword_id) REFERENCES keywords (id),
-            PRIMARY KEY (note_id, keyword_id)
-        )
-        ''')
+        INSERT INTO sync_tombstones (table_name, row_key, deleted_at) VALUES (?, ?, ?)
+        ON CONFLICT (table_name, row_key) DO UPDATE SET deleted_at = MAX(deleted_at, excluded.deleted_at)
+        ''', (table_name, row_key, deleted_at))
 
-        self.conn.commit()
+    def get_or_create_keyword_id(self, word):
+        self.cursor.execute('INSERT OR IGNORE INTO keywords (word) VALUES (?)', (word,))
+        self.cursor.execute('SELECT id FROM keywords WHERE word = ?', (word,))
+        return self.cursor.fetchone()['id']
 
-    def add_note(self, title, content, url=None, domain=None, keywords=None, author=None, creation_date=None, file_path=None, ai_prompt=None, ai_response=None):
+    def apply_changes(self, changes):
+        columns = [f for f in NOTE_COLUMNS if f in self.get_columns('notes')]
+        fields = columns + ['content']
+        stats = {'inserted': 0, 'updated': 0, 'deleted': 0, 'skipped': 0}
         try:
-            logger.info(f"Attempting to add note: {title}")
-            logger.info(f"AI Prompt: {ai_prompt}")
-            logger.info(f"AI Response: {ai_response}")
-            
-            self.cursor.execute('''
-            INSERT INTO notes (title, content, url, domain, author, creation_date, file_path, ai_prompt, ai_response)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (title, content, url, domain, author, creation_date, file_path, ai_prompt, ai_response))
-            
-            note_id = self.cursor.lastrowid
-            logger.info(f"Note added successfully with ID: {note_id}")
-
-            if keywords:
-                for word in keywords:
-                    self.cursor.execute('INSERT OR IGNORE INTO keywords (word) VALUES (?)', (word,))
-                    self.cursor.execute('SELECT id FROM keywords WHERE word = ?', (word,))
-                    keyword_id = self.cursor.fetchone()[0]
-                    self.cursor.execute('INSERT INTO note_keyword (note_id, keyword_id) VALUES (?, ?)', (note_id, keyword_id))
+            self.conn.commit()
+            self.cursor.execute('BEGIN IMMEDIATE')
+            for kw in changes['keywords']:
+                self.cursor.execute('SELECT id FROM keywords WHERE word = ?', (kw['word'],))
+                if self.cursor.fetchone():
+                    continue
+                deleted_at = self.get_tombstone_time('keywords', kw['word'])
+                if deleted_at is not None and deleted_at >= kw['updated_at']:
+                    stats['skipped'] += 1
+                    continue
+                self.cursor.execute('INSERT INTO keywords (word, updated_at, version) VALUES (?, ?, ?)',
+                                    (kw['word'], kw['updated_at'], kw['version']))
+
+            for note in changes['notes']:
+                self.cursor.execute(f'''
+                SELECT n.id, n.updated_at, n.version, {', '.join('n.' + f for f in columns)}, note_text(b.body) AS content
+                FROM notes n LEFT JOIN note_bodies b ON b.note_id = n.id
+                WHERE n.uid = ?
+                ''', (note['uid'],))
+                local = self.cursor.fetchone()
+                values = [note.get(f) for f in columns] + [make_preview(note.get('content'))]
+                if local is None:
+                    deleted_at = self.get_tombstone_time('notes', note['uid'])
+                    if deleted_at is not None and deleted_at >= note['updated_at']:
+                        stats['skipped'] += 1
+                        continue
+                    self.cursor.execute(
+                        f"INSERT INTO notes (uid, updated_at, version, {', '.join(columns)}, preview, normalized_url) VALUES ({', '.join(['?'] * (len(columns) + 5))})",
+                        [note['uid'], note['updated_at'], note['version']] + values + [available_url_key(self.cursor, note.get('url'))])
+                    write_note_body(self.cursor, self.cursor.lastrowid, note.get('content'))
+                    stats['inserted'] += 1
+                elif self.change_order_key(note, fields) > self.change_order_key(dict(local), fields):
+                    # 先写正文再更新 notes：UPDATE 中显式带上对方的 updated_at，变更日志触发器不会再次改写
+                    write_note_body(self.cursor, local['id'], note.get('content'))
+                    set_clause = ', '.join([f"{f} = ?" for f in ['updated_at', 'version'] + columns + ['preview', 'normalized_url']])
+                    self.cursor.execute(f"UPDATE notes SET {set_clause} WHERE id = ?",
+                                        [note['updated_at'], note['version']] + values
+                                        + [available_url_key(self.cursor, note.get('url'), local['id']), local['id']])
+                    stats['updated'] += 1
+                else:
+                    stats['skipped'] += 1
+
+            for link in changes['links']:
+                self.cursor.execute('SELECT id FROM notes WHERE uid = ?', (link['note_uid'],))
+                note_row = self.cursor.fetchone()
+                if note_row is None:
+                    continue
+                row_key = f"{link['note_uid']}/{link['word']}"
+                deleted_at = self.get_tombstone_time('note_keyword', row_key)
+                if deleted_at is not None and deleted_at >= link['updated_at']:
+                    continue
+                keyword_id = self.get_or_create_keyword_id(link['word'])
+                self.cursor.execute('SELECT 1 FROM note_keyword WHERE note_id = ? AND keyword_id = ?', (note_row['id'], keyword_id))
+                if self.cursor.fetchone() is None:
+                    self.cursor.execute('INSERT INTO note_keyword (note_id, keyword_id, updated_at) VALUES (?, ?, ?)',
+                                        (note_row['id'], keyword_id, link['updated_at']))
+
+            # 删除优先：本地行的修改时间不晚于删除时间时才删除；先处理笔记，再处理关键词和关联
+            table_order = {'notes': 0, 'keywords': 1, 'note_keyword': 2}
+            for tombstone in sorted(changes['tombstones'], key=lambda t: table_order.get(t['table_name'], 3)):
+                table_name, row_key, deleted_at = tombstone['table_name'], tombstone['row_key'], tombstone['deleted_at']
+                if table_name == 'notes':
+                    self.cursor.execute('SELECT id, updated_at FROM notes WHERE uid = ?', (row_key,))
+                    local = self.cursor.fetchone()
+                    if local and (local['updated_at'] or 0) <= deleted_at:
+                        self.cursor.execute('DELETE FROM note_keyword WHERE note_id = ?', (local['id'],))
+                        self.cursor.execute('DELETE FROM notes WHERE id = ?', (local['id'],))
+                        stats['deleted'] += 1
+                elif table_name == 'keywords':
+                    self.cursor.execute('SELECT id, updated_at FROM keywords WHERE word = ?', (row_key,))
+                    local = self.cursor.fetchone()
+                    if local and (local['updated_at'] or 0) <= deleted_at:
+                        self.cursor.execute('DELETE FROM note_keyword WHERE keyword_id = ?', (local['id'],))
+                        self.cursor.execute('DELETE FROM keywords WHERE id = ?', (local['id'],))
+                elif table_name == 'note_keyword':
+                    note_uid, _, word = row_key.partition('/')
+                    self.cursor.execute('''
+                    DELETE FROM note_keyword
+                    WHERE note_id = (SELECT id FROM notes WHERE uid = ?)
+                      AND keyword_id = (SELECT id FROM keywords WHERE word = ?)
+                      AND COALESCE(updated_at, 0) <= ?
+                    ''', (note_uid, word, deleted_at))
+                self.record_tombstone(table_name, row_key, deleted_at)
 
             self.conn.commit()
-            return note_id
+            logger.info(f"合并变更完成: {stats}")
+            return stats
         except sqlite3.Error as e:
-            logger.error(f"添加笔记时出错: {e}")
-            logger.error(f"SQL: INSERT INTO notes (title, content, url, domain, author, creation_date, file_path, ai_prompt, ai_response) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)")
-            logger.error(f"Values: {(title, content, url, domain, author, creation_date, file_path, ai_prompt, ai_response)}")
+            logger.error(f"合并变更时出错: {e}")
             self.conn.rollback()
+            raise
+
+    def merge_from(self, other):
+        # 只拉取另一个库自上次合并以来变更的行，按 updated_at/version 规则合并到本库。
+        # 水位是对方库（以 db_id 区分上传它的客户端）自己分配的变更序号，与各机器的时钟无关
+        peer_id = other.get_database_id()
+        stats = self.apply_changes(other.get_changes_since(self.get_sync_watermark(peer_id)))
+        self.set_sync_watermark(peer_id, other.get_change_seq())
+        return stats
+
+    def find_duplicate_note(self, url=None, content_hash=None, cursor=None):
+        # 规范化 URL 或源文件哈希已存在时返回已有笔记的 id，导入前据此跳过抓取和解析
+        cursor = cursor or self.cursor
+        normalized = normalize_url(url)
+        if not normalized and not content_hash:
             return None
+        cursor.execute('SELECT id FROM notes WHERE normalized_url = ? OR content_hash = ? LIMIT 1', (normalized, content_hash))
+        row = cursor.fetchone()
+        return row['id'] if row else None
+
+    def find_near_duplicates(self, content, threshold=NEAR_DUPLICATE_THRESHOLD, limit=5):
+        # 写入前检查正文是否与已有笔记近似重复（转载、重新导出的 PDF 等）：只取 LSH 同桶的候选笔记比较签名，
+        # 不扫描全部笔记；返回 [{'id', 'title', 'score'}]，score 为估计的 Jaccard 相似度，按降序
+        sig = signature(content)
+        if sig is None:
+            return []
+        self.cursor.execute('''
+        SELECT note_id, signature FROM note_minhash
+        WHERE note_id IN (SELECT note_id FROM minhash_bands WHERE (band, bucket) IN (SELECT key, value FROM json_each(?)))
+        ''', (json.dumps(band_buckets(sig)),))
+        rows = self.cursor.fetchall()
+        if not rows:
+            return []
+        scores = similarity(sig, np.stack([from_blob(row['signature']) for row in rows]))
+        matches = sorted(((row['note_id'], float(score)) for row, score in zip(rows, scores) if score >= threshold),
+                         key=lambda match: match[1], reverse=True)
+        return self.matches_with_titles(matches[:limit])
+
+    def get_minhash_candidate_pairs(self):
+        # LSH 同桶的笔记两两成为候选对 (较小 id, 较大 id)
+        self.cursor.execute('''
+        SELECT DISTINCT a.note_id, b.note_id FROM minhash_bands a
+        JOIN minhash_bands b ON b.band = a.band AND b.bucket = a.bucket AND b.note_id > a.note_id
+        ''')
+        return [(row[0], row[1]) for row in self.cursor.fetchall()]
+
+    def get_minhash_signatures(self):
+        self.cursor.execute("SELECT note_id, signature FROM note_minhash WHERE signature IS NOT NULL")
+        return {row['note_id']: from_blob(row['signature']) for row in self.cursor.fetchall()}
+
+    def add_note(self, title, content, url=None, domain=None, keywords=None, author=None, creation_date=None, file_path=None, ai_prompt=None, ai_response=None, content_hash=None):
+        # 与已有笔记重复时不再插入，只把关键词合并到已有笔记并返回其 id
+        try:
+            with self.transaction() as cursor:
+                note_id = self.find_duplicate_note(url, content_hash, cursor)
+                if note_id is not None:
+                    if keywords:
+                        link_keywords(cursor, note_id, keywords)
+                    logger.info(f"笔记已存在，合并关键词到笔记 {note_id}: {title}")
+                    return note_id
+                cursor.execute('''
+                INSERT INTO notes (title, preview, url, normalized_url, content_hash, domain, author, creation_date, file_path, ai_prompt, ai_response)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (title, make_preview(content), url, normalize_url(url), content_hash, domain, author, creation_date, file_path, ai_prompt, ai_response))
+                note_id = cursor.lastrowid
+                write_note_body(cursor, note_id, content)
+                if keywords:
+                    link_keywords(cursor, note_id, keywords)
+            logger.debug(f"添加笔记成功: {note_id} {title}")
+            return note_id
+        except sqlite3.Error as e:
+            logger.error(f"添加笔记时出错: {e}, 标题: {title}")
+            return None
+
+    def add_notes(self, notes):
+        # 批量写入：一个事务内用 executemany 插入笔记、关键词和关联，返回与输入顺序一致的 note_id 列表
+        # 与库中或本批前面的笔记重复（规范化 URL 或 content_hash 相同）的条目不插入，返回已有笔记的 id 并合并关键词
+        # executemany 拿不到每行的 lastrowid，预先分配 uid 再按 uid 取回 id
+        fields = [f for f in NOTE_COLUMNS if f in self.get_columns('notes')]
+        url_keys = [normalize_url(note.get('url')) for note in notes]
+        hash_keys = [note.get('content_hash') for note in notes]
+        try:
+            with self.transaction() as cursor:
+                existing_urls = lookup_note_ids(cursor, 'normalized_url', url_keys)
+                existing_hashes = lookup_note_ids(cursor, 'content_hash', hash_keys)
+                # targets[i] 为已有笔记的 id，或本批中首次出现的条目下标
+                targets = [None] * len(notes)
+                first_url, first_hash = {}, {}
+                new_indexes = []
+                for index, (url_key, hash_key) in enumerate(zip(url_keys, hash_keys)):
+                    existing = existing_urls.get(url_key) or existing_hashes.get(hash_key)
+                    if existing is not None:
+                        targets[index] = ('note', existing)
+                        continue
+                    first = first_url.get(url_key) if url_key else None
+                    if first is None and hash_key:
+                        first = first_hash.get(hash_key)
+                    if first is not None:
+                        targets[index] = ('batch', first)
+                        continue
+                    targets[index] = ('batch', index)
+                    new_indexes.append(index)
+                    if url_key:
+                        first_url[url_key] = index
+                    if hash_key:
+                        first_hash[hash_key] = index
+
+                uids = {index: uuid.uuid4().hex for index in new_indexes}
+                cursor.executemany(
+                    f"INSERT INTO notes (uid, {', '.join(fields)}, preview, normalized_url, content_hash) VALUES ({', '.join(['?'] * (len(fields) + 4))})",
+                    [[uids[index]] + [notes[index].get(f) for f in fields]
+                     + [make_preview(notes[index].get('content')), url_keys[index], hash_keys[index]] for index in new_indexes])
+                uid_ids = {}
+                uid_list = list(uids.values())
+                for start in range(0, len(uid_list), SQL_BATCH_SIZE):
+                    batch = uid_list[start:start + SQL_BATCH_SIZE]
+                    cursor.execute(f"SELECT id, uid FROM notes WHERE uid IN ({', '.join(['?'] * len(batch))})", batch)
+                    uid_ids.update({row['uid']: row['id'] for row in cursor.fetchall()})
+                cursor.executemany('INSERT INTO note_bodies (note_id, body) VALUES (?, ?)',
+                                   [(uid_ids[uids[index]], compress_text(notes[index].get('content'))) for index in new_indexes])
+
+                note_ids = [target if kind == 'note' else uid_ids[uids[target]] for kind, target in targets]
+                keyword_ids = upsert_keywords(cursor, (word for note in notes for word in (note.get('keywords') or [])))
+                links = {(note_id, keyword_ids[word]) for note_id, note in zip(note_ids, notes) for word in (note.get('keywords') or [])}
+                cursor.executemany('INSERT OR IGNORE INTO note_keyword (note_id, keyword_id) VALUES (?, ?)', sorted(links))
+            logger.info(f"批量添加笔记成功: 新增 {len(new_indexes)} 条，重复 {len(notes) - len(new_indexes)} 条")
+            return note_ids
+        except sqlite3.Error as e:
+            logger.error(f"批量添加笔记时出错: {e}")
+            return None
+
+    def add_note_keywords(self, note_id, keywords):
+        try:
+            with self.transaction() as cursor:
+                link_keywords(cursor, note_id, keywords)
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"添加关键词时出错: {e}")
+            return False
 
     def get_note_by_id(self, note_id):
         self.cursor.execute('''
@@ -88,8 +521,8 @@ class Database:
         ''', (note_id,))
         note = self.cursor.fetchone()
         if note:
-            note_dict = dict(note)
-            note_dict['keywords'] = note_dict['keywords'].split(',') if note_dict['keywords'] else []
+            # 只返回预览，全文用 get_note_content 读取
+            note_dict = note_row_to_dict(note)
             # 确保 ai_prompt 和 ai_response 字段存在
             note_dict['ai_prompt'] = note_dict.get('ai_prompt', '')
             note_dict['ai_response'] = note_dict.get('ai_response', '')
@@ -106,15 +539,82 @@ class Database:
         GROUP BY n.id
         ''', (keyword,))
         notes = self.cursor.fetchall()
-        return [dict(note) for note in notes]
+        return [note_row_to_dict(note) for note in notes]
+
+    def get_note_content(self, note_id):
+        self.cursor.execute('SELECT note_text(body) AS content FROM note_bodies WHERE note_id = ?', (note_id,))
+        row = self.cursor.fetchone()
+        return row['content'] if row else None
+
+    def search_notes(self, keyword, limit=100, snippets=True):
+        # trigram 分词器至少需要 3 个字符，更短的关键词由二元组索引查找
+        # content 为正文中命中关键词的片段。snippet() 要从外部内容表解压正文，SQLite 只为 LIMIT 内的结果计算它；
+        # 只需要 id 的调用方传 snippets=False，直接用预览，不读取正文
+        if 0 < len(keyword) < 3:
+            return self.search_notes_short(keyword, limit)
+        if not self.fts_enabled:
+            return self.search_notes_like(keyword)
+        snippet_sql = "snippet(notes_fts, 1, '', '', '...', 64)" if snippets else "NULL"
+        try:
+            self.cursor.execute(f'''
+            SELECT n.id, n.title, n.url, n.keywords_text AS keywords, substr(n.preview, 1, 200) AS preview,
+                   {snippet_sql} AS snippet
+            FROM notes_fts
+            JOIN notes n ON n.id = notes_fts.rowid
+            WHERE notes_fts MATCH ?
+            ORDER BY bm25(notes_fts, 10.0, 1.0, 5.0)
+            LIMIT ?
+            ''', ('"' + keyword.replace('"', '""') + '"', limit))
+            notes = self.cursor.fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"全文搜索出错，回退到 LIKE 查询: {e}")
+            return self.search_notes_like(keyword)
+        return [
+            {
+                'id': note['id'],
+                'title': note['title'],
+                'url': note['url'],
+                'keywords': note['keywords'].split(',') if note['keywords'] else [],
+                'content': note['snippet'] or note['preview'] or ''
+            }
+            for note in notes
+        ]
+
+    def search_notes_short(self, keyword, limit=100):
+        # 一两个字的关键词：标题和关键词在 notes 行内直接匹配，正文查 note_bigrams 索引，不解压正文。
+        # 两个字即一个二元组；单字按前缀查找以它开头的二元组。标题命中的排在前面，返回的是预览
+        if not self.bigrams_enabled:
+            return self.search_notes_like(keyword)
+        keyword = keyword.lower()
+        term = bigram_term(keyword) + ('' if len(keyword) == 2 else '*')
+        self.cursor.execute('''
+        SELECT n.id, n.title, n.url, n.keywords_text AS keywords, substr(n.preview, 1, 200) AS preview
+        FROM notes n
+        WHERE n.id IN (SELECT rowid FROM note_bigrams WHERE note_bigrams MATCH :term)
+           OR n.title LIKE :pattern ESCAPE '\\' OR n.keywords_text LIKE :pattern ESCAPE '\\'
+        ORDER BY n.title LIKE :pattern ESCAPE '\\' DESC, n.id
+        LIMIT :limit
+        ''', {'term': term, 'pattern': f'%{escape_like(keyword)}%', 'limit': limit})
+        return [
+            {
+                'id': note['id'],
+                'title': note['title'],
+                'url': note['url'],
+                'keywords': note['keywords'].split(',') if note['keywords'] else [],
+                'content': note['preview'] or ''
+            }
+            for note in self.cursor.fetchall()
+        ]
 
-    def search_notes(self, keyword):
+    def search_notes_like(self, keyword):
+        # 没有全文索引可用时只能逐条解压正文匹配；返回的仍是预览
         self.cursor.execute('''
-        SELECT n.id, n.title, n.url, n.content, GROUP_CONCAT(k.word) as keywords
+        SELECT n.id, n.title, n.url, substr(n.preview, 1, 200) AS preview, GROUP_CONCAT(k.word) as keywords
         FROM notes n
+        LEFT JOIN note_bodies b ON b.note_id = n.id
         LEFT JOIN note_keyword nk ON n.id = nk.note_id
         LEFT JOIN keywords k ON nk.keyword_id = k.id
-        WHERE n.title LIKE ? OR n.content LIKE ? OR k.word LIKE ?
+        WHERE n.title LIKE ? OR note_text(b.body) LIKE ? OR k.word LIKE ?
         GROUP BY n.id
         ''', (f'%{keyword}%', f'%{keyword}%', f'%{keyword}%'))
         notes = self.cursor.fetchall()
@@ -124,20 +624,57 @@ class Database:
                 'title': note['title'],
                 'url': note['url'],
                 'keywords': note['keywords'].split(',') if note['keywords'] else [],
-                'content': note['content'][:200]  # 只取前200个字符作为预览
+                'content': note['preview'] or ''
             }
             for note in notes
         ]
 
     def delete_note(self, note_id):
         try:
-            self.cursor.execute('DELETE FROM note_keyword WHERE note_id = ?', (note_id,))
-            self.cursor.execute('DELETE FROM notes WHERE id = ?', (note_id,))
-            self.conn.commit()
+            with self.transaction() as cursor:
+                cursor.execute('DELETE FROM note_keyword WHERE note_id = ?', (note_id,))
+                cursor.execute('DELETE FROM notes WHERE id = ?', (note_id,))
             return True
         except sqlite3.Error as e:
             logger.error(f"删除笔记时出错: {e}")
-            self.conn.rollback()
+            return False
+
+    def merge_duplicate_notes(self, keep_id, duplicate_ids):
+        # 重复笔记的关键词并入保留的笔记，保留笔记没有 AI 结果时用重复笔记的补上，然后删除重复笔记
+        try:
+            with self.transaction() as cursor:
+                for duplicate_id in duplicate_ids:
+                    cursor.execute('''
+                    INSERT OR IGNORE INTO note_keyword (note_id, keyword_id)
+                    SELECT ?, keyword_id FROM note_keyword WHERE note_id = ?
+                    ''', (keep_id, duplicate_id))
+                    cursor.execute('''
+                    UPDATE notes SET ai_prompt = (SELECT ai_prompt FROM notes WHERE id = :dup),
+                                     ai_response = (SELECT ai_response FROM notes WHERE id = :dup)
+                    WHERE id = :keep AND ai_response IS NULL
+                      AND (SELECT ai_response FROM notes WHERE id = :dup) IS NOT NULL
+                    ''', {'keep': keep_id, 'dup': duplicate_id})
+                    cursor.execute('DELETE FROM note_keyword WHERE note_id = ?', (duplicate_id,))
+                    cursor.execute('DELETE FROM notes WHERE id = ?', (duplicate_id,))
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"合并重复笔记时出错: {e}")
+            return False
+
+    def get_note_sources(self):
+        self.cursor.execute('SELECT id, url, file_path, normalized_url, content_hash FROM notes ORDER BY id')
+        return [dict(row) for row in self.cursor.fetchall()]
+
+    def set_note_dedup_keys(self, keys):
+        # keys: [(note_id, normalized_url, content_hash)]；去重键是本地派生列，更新时不记为笔记修改
+        try:
+            with self.transaction():
+                with without_trigger(self, 'notes_journal_au'):
+                    self.cursor.executemany('UPDATE notes SET normalized_url = ?, content_hash = ? WHERE id = ?',
+                                            [(url_key, hash_key, note_id) for note_id, url_key, hash_key in keys])
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"更新去重键时出错: {e}")
             return False
 
     def get_note_id_by_title(self, title):
@@ -168,21 +705,78 @@ class Database:
             logger.error(f"获取所有笔记时出错: {e}")
             return []
 
+    def get_notes_page(self, after_id=0, limit=-1, max_id=None):
+        # 按 id 的键集分页：只取 id 在 (after_id, max_id] 之间的笔记，关键词只对本页聚合
+        try:
+            self.cursor.execute('''
+            SELECT n.id, n.title,
+                   (SELECT GROUP_CONCAT(k.word) FROM note_keyword nk JOIN keywords k ON nk.keyword_id = k.id
+                    WHERE nk.note_id = n.id) AS keywords
+            FROM notes n
+            WHERE n.id > ? AND (? IS NULL OR n.id <= ?)
+            ORDER BY n.id
+            LIMIT ?
+            ''', (after_id, max_id, max_id, limit))
+            return [
+                {
+                    'id': note['id'],
+                    'title': note['title'],
+                    'keywords': note['keywords'].split(',') if note['keywords'] else []
+                }
+                for note in self.cursor.fetchall()
+            ]
+        except sqlite3.Error as e:
+            logger.error(f"分页获取笔记时出错: {e}")
+            return []
+
+    def get_note_titles(self, note_ids):
+        # 返回 {id: title}，IN 查询按 SQL_BATCH_SIZE 分批
+        titles = {}
+        note_ids = list(note_ids)
+        for start in range(0, len(note_ids), SQL_BATCH_SIZE):
+            batch = note_ids[start:start + SQL_BATCH_SIZE]
+            self.cursor.execute(f"SELECT id, title FROM notes WHERE id IN ({','.join('?' * len(batch))})", batch)
+            titles.update({row['id']: row['title'] for row in self.cursor.fetchall()})
+        return titles
+
+    def refresh_vectors(self):
+        # 计算队列中笔记的相似度向量，返回处理的条数；首次使用时会为全部笔记建立向量
+        return self.vector_index.refresh()
+
+    def find_related_notes(self, note_id, limit=10):
+        # 返回与该笔记内容最相似的笔记 [{'id', 'title', 'score'}]，按相似度降序
+        return self.matches_with_titles(self.vector_index.related(note_id, limit))
+
+    def semantic_search(self, text, limit=20):
+        # 按分词后的 TF-IDF 向量检索，不要求子串完全匹配
+        return self.matches_with_titles(self.vector_index.search(text, limit))
+
+    def matches_with_titles(self, matches):
+        titles = self.get_note_titles(note_id for note_id, _ in matches)
+        return [{'id': note_id, 'title': titles[note_id], 'score': score} for note_id, score in matches if note_id in titles]
+
+    def get_note_summary(self, note_id):
+        notes = self.get_notes_page(note_id - 1, 1, note_id)
+        return notes[0] if notes else None
+
     def update_note(self, note_id, **kwargs):
         try:
-            allowed_fields = ['title', 'content', 'url', 'domain', 'author', 'creation_date', 'file_path', 'ai_prompt', 'ai_response']
-            update_fields = {k: v for k, v in kwargs.items() if k in allowed_fields}
-            
-            set_clause = ', '.join([f"{k} = ?" for k in update_fields.keys()])
-            values = list(update_fields.values())
-            values.append(note_id)
-            
-            self.cursor.execute(f"UPDATE notes SET {set_clause} WHERE id = ?", values)
-            self.conn.commit()
+            update_fields = {k: v for k, v in kwargs.items() if k in NOTE_COLUMNS}
+            with self.transaction() as cursor:
+                if 'content' in kwargs:
+                    write_note_body(cursor, note_id, kwargs['content'])
+                    update_fields['preview'] = make_preview(kwargs['content'])
+                if 'url' in kwargs:
+                    update_fields['normalized_url'] = normalize_url(kwargs['url'])
+
+                set_clause = ', '.join([f"{k} = ?" for k in update_fields.keys()])
+                values = list(update_fields.values())
+                values.append(note_id)
+
+                cursor.execute(f"UPDATE notes SET {set_clause} WHERE id = ?", values)
             return True
         except sqlite3.Error as e:
             logger.error(f"更新笔记时出错: {e}")
-            self.conn.rollback()
             return False
 
     def get_all_keywords(self):
@@ -193,7 +787,117 @@ class Database:
             logger.error(f"获取所有关键词时出错: {e}")
             return []
 
+    def get_note_ids_matching(self, query):
+        # 与已有关键词完全相同时按关键词取笔记，否则按全文搜索
+        self.cursor.execute('SELECT id FROM keywords WHERE word = ?', (query,))
+        if self.cursor.fetchone():
+            return [note['id'] for note in self.get_notes_by_keyword(query)]
+        return [note['id'] for note in self.search_notes(query, limit=-1, snippets=False)]
+
+    def create_ai_batch(self, prompt, model, note_ids, query=None):
+        try:
+            with self.transaction() as cursor:
+                cursor.execute(f'INSERT INTO ai_batches (prompt, model, query, created_at) VALUES (?, ?, ?, {NOW_MS_SQL})',
+                               (prompt, model, query))
+                batch_id = cursor.lastrowid
+                cursor.executemany('INSERT OR IGNORE INTO ai_batch_items (batch_id, note_id) VALUES (?, ?)',
+                                   [(batch_id, note_id) for note_id in note_ids])
+            return batch_id
+        except sqlite3.Error as e:
+            logger.error(f"创建批量 AI 任务时出错: {e}")
+            return None
+
+    def get_ai_batch(self, batch_id):
+        self.cursor.execute('''
+        SELECT b.*,
+               SUM(i.status = 'pending' AND n.id IS NOT NULL) AS pending,
+               SUM(i.status = 'done') AS done,
+               SUM(i.status = 'failed') AS failed,
+               SUM(i.status = 'skipped') AS skipped
+        FROM ai_batches b
+        LEFT JOIN ai_batch_items i ON i.batch_id = b.id
+        LEFT JOIN notes n ON n.id = i.note_id
+        WHERE b.id = ?
+        GROUP BY b.id
+        ''', (batch_id,))
+        row = self.cursor.fetchone()
+        return dict(row) if row else None
+
+    def get_unfinished_ai_batches(self):
+        self.cursor.execute('SELECT id FROM ai_batches WHERE finished_at IS NULL ORDER BY id')
+        return [self.get_ai_batch(row['id']) for row in self.cursor.fetchall()]
+
+    def get_pending_ai_batch_items(self, batch_id, retry_failed=False):
+        statuses = ['pending', 'failed'] if retry_failed else ['pending']
+        placeholders = ','.join('?' * len(statuses))
+        self.cursor.execute(f'''
+        SELECT i.note_id, i.attempts, note_text(b.body) AS content
+        FROM ai_batch_items i
+        JOIN notes n ON n.id = i.note_id
+        LEFT JOIN note_bodies b ON b.note_id = i.note_id
+        WHERE i.batch_id = ? AND i.status IN ({placeholders})
+        ORDER BY i.note_id
+        ''', [batch_id] + statuses)
+        return [dict(row) for row in self.cursor.fetchall()]
+
+    def skip_deleted_ai_batch_items(self, batch_id):
+        # 创建批次之后被删除的笔记不再处理，否则这些条目永远停留在待处理，批次无法结束
+        try:
+            with self.transaction() as cursor:
+                cursor.execute('''
+                UPDATE ai_batch_items SET status = 'skipped', error = '笔记已删除'
+                WHERE batch_id = ? AND status IN ('pending', 'failed')
+                  AND NOT EXISTS (SELECT 1 FROM notes n WHERE n.id = ai_batch_items.note_id)
+                ''', (batch_id,))
+                return cursor.rowcount
+        except sqlite3.Error as e:
+            logger.error(f"跳过已删除笔记的批量条目时出错: {e}")
+            return None
+
+    def record_ai_batch_results(self, batch_id, prompt, results):
+        # results: [(note_id, response, error)]，一个事务内写回笔记并更新条目状态
+        try:
+            succeeded = [(prompt, response, note_id) for note_id, response, error in results if error is None]
+            with self.transaction() as cursor:
+                cursor.executemany('UPDATE notes SET ai_prompt = ?, ai_response = ? WHERE id = ?', succeeded)
+                cursor.executemany('''
+                UPDATE ai_batch_items SET status = ?, error = ?, attempts = attempts + 1
+                WHERE batch_id = ? AND note_id = ?
+                ''', [('done' if error is None else 'failed', error, batch_id, note_id) for note_id, _, error in results])
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"写回批量 AI 结果时出错: {e}")
+            return False
+
+    def finish_ai_batch(self, batch_id):
+        self.cursor.execute(f'UPDATE ai_batches SET finished_at = {NOW_MS_SQL} WHERE id = ?', (batch_id,))
+        self.conn.commit()
+
+    def snapshot_to(self, snapshot_path):
+        # WAL 下最新内容可能还在 -wal 文件里，不能直接复制数据库文件：
+        # 先尽量把 WAL 合并回主文件，再用在线备份生成一致的快照，并把快照改回 DELETE 模式，保证上传的是单个完整文件
+        # 返回本地主文件的 stat，供同步清单判断之后是否有新的修改
+        self.conn.commit()
+        self.checkpoint()
+        if os.path.exists(snapshot_path):
+            os.remove(snapshot_path)
+        target = sqlite3.connect(snapshot_path)
+        try:
+            self.conn.backup(target)
+            target.execute('PRAGMA journal_mode = DELETE')
+        finally:
+            target.close()
+        return os.stat(self.db_path)
+
+    def checkpoint(self):
+        # 有其他连接正在读时可能无法截断 WAL，此时返回的 busy 为 1，下次再试即可
+        if self.journal_mode != 'wal':
+            return True
+        busy, _, _ = self.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+        return not busy
+
     def close(self):
+        self.vector_index.close()
         self.conn.close()
 
     def print_table_info(self):
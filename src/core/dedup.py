@@ -0,0 +1,137 @@
+import argparse
+import os
+import sys
+import numpy as np
+from src.core.logging_config import logger
+from src.core.database import Database
+from src.core.minhash import NEAR_DUPLICATE_THRESHOLD, similarity
+from src.utils.file_utils import calculate_file_hash
+from src.utils.url_utils import normalize_url
+
+
+def note_keys(note, hash_files=True):
+    # 旧笔记没有 content_hash 时，源文件仍在本机则现算一次
+    url_key = normalize_url(note['url'])
+    hash_key = note['content_hash']
+    if hash_key is None and hash_files and note['file_path'] and os.path.isfile(note['file_path']):
+        try:
+            hash_key = calculate_file_hash(note['file_path'], 'sha256')
+        except OSError as e:
+            logger.warning(f"计算文件哈希失败: {note['file_path']}: {e}")
+    return url_key, hash_key
+
+
+def union_groups(pairs):
+    # 并查集：相连的 (a, b) 对归为一组，返回成员多于一个的组，每组按 id 升序
+    parent = {}
+
+    def find(note_id):
+        parent.setdefault(note_id, note_id)
+        while parent[note_id] != note_id:
+            parent[note_id] = parent[parent[note_id]]
+            note_id = parent[note_id]
+        return note_id
+
+    for a, b in pairs:
+        root, other = find(a), find(b)
+        if root != other:
+            parent[max(root, other)] = min(root, other)
+
+    groups = {}
+    for note_id in parent:
+        groups.setdefault(find(note_id), []).append(note_id)
+    return sorted(sorted(group) for group in groups.values() if len(group) > 1)
+
+
+def find_duplicate_groups(db, hash_files=True):
+    # 规范化 URL 或文件哈希相同的笔记归为一组（两种键可以传递连接）
+    # 返回 (重复组列表, {note_id: (url_key, hash_key)})，每组按 id 升序，第一条为保留的笔记
+    notes = db.get_note_sources()
+    keys = {note['id']: note_keys(note, hash_files) for note in notes}
+    owners = {}
+    pairs = []
+    for note_id, (url_key, hash_key) in keys.items():
+        for key in (('url', url_key), ('hash', hash_key)):
+            if key[1] is not None:
+                pairs.append((note_id, owners.setdefault(key, note_id)))
+    return union_groups(pairs), keys
+
+
+def find_near_duplicate_groups(db, threshold=NEAR_DUPLICATE_THRESHOLD):
+    # 批量聚类：只比较 LSH 同桶的候选对，一次向量运算算出各对签名的相似度，达到阈值的连成组
+    # 返回 (组列表, {(a, b): 相似度})
+    pairs = db.get_minhash_candidate_pairs()
+    if not pairs:
+        return [], {}
+    signatures = db.get_minhash_signatures()
+    scores = similarity(np.stack([signatures[a] for a, _ in pairs]), np.stack([signatures[b] for _, b in pairs]))
+    similar = {pair: float(score) for pair, score in zip(pairs, scores) if score >= threshold}
+    return union_groups(similar), similar
+
+
+def dedupe_notes(db, dry_run=False, hash_files=True):
+    # 一次性清理：合并重复笔记，再为保留的笔记回填去重键，之后的导入即可直接命中
+    groups, keys = find_duplicate_groups(db, hash_files)
+    if dry_run:
+        return groups
+
+    for group in groups:
+        db.merge_duplicate_notes(group[0], group[1:])
+    merged = set()
+    updates = []
+    for group in groups:
+        keep = group[0]
+        merged.update(group[1:])
+        url_key = next((keys[note_id][0] for note_id in group if keys[note_id][0]), None)
+        hash_key = next((keys[note_id][1] for note_id in group if keys[note_id][1]), None)
+        keys[keep] = (url_key, hash_key)
+    for note in db.get_note_sources():
+        url_key, hash_key = keys.get(note['id'], (None, None))
+        if note['id'] not in merged and (url_key, hash_key) != (note['normalized_url'], note['content_hash']):
+            updates.append((note['id'], url_key, hash_key))
+    db.set_note_dedup_keys(updates)
+    logger.info(f"去重完成: 合并 {len(merged)} 条重复笔记，回填 {len(updates)} 条去重键")
+    return groups
+
+
+def print_near_duplicates(db, threshold):
+    # 近似重复的笔记内容并不完全相同，是否合并由用户决定，这里只列出每组笔记及其与组内其他笔记的最高相似度
+    groups, similar = find_near_duplicate_groups(db, threshold)
+    best = {}
+    for (a, b), score in similar.items():
+        best[a] = max(best.get(a, 0.0), score)
+        best[b] = max(best.get(b, 0.0), score)
+    titles = db.get_note_titles(note_id for group in groups for note_id in group)
+    for number, group in enumerate(groups, 1):
+        for note_id in group:
+            print(f"{number}\t{note_id}\t{best[note_id]:.2f}\t{titles.get(note_id, '')}")
+    print(f"发现 {len(groups)} 组近似重复的笔记，共 {sum(len(group) for group in groups)} 条", file=sys.stderr)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="合并 URL 或源文件相同的重复笔记")
+    parser.add_argument('--db', default='notes.db', help="数据库路径")
+    parser.add_argument('-n', '--dry-run', action='store_true', help="只列出重复的笔记，不做修改")
+    parser.add_argument('--no-hash-files', action='store_true', help="不读取本地源文件计算哈希")
+    parser.add_argument('--near', action='store_true', help="按正文 MinHash 列出近似重复的笔记组（只列出，不合并）")
+    parser.add_argument('--threshold', type=float, default=NEAR_DUPLICATE_THRESHOLD, help="--near 的相似度阈值")
+    args = parser.parse_args(argv)
+
+    db = Database(args.db)
+    try:
+        if args.near:
+            return print_near_duplicates(db, args.threshold)
+        groups = dedupe_notes(db, dry_run=args.dry_run, hash_files=not args.no_hash_files)
+        titles = db.get_note_titles(group[0] for group in groups)
+        for group in groups:
+            print(f"保留 {group[0]}\t合并 {', '.join(str(note_id) for note_id in group[1:])}\t{titles.get(group[0], '')}")
+        action = "发现" if args.dry_run else "已合并"
+        print(f"{action} {len(groups)} 组重复笔记，共 {sum(len(group) - 1 for group in groups)} 条", file=sys.stderr)
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+import hashlib
+import json
+import os
+import threading
+import oss2
+from src.core.logging_config import logger
+from src.core.transfer import ProgressTracker
+
+# SQLite 按页修改文件，固定大小的块（页大小的整数倍）足以定位变化
+DEFAULT_CHUNK_SIZE = 256 * 1024
+MANIFEST_VERSION = 1
+
+
+class ManifestConflict(Exception):
+    pass
+
+
+# 按块增量同步数据库文件：云端保存块清单和以哈希命名的块对象，只传输变化的块
+class DeltaSync:
+    def __init__(self, transfer, cloud_db_name, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.transfer = transfer
+        self.bucket = transfer.bucket
+        self.cloud_db_name = cloud_db_name
+        self.chunk_size = chunk_size
+        self.manifest_key = f"{cloud_db_name}.manifest.json"
+        self.chunk_prefix = f"{cloud_db_name}.chunks/"
+
+    def chunk_key(self, chunk_hash):
+        return self.chunk_prefix + chunk_hash
+
+    def build_manifest(self, file_path):
+        chunks = []
+        size = 0
+        with open(file_path, 'rb') as f:
+            while True:
+                data = f.read(self.chunk_size)
+                if not data:
+                    break
+                chunks.append(hashlib.sha256(data).hexdigest())
+                size += len(data)
+        return {
+            'version': MANIFEST_VERSION,
+            'chunk_size': self.chunk_size,
+            'size': size,
+            'chunks': chunks
+        }
+
+    def read_remote_manifest(self):
+        # 返回 (清单, ETag)；云端没有清单时均为 None，清单版本不兼容时清单为 None 但仍返回 ETag 供条件写入
+        try:
+            result = self.bucket.get_object(self.manifest_key)
+        except oss2.exceptions.NoSuchKey:
+            return None, None
+        manifest = json.loads(result.read())
+        if manifest.get('version') != MANIFEST_VERSION:
+            logger.warning(f"云端块清单版本不兼容: {manifest.get('version')}")
+            return None, result.etag
+        return manifest, result.etag
+
+    def get_remote_manifest(self):
+        return self.read_remote_manifest()[0]
+
+    def put_manifest(self, manifest, etag):
+        # 条件写入：读取后清单被其他客户端改写时 OSS 返回 412；读取时云端没有清单则禁止覆盖，已被创建时返回 409
+        headers = {'If-Match': f'"{etag}"'} if etag else {'x-oss-forbid-overwrite': 'true'}
+        try:
+            self.bucket.put_object(self.manifest_key, json.dumps(manifest), headers=headers)
+        except oss2.exceptions.ServerError as e:
+            if e.status in (409, 412):
+                raise ManifestConflict("云端数据库已被其他客户端更新，请先同步后再上传") from e
+            raise
+
+    def delete_remote_manifest(self):
+        self.bucket.delete_object(self.manifest_key)
+
+    def is_in_sync(self, file_path):
+        remote = self.get_remote_manifest()
+        if remote is None or remote['chunk_size'] != self.chunk_size:
+            return False
+        local = self.build_manifest(file_path)
+        return local['size'] == remote['size'] and local['chunks'] == remote['chunks']
+
+    def upload(self, file_path, progress_callback=None):
+        local = self.build_manifest(file_path)
+        remote, etag = self.read_remote_manifest()
+        # retired 中的块是上一代清单引用、当前清单已不用的块，在被清理前仍在云端，可以直接复用
+        if remote and remote['chunk_size'] == self.chunk_size:
+            remote_chunks = set(remote['chunks']) | set(remote.get('retired', []))
+        else:
+            remote_chunks = set()
+
+        # 断点文件记录已上传的块；块以哈希命名，中断后重试可直接跳过
+        checkpoint_path = os.path.join(self.transfer.checkpoint_dir, 'delta-upload.ckpt')
+        uploaded = set()
+        if os.path.exists(checkpoint_path):
+            with open(checkpoint_path, 'r') as f:
+                uploaded = set(line.strip() for line in f if line.strip())
+
+        pending = {}
+        for index, chunk_hash in enumerate(local['chunks']):
+            if chunk_hash not in remote_chunks and chunk_hash not in uploaded and chunk_hash not in pending:
+                pending[chunk_hash] = index
+        total_bytes = sum(min(self.chunk_size, local['size'] - index * self.chunk_size) for index in pending.values())
+        tracker = ProgressTracker(total_bytes, progress_callback)
+        lock = threading.Lock()
+
+        with open(checkpoint_path, 'a') as checkpoint:
+            def upload_chunk(item):
+                chunk_hash, index = item
+                with open(file_path, 'rb') as f:
+                    f.seek(index * self.chunk_size)
+                    data = f.read(self.chunk_size)
+                self.bucket.put_object(self.chunk_key(chunk_hash), data)
+                with lock:
+                    checkpoint.write(chunk_hash + '\n')
+                    checkpoint.flush()
+                tracker.add(len(data))
+
+            self.transfer.map_parallel(upload_chunk, list(pending.items()))
+
+        # 旧清单中不再引用的块保留一代，记入新清单的 retired：正在按旧清单下载的客户端仍能取到，下次上传时再删除
+        local_chunks = set(local['chunks'])
+        retired = set(remote['chunks']) - local_chunks if remote else set()
+        local['retired'] = sorted(retired)
+        # 所有块上传完成后再写清单，读取方不会看到引用缺失块的清单
+        self.put_manifest(local, etag)
+        os.remove(checkpoint_path)
+        logger.info(f"增量上传完成: {len(pending)}/{len(local['chunks'])} 个块, {total_bytes} 字节")
+
+        if remote:
+            self.delete_chunks(set(remote.get('retired', [])) - local_chunks - retired)
+        return total_bytes
+
+    def delete_chunks(self, chunk_hashes):
+        keys = [self.chunk_key(chunk_hash) for chunk_hash in chunk_hashes]
+        # OSS 批量删除每次最多 1000 个对象
+        for start in range(0, len(keys), 1000):
+            try:
+                self.bucket.batch_delete_objects(keys[start:start + 1000])
+            except oss2.exceptions.OssError as e:
+                logger.warning(f"清理过期数据块失败: {str(e)}")
+
+    def index_local_chunks(self, file_path, manifest):
+        # 记录本地文件中已有的块，下载时可直接复用
+        offsets = {}
+        if not file_path or not os.path.exists(file_path):
+            return offsets
+        wanted = set(manifest['chunks'])
+        chunk_size = manifest['chunk_size']
+        with open(file_path, 'rb') as f:
+            offset = 0
+            while True:
+                data = f.read(chunk_size)
+                if not data:
+                    break
+                chunk_hash = hashlib.sha256(data).hexdigest()
+                if chunk_hash in wanted and chunk_hash not in offsets:
+                    offsets[chunk_hash] = offset
+                offset += len(data)
+        return offsets
+
+    def download(self, target_path, seed_path=None, progress_callback=None):
+        # 云端没有块清单时返回 False；清单存在但无法使用时抛出，调用方不能退回到可能过期的整文件
+        remote, etag = self.read_remote_manifest()
+        if remote is None:
+            if etag is not None:
+                raise ValueError("云端块清单版本不兼容，请升级程序")
+            return False
+
+        chunk_size = remote['chunk_size']
+        chunks = remote['chunks']
+        manifest_id = hashlib.sha256(json.dumps(remote, sort_keys=True).encode('utf-8')).hexdigest()
+        part_path = target_path + '.part'
+        checkpoint_path = part_path + '.ckpt'
+
+        # 同一份清单的下载中断后，从断点文件记录的块继续
+        done = set()
+        if os.path.exists(part_path) and os.path.exists(checkpoint_path):
+            with open(checkpoint_path, 'r') as f:
+                lines = [line.strip() for line in f if line.strip()]
+            if lines and lines[0] == manifest_id:
+                done = set(int(line) for line in lines[1:])
+        if not done:
+            with open(checkpoint_path, 'w') as f:
+                f.write(manifest_id + '\n')
+            with open(part_path, 'wb'):
+                pass
+
+        local_offsets = self.index_local_chunks(seed_path, remote)
+        remaining = [index for index in range(len(chunks)) if index not in done]
+        to_fetch = [index for index in remaining if chunks[index] not in local_offsets]
+        total_bytes = sum(min(chunk_size, remote['size'] - index * chunk_size) for index in to_fetch)
+        tracker = ProgressTracker(total_bytes, progress_callback)
+        lock = threading.Lock()
+
+        with open(part_path, 'r+b') as out, open(checkpoint_path, 'a') as checkpoint:
+            def write_chunk(index, data):
+                with lock:
+                    out.seek(index * chunk_size)
+                    out.write(data)
+                    checkpoint.write(f"{index}\n")
+                    checkpoint.flush()
+
+            if local_offsets:
+                with open(seed_path, 'rb') as seed:
+                    for index in remaining:
+                        if chunks[index] in local_offsets:
+                            seed.seek(local_offsets[chunks[index]])
+                            write_chunk(index, seed.read(chunk_size))
+
+            def fetch_chunk(index):
+                data = self.bucket.get_object(self.chunk_key(chunks[index])).read()
+                if hashlib.sha256(data).hexdigest() != chunks[index]:
+                    raise ValueError(f"数据块校验失败: {chunks[index]}")
+                write_chunk(index, data)
+                tracker.add(len(data))
+
+            self.transfer.map_parallel(fetch_chunk, to_fetch)
+            out.truncate(remote['size'])
+
+        os.replace(part_path, target_path)
+        os.remove(checkpoint_path)
+        logger.info(f"增量下载完成: {target_path}, 下载 {total_bytes}/{remote['size']} 字节")
+        return True
@@ -0,0 +1,163 @@
+import os
+import re
+from bs4 import BeautifulSoup, UnicodeDammit
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:
+    lxml = None
+
+CONTENT_TAGS = ['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6']
+BLOCK_TAGS = CONTENT_TAGS + ['li', 'pre', 'blockquote']
+# 这些子树不含正文，在评分前整体丢弃
+NOISE_TAGS = ['script', 'style', 'noscript', 'iframe', 'svg', 'button']
+# 这些容器可能是导航、页眉页脚，也可能包着整篇正文（ASP.NET 页面常把整个 body 放进 <form>，
+# 标题常在 <header> 里），按 class/id 和链接密度逐个判断，而不是整体丢弃
+CONDITIONAL_TAGS = ['nav', 'aside', 'header', 'footer', 'form', 'div', 'section', 'ul']
+UNLIKELY_RE = re.compile(r'comment|footer|header|menu|nav|sidebar|sponsor|advert|banner|breadcrumb|share|social|related|popup|cookie', re.I)
+LIKELY_RE = re.compile(r'article|body|content|main|post|entry|text', re.I)
+MAX_LINK_DENSITY = 0.5
+MIN_PARAGRAPH_LENGTH = 25
+# 提取逻辑变化时递增，以此为键的缓存结果自动失效
+EXTRACTOR_VERSION = 2
+
+
+def decode_html(content, encoding=None):
+    # encoding 为 HTTP 头 Content-Type 中声明的 charset，优先采用；
+    # 没有时由 UnicodeDammit 依次尝试页面内的 <meta charset>、BOM 和编码猜测
+    if isinstance(content, str):
+        return content
+    dammit = UnicodeDammit(content, known_definite_encodings=[encoding] if encoding else [], is_html=True)
+    if dammit.unicode_markup is None:
+        return content.decode('utf-8', errors='replace')
+    return dammit.unicode_markup
+
+
+def extract_bs4(html):
+    # 原有的提取方式：html.parser 解析后收集所有段落和标题
+    soup = BeautifulSoup(html, 'html.parser')
+
+    title = soup.title.string if soup.title else None
+    lines = []
+    for tag in soup.find_all(CONTENT_TAGS):
+        text = tag.get_text(strip=True)
+        if text:
+            lines.append(text)
+    return (title.strip() if title else ''), "\n".join(lines)
+
+
+def clean_text(text):
+    return ' '.join(text.split())
+
+
+def score_candidates(body):
+    # readability 风格评分：段落文本长度和逗号数累加到父节点，祖父节点得一半
+    scores = {}
+    for block in body.iter('p', 'pre', 'td', 'blockquote'):
+        text = clean_text(block.text_content())
+        if len(text) < MIN_PARAGRAPH_LENGTH:
+            continue
+        score = 1 + text.count(',') + text.count('，') + min(len(text) // 100, 3)
+        parent = block.getparent()
+        if parent is None:
+            continue
+        scores[parent] = scores.get(parent, 0) + score
+        grandparent = parent.getparent()
+        if grandparent is not None:
+            scores[grandparent] = scores.get(grandparent, 0) + score / 2
+    return scores
+
+
+def link_density(element):
+    text_length = len(clean_text(element.text_content()))
+    if not text_length:
+        return 1.0
+    link_length = sum(len(clean_text(link.text_content())) for link in element.iter('a'))
+    return link_length / text_length
+
+
+def is_noise(element):
+    # readability 风格的条件清理：class/id 像导航、评论、广告且不像正文，或大部分文字是链接
+    attributes = f"{element.get('class', '')} {element.get('id', '')}"
+    if UNLIKELY_RE.search(attributes) and not LIKELY_RE.search(attributes):
+        return True
+    return link_density(element) > MAX_LINK_DENSITY
+
+
+def clean_conditionally(body):
+    for element in list(body.iter(*CONDITIONAL_TAGS)):
+        # 祖先已被移除的元素随之丢弃，不必再判断
+        if body in element.iterancestors() and is_noise(element):
+            element.drop_tree()
+
+
+def collect_blocks(element):
+    # 按文档顺序收集块级文本；已被外层块包含的内层块不重复输出
+    lines = []
+    block_tags = set(BLOCK_TAGS)
+    for block in element.iter(*BLOCK_TAGS):
+        parent = block.getparent()
+        nested = False
+        while parent is not None and parent is not element:
+            if parent.tag in block_tags:
+                nested = True
+                break
+            parent = parent.getparent()
+        if nested:
+            continue
+        text = clean_text(block.text_content())
+        if text:
+            lines.append(text)
+    return lines
+
+
+def extract_lxml(html):
+    # 已解码的文本重新按 UTF-8 编码并显式指定解析器编码：lxml 不接受带编码声明的 str，
+    # 而直接交给它字节时只看页面内的 <meta>，会把只在 HTTP 头声明编码的页面当作 latin-1
+    html = decode_html(html)
+    document = lxml.html.document_fromstring(html.encode('utf-8'), parser=lxml.html.HTMLParser(encoding='utf-8'))
+    title_element = document.find('.//title')
+    title = clean_text(title_element.text_content()) if title_element is not None else ''
+
+    etree.strip_elements(document, *NOISE_TAGS, with_tail=False)
+    etree.strip_elements(document, etree.Comment, with_tail=False)
+    body = document.find('body')
+    if body is None:
+        body = document
+    clean_conditionally(body)
+
+    scores = score_candidates(body)
+    best = None
+    if scores:
+        best = max(scores, key=lambda element: scores[element] * (1 - link_density(element)))
+    lines = collect_blocks(best) if best is not None else []
+    # 没有明显的正文容器（如短页面）时退回到整个 body
+    if len(lines) < 2:
+        lines = collect_blocks(body)
+    return title, "\n".join(lines)
+
+
+EXTRACTORS = {'bs4': extract_bs4}
+if lxml is not None:
+    EXTRACTORS['lxml'] = extract_lxml
+
+DEFAULT_ENGINE = os.environ.get('HTML_EXTRACTOR', 'lxml' if lxml is not None else 'bs4')
+
+
+def register_extractor(name, func):
+    # func(html) -> (title, content)
+    EXTRACTORS[name] = func
+
+
+def extractor_id(engine=None):
+    # 标识产生提取结果的引擎和版本，缓存的结果只在两者都相同时复用
+    return f"{engine or DEFAULT_ENGINE}:{EXTRACTOR_VERSION}"
+
+
+def extract_content(html, engine=None):
+    # html 可以是 str，也可以是原始字节（此时按页面内声明的编码解码）
+    engine = engine or DEFAULT_ENGINE
+    if engine not in EXTRACTORS:
+        raise ValueError(f"未知的提取引擎: {engine}")
+    return EXTRACTORS[engine](html)
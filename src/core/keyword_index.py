@@ -0,0 +1,121 @@
+import bisect
+import heapq
+from array import array
+from src.core.logging_config import logger
+
+
+def gallop_search(values, target, low):
+    # 从 low 开始按 1, 2, 4... 步长跳跃，找到包含 target 的区间后二分
+    step = 1
+    high = low
+    while high < len(values) and values[high] < target:
+        low = high + 1
+        high += step
+        step *= 2
+    return bisect.bisect_left(values, target, low, min(high + 1, len(values)))
+
+
+def intersect_sorted(small, large):
+    # 两个有序数组求交：遍历较短的一方，在较长的一方中跳跃查找，长度悬殊时远快于归并
+    if len(small) > len(large):
+        small, large = large, small
+    result = array('l')
+    position = 0
+    for value in small:
+        position = gallop_search(large, value, position)
+        if position >= len(large):
+            break
+        if large[position] == value:
+            result.append(value)
+            position += 1
+    return result
+
+
+def union_sorted(lists):
+    result = array('l')
+    last = None
+    for value in heapq.merge(*lists):
+        if value != last:
+            result.append(value)
+            last = value
+    return result
+
+
+# 关键词 -> 笔记 id 的倒排索引，每个倒排表是有序的紧凑整数数组
+# 启动时从数据库构建一次，之后随写操作增量维护
+class KeywordIndex:
+    def __init__(self):
+        self.postings = {}
+        self.note_keywords = {}
+
+    def build(self, db):
+        self.postings = {}
+        self.note_keywords = {}
+        db.cursor.execute('''
+        SELECT k.word, nk.note_id
+        FROM note_keyword nk
+        JOIN keywords k ON nk.keyword_id = k.id
+        ORDER BY k.word, nk.note_id
+        ''')
+        for word, note_id in db.cursor.fetchall():
+            self.postings.setdefault(word, array('l')).append(note_id)
+            self.note_keywords.setdefault(note_id, set()).add(word)
+        logger.info(f"已构建关键词索引: {len(self.postings)} 个关键词, {len(self.note_keywords)} 条笔记")
+
+    def add(self, note_id, word):
+        posting = self.postings.setdefault(word, array('l'))
+        position = bisect.bisect_left(posting, note_id)
+        if position < len(posting) and posting[position] == note_id:
+            return
+        posting.insert(position, note_id)
+        self.note_keywords.setdefault(note_id, set()).add(word)
+
+    def discard(self, note_id, word):
+        posting = self.postings.get(word)
+        if posting is None:
+            return
+        position = bisect.bisect_left(posting, note_id)
+        if position < len(posting) and posting[position] == note_id:
+            del posting[position]
+            if not posting:
+                del self.postings[word]
+        words = self.note_keywords.get(note_id)
+        if words is not None:
+            words.discard(word)
+            if not words:
+                del self.note_keywords[note_id]
+
+    def set_note_keywords(self, note_id, words):
+        # 用笔记当前的关键词替换索引中的记录
+        old = self.note_keywords.get(note_id, set())
+        new = set(words)
+        for word in old - new:
+            self.discard(note_id, word)
+        for word in new - old:
+            self.add(note_id, word)
+
+    def remove_note(self, note_id):
+        for word in list(self.note_keywords.get(note_id, ())):
+            self.discard(note_id, word)
+
+    def keyword_counts(self):
+        return sorted(((word, len(posting)) for word, posting in self.postings.items()),
+                      key=lambda item: (-item[1], item[0]))
+
+    def notes_for(self, word):
+        return self.postings.get(word, array('l'))
+
+    def query(self, words, mode='and'):
+        # AND 从最短的倒排表开始逐个求交，OR 多路归并去重；结果按 id 升序
+        lists = [self.notes_for(word) for word in words]
+        if not lists:
+            return array('l')
+        if mode == 'or':
+            return union_sorted(lists)
+        lists.sort(key=len)
+        result = lists[0]
+        for posting in lists[1:]:
+            if not result:
+                break
+            result = intersect_sorted(result, posting)
+        return array('l', result)
@@ -1,18 +1,113 @@
-from .database import Database
-from sqlalchemy.orm import joinedload
+import json
+import sqlite3
+from src.core.logging_config import logger
+from src.core.database import upsert_keywords
+from src.core.migrations import NOW_MS_SQL
+
+# 笔记 id 和关键词列表以 JSON 数组传入，由 json_each 展开，每个操作只用少量集合语句完成，不逐条读写笔记
+KEYWORD_IDS_SQL = "SELECT id FROM keywords WHERE word IN (SELECT value FROM json_each(?))"
+
+
+def merge_keyword_links(cursor, source_words, target_word):
+    # 在调用方的事务中执行合并，出错时直接抛出，由外层回滚整个操作，不能留下合并了一半的结果
+    source_words = [word for word in dict.fromkeys(source_words) if word != target_word]
+    if not source_words:
+        return 0
+    target_id = upsert_keywords(cursor, [target_word])[target_word]
+    sources = json.dumps(source_words)
+    cursor.execute(f'''
+    INSERT OR IGNORE INTO note_keyword (note_id, keyword_id)
+    SELECT DISTINCT note_id, ? FROM note_keyword WHERE keyword_id IN ({KEYWORD_IDS_SQL})
+    ''', (target_id, sources))
+    added = cursor.rowcount
+    cursor.execute(f"DELETE FROM note_keyword WHERE keyword_id IN ({KEYWORD_IDS_SQL})", (sources,))
+    cursor.execute("DELETE FROM keywords WHERE word IN (SELECT value FROM json_each(?))", (sources,))
+    return added
+
 
 class KeywordManager:
     def __init__(self, database):
         self.db = database
 
+    def tag_notes(self, note_ids, keywords):
+        # 给多条笔记添加多个关键词，已有的关联忽略；返回新增的关联数
+        keywords = list(dict.fromkeys(keywords))
+        if not keywords:
+            return 0
+        try:
+            with self.db.transaction() as cursor:
+                upsert_keywords(cursor, keywords)
+                cursor.execute(f'''
+                INSERT OR IGNORE INTO note_keyword (note_id, keyword_id)
+                SELECT n.id, k.id FROM notes n, keywords k
+                WHERE n.id IN (SELECT value FROM json_each(?)) AND k.id IN ({KEYWORD_IDS_SQL})
+                ''', (json.dumps(list(note_ids)), json.dumps(keywords)))
+                return cursor.rowcount
+        except sqlite3.Error as e:
+            logger.error(f"批量添加关键词时出错: {e}")
+            return None
+
+    def untag_notes(self, note_ids, keywords):
+        # 从多条笔记上移除多个关键词；返回删除的关联数
+        try:
+            with self.db.transaction() as cursor:
+                cursor.execute(f'''
+                DELETE FROM note_keyword
+                WHERE note_id IN (SELECT value FROM json_each(?)) AND keyword_id IN ({KEYWORD_IDS_SQL})
+                ''', (json.dumps(list(note_ids)), json.dumps(list(keywords))))
+                return cursor.rowcount
+        except sqlite3.Error as e:
+            logger.error(f"批量移除关键词时出错: {e}")
+            return None
+
+    def rename_keyword(self, old_word, new_word):
+        # 新名称已存在时等同于合并；返回受影响的笔记数
+        if old_word == new_word:
+            return 0
+        try:
+            with self.db.transaction() as cursor:
+                cursor.execute('SELECT id FROM keywords WHERE word = ?', (old_word,))
+                row = cursor.fetchone()
+                if row is None:
+                    return 0
+                cursor.execute('SELECT 1 FROM keywords WHERE word = ?', (new_word,))
+                if cursor.fetchone():
+                    return merge_keyword_links(cursor, [old_word], new_word)
+                cursor.execute('UPDATE keywords SET word = ? WHERE id = ?', (new_word, row['id']))
+                # 同步按关键词文本对应关联，改名后要让关联随新名称重新同步
+                cursor.execute(f'UPDATE note_keyword SET updated_at = {NOW_MS_SQL} WHERE keyword_id = ?', (row['id'],))
+                return cursor.rowcount
+        except sqlite3.Error as e:
+            logger.error(f"重命名关键词时出错: {e}")
+            return None
+
+    def merge_keywords(self, source_words, target_word):
+        # 把若干关键词的关联并入目标关键词（不存在则创建），然后删除这些关键词；返回并入后新增的关联数
+        try:
+            with self.db.transaction() as cursor:
+                return merge_keyword_links(cursor, source_words, target_word)
+        except sqlite3.Error as e:
+            logger.error(f"合并关键词时出错: {e}")
+            return None
+
+    def delete_orphan_keywords(self):
+        # 删除没有任何笔记使用的关键词；返回删除的数量
+        try:
+            with self.db.transaction() as cursor:
+                cursor.execute('''
+                DELETE FROM keywords
+                WHERE NOT EXISTS (SELECT 1 FROM note_keyword nk WHERE nk.keyword_id = keywords.id)
+                ''')
+                return cursor.rowcount
+        except sqlite3.Error as e:
+            logger.error(f"删除无用关键词时出错: {e}")
+            return None
+
     def add_keyword_to_note(self, note_id, keyword):
-        note = self.db.get_note_by_id(note_id)
-        if note:
-            keywords = note['keywords']
-            if keyword not in keywords:
-                keywords.append(keyword)
-                return self.db.update_note(note_id, keywords=keywords)
-        return False
+        return bool(self.tag_notes([note_id], [keyword]))
+
+    def remove_keyword_from_note(self, note_id, keyword):
+        return bool(self.untag_notes([note_id], [keyword]))
 
     def get_all_keywords(self):
         return self.db.get_all_keywords()
@@ -23,15 +118,9 @@ class KeywordManager:
     def get_all_notes_with_keywords(self):
         return self.db.get_all_notes_with_keywords()
 
-    def remove_keyword_from_note(self, note_id, keyword):
-        note = self.db.get_note_by_id(note_id)
-        if note:
-            keywords = note['keywords']
-            if keyword in keywords:
-                keywords.remove(keyword)
-                return self.db.update_note(note_id, keywords=keywords)
-        return False
-
     def get_keywords_for_note(self, note_id):
-        note = self.db.get_note_by_id(note_id)
-        return note['keywords'] if note else []
+        self.db.cursor.execute('''
+        SELECT k.word FROM note_keyword nk JOIN keywords k ON nk.keyword_id = k.id
+        WHERE nk.note_id = ? ORDER BY k.word
+        ''', (note_id,))
+        return [row['word'] for row in self.db.cursor.fetchall()]
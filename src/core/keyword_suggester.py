@@ -0,0 +1,60 @@
+import numpy as np
+from collections import Counter
+from src.core.text_analysis import TOKENIZER, STOPWORDS, tokenize, tokenize_runs, tfidf_weights
+
+DEFAULT_SUGGESTIONS = 5
+# 标题中出现的词权重更高
+TITLE_WEIGHT = 3.0
+# 二元组模式下，先取得分最高的这些二元组（正文较长时只取重复出现的），再把正文中相邻的拼成短语
+PHRASE_POOL = 30
+PHRASE_MIN_COUNT = 2
+MAX_PHRASE_CHARS = 8
+
+
+def score_terms(db, text, title=None):
+    # TF-IDF：词频取对数，文档频率来自 term_stats，一次查询加一次向量运算，耗时只与本篇笔记的长度有关
+    runs = tokenize_runs(f"{title}\n{text}" if title else text)
+    counts = Counter(term for run in runs for term in run if term not in STOPWORDS)
+    if not counts:
+        return runs, counts, {}
+    terms = list(counts)
+    doc_count, frequencies = db.get_term_frequencies(terms)
+    title_terms = set(tokenize(title))
+    weights = np.fromiter((TITLE_WEIGHT if term in title_terms else 1.0 for term in terms), dtype=np.float64, count=len(terms))
+    scores = tfidf_weights(terms, counts, doc_count, frequencies) * weights
+    return runs, counts, dict(zip(terms, scores.tolist()))
+
+
+def merge_bigrams(runs, counts, scores):
+    # 没有 jieba 时中文按二元组统计，“机器学习”会拆成“机器”“器学”“学习”；
+    # 把正文中连续出现的高分二元组拼回短语，短语得分取其中二元组的最高分
+    min_count = PHRASE_MIN_COUNT if max(counts.values(), default=0) >= PHRASE_MIN_COUNT else 1
+    candidates = [term for term in scores if counts[term] >= min_count]
+    pool = set(sorted(candidates, key=scores.get, reverse=True)[:PHRASE_POOL])
+    phrases = {}
+    for run in runs:
+        span = []
+        for term in run + [None]:
+            if term in pool and len(span) + 2 <= MAX_PHRASE_CHARS:
+                span.append(term)
+                continue
+            if span:
+                phrase = span[0] + ''.join(bigram[1] for bigram in span[1:])
+                phrases[phrase] = max(phrases.get(phrase, 0.0), max(scores[bigram] for bigram in span))
+            span = [term] if term in pool else []
+    return phrases
+
+
+def suggest_keywords(db, text, title=None, limit=DEFAULT_SUGGESTIONS):
+    runs, counts, scores = score_terms(db, text, title)
+    if TOKENIZER == 'bigram':
+        scores = merge_bigrams(runs, counts, scores)
+    suggestions = []
+    for term in sorted(scores, key=scores.get, reverse=True):
+        # 已选短语的片段（或包含已选词的更长短语）不再重复推荐
+        if any(term in chosen or chosen in term for chosen in suggestions):
+            continue
+        suggestions.append(term)
+        if len(suggestions) >= limit:
+            break
+    return suggestions
@@ -0,0 +1,702 @@
+import sqlite3
+from collections import Counter
+from contextlib import contextmanager
+from src.core.logging_config import logger
+from src.core.note_body import compress_text, make_preview, decompress_text
+from src.core.text_analysis import TOKENIZER, tokenize
+from src.utils.url_utils import normalize_url
+
+# 当前 UTC 时间（毫秒），用于变更日志的 updated_at / deleted_at
+NOW_MS_SQL = "CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)"
+# 本库的下一个变更序号：sync_log 只增不删，取最大值加一即单调递增，与各机器的时钟无关
+NEXT_SEQ_SQL = "(SELECT COALESCE(MAX(seq), 0) + 1 FROM sync_log)"
+
+
+def execute_script(cursor, script):
+    # executescript 会先提交当前事务；逐条执行以保证每个迁移在同一个事务内完成
+    statement = ''
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            cursor.execute(statement)
+            statement = ''
+
+
+@contextmanager
+def without_trigger(db, name):
+    # 暂时移除触发器，结束后按原定义重建；须在事务内使用
+    db.cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?", (name,))
+    row = db.cursor.fetchone()
+    db.cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+    try:
+        yield
+    finally:
+        if row:
+            db.cursor.execute(row[0])
+
+
+def rebuild_term_stats(cursor):
+    # 逐批解压全部正文重新统计文档频率；建表时和分词方式变化后执行一次，之后由触发器增量维护
+    cursor.execute("DELETE FROM term_stats")
+    counts = Counter()
+    doc_count = 0
+    last_id = 0
+    while True:
+        cursor.execute("SELECT note_id, body FROM note_bodies WHERE note_id > ? ORDER BY note_id LIMIT 500", (last_id,))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        for note_id, body in rows:
+            counts.update(set(tokenize(decompress_text(body))))
+        doc_count += len(rows)
+        last_id = rows[-1][0]
+    cursor.executemany("INSERT INTO term_stats (term, df) VALUES (?, ?)", counts.items())
+    cursor.executemany("INSERT OR REPLACE INTO corpus_stats (key, value) VALUES (?, ?)",
+                       [('doc_count', doc_count), ('tokenizer', TOKENIZER)])
+    return doc_count
+
+
+def migrate_base_tables(db):
+    # 旧版本（SQLAlchemy 创建）的数据库缺少 ai_prompt / ai_response 列
+    db.cursor.execute('''
+    CREATE TABLE IF NOT EXISTS notes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT,
+        content TEXT,
+        url TEXT,
+        domain TEXT,
+        author TEXT,
+        creation_date TEXT,
+        file_path TEXT,
+        ai_prompt TEXT,
+        ai_response TEXT
+    )
+    ''')
+
+    db.cursor.execute('''
+    CREATE TABLE IF NOT EXISTS keywords (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        word TEXT UNIQUE
+    )
+    ''')
+
+    db.cursor.execute('''
+    CREATE TABLE IF NOT EXISTS note_keyword (
+        note_id INTEGER,
+        keyword_id INTEGER,
+        FOREIGN KEY (note_id) REFERENCES notes (id),
+        FOREIGN KEY (keyword_id) REFERENCES keywords (id),
+        PRIMARY KEY (note_id, keyword_id)
+    )
+    ''')
+
+    db.ensure_column('notes', 'ai_prompt', 'TEXT')
+    db.ensure_column('notes', 'ai_response', 'TEXT')
+
+
+def migrate_note_keyword_keys(db):
+    # 旧的 note_keyword 没有主键和索引，每次按关键词关联都是全表扫描；
+    # 重建为 (note_id, keyword_id) 主键并去重，再加反向索引和常用查询列的索引
+    db.cursor.execute("SELECT COUNT(*) FROM pragma_index_list('note_keyword') WHERE origin = 'pk'")
+    if db.cursor.fetchone()[0] == 0:
+        # 引用 note_keyword 的触发器随后的迁移会重新创建
+        for trigger in ['note_keyword_fts_ai', 'note_keyword_fts_ad', 'keywords_fts_au',
+                        'note_keyword_journal_ai', 'note_keyword_journal_ad']:
+            db.cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        columns = ['note_id', 'keyword_id'] + [c for c in ['updated_at'] if c in db.get_columns('note_keyword')]
+        extra = ''.join(f"{c} INTEGER,\n" for c in columns[2:])
+        db.cursor.execute(f'''
+        CREATE TABLE note_keyword_new (
+            note_id INTEGER NOT NULL,
+            keyword_id INTEGER NOT NULL,
+            {extra}FOREIGN KEY (note_id) REFERENCES notes (id),
+            FOREIGN KEY (keyword_id) REFERENCES keywords (id),
+            PRIMARY KEY (note_id, keyword_id)
+        )
+        ''')
+        column_list = ', '.join(columns)
+        db.cursor.execute(f'''
+        INSERT OR IGNORE INTO note_keyword_new ({column_list})
+        SELECT {column_list} FROM note_keyword WHERE note_id IS NOT NULL AND keyword_id IS NOT NULL
+        ''')
+        db.cursor.execute("DROP TABLE note_keyword")
+        db.cursor.execute("ALTER TABLE note_keyword_new RENAME TO note_keyword")
+        logger.info("已重建 note_keyword 表并添加主键")
+
+    db.cursor.execute("CREATE INDEX IF NOT EXISTS idx_note_keyword_keyword ON note_keyword (keyword_id, note_id)")
+    db.cursor.execute("CREATE INDEX IF NOT EXISTS idx_notes_url ON notes (url)")
+    db.cursor.execute("CREATE INDEX IF NOT EXISTS idx_notes_title ON notes (title)")
+
+
+def migrate_fts_index(db):
+    # 全文索引：以 notes 表为外部内容，trigram 分词器可以直接匹配中文子串
+    # keywords_text 是关键词的冗余列，由触发器维护，供索引使用
+    try:
+        db.ensure_column('notes', 'keywords_text', 'TEXT')
+        db.cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'notes_fts'")
+        fts_exists = db.cursor.fetchone() is not None
+
+        db.cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+            title, content, keywords_text,
+            content='notes', content_rowid='id',
+            tokenize='trigram'
+        )
+        ''')
+
+        if not fts_exists:
+            # 首次创建索引时回填已有笔记（需在创建触发器之前）
+            db.cursor.execute('''
+            UPDATE notes SET keywords_text = (
+                SELECT GROUP_CONCAT(word) FROM (
+                    SELECT k.word FROM note_keyword nk JOIN keywords k ON nk.keyword_id = k.id
+                    WHERE nk.note_id = notes.id ORDER BY k.word))
+            ''')
+        execute_script(db.cursor, '''
+        CREATE TRIGGER IF NOT EXISTS notes_fts_ai AFTER INSERT ON notes BEGIN
+            INSERT INTO notes_fts(rowid, title, content, keywords_text)
+            VALUES (NEW.id, NEW.title, NEW.content, NEW.keywords_text);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS notes_fts_ad AFTER DELETE ON notes BEGIN
+            INSERT INTO notes_fts(notes_fts, rowid, title, content, keywords_text)
+            VALUES ('delete', OLD.id, OLD.title, OLD.content, OLD.keywords_text);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS notes_fts_au AFTER UPDATE OF title, content, keywords_text ON notes BEGIN
+            INSERT INTO notes_fts(notes_fts, rowid, title, content, keywords_text)
+            VALUES ('delete', OLD.id, OLD.title, OLD.content, OLD.keywords_text);
+            INSERT INTO notes_fts(rowid, title, content, keywords_text)
+            VALUES (NEW.id, NEW.title, NEW.content, NEW.keywords_text);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS note_keyword_fts_ai AFTER INSERT ON note_keyword BEGIN
+            UPDATE notes SET keywords_text = (
+                SELECT GROUP_CONCAT(word) FROM (
+                    SELECT k.word FROM note_keyword nk JOIN keywords k ON nk.keyword_id = k.id
+                    WHERE nk.note_id = NEW.note_id ORDER BY k.word))
+            WHERE id = NEW.note_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS note_keyword_fts_ad AFTER DELETE ON note_keyword BEGIN
+            UPDATE notes SET keywords_text = (
+                SELECT GROUP_CONCAT(word) FROM (
+                    SELECT k.word FROM note_keyword nk JOIN keywords k ON nk.keyword_id = k.id
+                    WHERE nk.note_id = OLD.note_id ORDER BY k.word))
+            WHERE id = OLD.note_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS keywords_fts_au AFTER UPDATE OF word ON keywords BEGIN
+            UPDATE notes SET keywords_text = (
+                SELECT GROUP_CONCAT(word) FROM (
+                    SELECT k.word FROM note_keyword nk JOIN keywords k ON nk.keyword_id = k.id
+                    WHERE nk.note_id = notes.id ORDER BY k.word))
+            WHERE id IN (SELECT note_id FROM note_keyword WHERE keyword_id = NEW.id);
+        END;
+        ''')
+
+        if not fts_exists:
+            db.cursor.execute("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')")
+            logger.info("已创建全文索引 notes_fts")
+    except sqlite3.OperationalError as e:
+        logger.warning(f"FTS5 全文索引不可用，搜索将使用 LIKE 查询: {e}")
+
+
+def migrate_change_journal(db):
+    # 变更日志：每行记录 updated_at（毫秒）和 version，删除写入墓碑表，均由触发器维护
+    db.ensure_column('notes', 'uid', 'TEXT')
+    db.ensure_column('notes', 'updated_at', 'INTEGER')
+    db.ensure_column('notes', 'version', 'INTEGER')
+    db.ensure_column('keywords', 'updated_at', 'INTEGER')
+    db.ensure_column('keywords', 'version', 'INTEGER')
+    db.ensure_column('note_keyword', 'updated_at', 'INTEGER')
+
+    db.cursor.execute('''
+    CREATE TABLE IF NOT EXISTS sync_tombstones (
+        table_name TEXT,
+        row_key TEXT,
+        deleted_at INTEGER,
+        PRIMARY KEY (table_name, row_key)
+    )
+    ''')
+    db.cursor.execute('''
+    CREATE TABLE IF NOT EXISTS sync_state (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )
+    ''')
+
+    # 旧数据回填：uid 由 id 推导，使同源的本地库和云端库对应到同一条笔记；
+    # updated_at 记为 0，任何真实修改都会胜出
+    db.cursor.execute("UPDATE notes SET uid = 'legacy-' || id WHERE uid IS NULL")
+    db.cursor.execute("UPDATE notes SET updated_at = 0, version = 1 WHERE updated_at IS NULL")
+    db.cursor.execute("UPDATE keywords SET updated_at = 0, version = 1 WHERE updated_at IS NULL")
+    db.cursor.execute("UPDATE note_keyword SET updated_at = 0 WHERE updated_at IS NULL")
+    db.cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_notes_uid ON notes (uid)")
+
+    execute_script(db.cursor, f'''
+    CREATE TRIGGER IF NOT EXISTS notes_journal_ai AFTER INSERT ON notes BEGIN
+        UPDATE notes SET uid = COALESCE(NEW.uid, lower(hex(randomblob(16)))),
+                         updated_at = COALESCE(NEW.updated_at, {NOW_MS_SQL}),
+                         version = COALESCE(NEW.version, 1)
+        WHERE id = NEW.id AND (NEW.uid IS NULL OR NEW.updated_at IS NULL OR NEW.version IS NULL);
+        DELETE FROM sync_tombstones
+        WHERE table_name = 'notes' AND row_key = (SELECT uid FROM notes WHERE id = NEW.id);
+    END;
+
+    -- keywords_text 由 note_keyword 触发器派生，关联变更另有记录，不计为笔记修改
+    CREATE TRIGGER IF NOT EXISTS notes_journal_au AFTER UPDATE ON notes
+    WHEN NEW.updated_at IS OLD.updated_at AND NEW.keywords_text IS OLD.keywords_text BEGIN
+        UPDATE notes SET updated_at = {NOW_MS_SQL}, version = COALESCE(OLD.version, 0) + 1
+        WHERE id = NEW.id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS notes_journal_ad AFTER DELETE ON notes BEGIN
+        INSERT OR REPLACE INTO sync_tombstones (table_name, row_key, deleted_at)
+        VALUES ('notes', OLD.uid, {NOW_MS_SQL});
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS keywords_journal_ai AFTER INSERT ON keywords BEGIN
+        UPDATE keywords SET updated_at = COALESCE(NEW.updated_at, {NOW_MS_SQL}),
+                            version = COALESCE(NEW.version, 1)
+        WHERE id = NEW.id AND (NEW.updated_at IS NULL OR NEW.version IS NULL);
+        DELETE FROM sync_tombstones WHERE table_name = 'keywords' AND row_key = NEW.word;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS keywords_journal_au AFTER UPDATE ON keywords
+    WHEN NEW.updated_at IS OLD.updated_at BEGIN
+        UPDATE keywords SET updated_at = {NOW_MS_SQL}, version = COALESCE(OLD.version, 0) + 1
+        WHERE id = NEW.id;
+        INSERT OR REPLACE INTO sync_tombstones (table_name, row_key, deleted_at)
+        SELECT 'keywords', OLD.word, {NOW_MS_SQL} WHERE OLD.word IS NOT NEW.word;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS keywords_journal_ad AFTER DELETE ON keywords BEGIN
+        INSERT OR REPLACE INTO sync_tombstones (table_name, row_key, deleted_at)
+        VALUES ('keywords', OLD.word, {NOW_MS_SQL});
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS note_keyword_journal_ai AFTER INSERT ON note_keyword BEGIN
+        UPDATE note_keyword SET updated_at = {NOW_MS_SQL}
+        WHERE note_id = NEW.note_id AND keyword_id = NEW.keyword_id AND NEW.updated_at IS NULL;
+        DELETE FROM sync_tombstones
+        WHERE table_name = 'note_keyword' AND row_key = (
+            SELECT n.uid || '/' || k.word FROM notes n, keywords k
+            WHERE n.id = NEW.note_id AND k.id = NEW.keyword_id);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS note_keyword_journal_ad AFTER DELETE ON note_keyword BEGIN
+        INSERT OR REPLACE INTO sync_tombstones (table_name, row_key, deleted_at)
+        SELECT 'note_keyword', n.uid || '/' || k.word, {NOW_MS_SQL}
+        FROM notes n, keywords k WHERE n.id = OLD.note_id AND k.id = OLD.keyword_id;
+    END;
+    ''')
+
+
+def migrate_ai_batch_tables(db):
+    # 批量 AI 任务的进度保存在数据库中，进程崩溃后可以从未完成的条目继续
+    db.cursor.execute('''
+    CREATE TABLE IF NOT EXISTS ai_batches (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        prompt TEXT NOT NULL,
+        model TEXT NOT NULL,
+        query TEXT,
+        created_at INTEGER NOT NULL,
+        finished_at INTEGER
+    )
+    ''')
+    db.cursor.execute('''
+    CREATE TABLE IF NOT EXISTS ai_batch_items (
+        batch_id INTEGER NOT NULL,
+        note_id INTEGER NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        PRIMARY KEY (batch_id, note_id)
+    )
+    ''')
+
+
+def migrate_note_bodies(db):
+    # 正文压缩后移到 note_bodies，notes 只保留预览；notes.content 列保留但不再写入
+    db.cursor.execute('''
+    CREATE TABLE IF NOT EXISTS note_bodies (
+        note_id INTEGER PRIMARY KEY,
+        body BLOB
+    )
+    ''')
+    db.ensure_column('notes', 'preview', 'TEXT')
+    db.cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'notes_fts'")
+    fts_exists = db.cursor.fetchone() is not None
+
+    # 旧的全文索引以 notes.content 为内容，先移除；回填时暂停变更日志触发器，迁移不算作笔记修改
+    for trigger in ['notes_fts_ai', 'notes_fts_ad', 'notes_fts_au']:
+        db.cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    with without_trigger(db, 'notes_journal_au'):
+        last_id = 0
+        while True:
+            db.cursor.execute("SELECT id, content FROM notes WHERE id > ? AND content IS NOT NULL ORDER BY id LIMIT 500", (last_id,))
+            rows = db.cursor.fetchall()
+            if not rows:
+                break
+            db.cursor.executemany("INSERT OR REPLACE INTO note_bodies (note_id, body) VALUES (?, ?)",
+                                  [(note_id, compress_text(content)) for note_id, content in rows])
+            db.cursor.executemany("UPDATE notes SET preview = ?, content = NULL WHERE id = ?",
+                                  [(make_preview(content), note_id) for note_id, content in rows])
+            last_id = rows[-1][0]
+
+    if not fts_exists:
+        # 没有 FTS5 时不建索引，删除笔记时仍需清理正文
+        execute_script(db.cursor, '''
+        CREATE TRIGGER IF NOT EXISTS notes_bodies_ad AFTER DELETE ON notes BEGIN
+            DELETE FROM note_bodies WHERE note_id = OLD.id;
+        END;
+        ''')
+        return
+
+    # 全文索引改以 note_texts 视图为外部内容，正文由 note_text() 解压；只有 snippet() 生成片段时才读取正文
+    # 删除笔记时必须先用旧正文从索引中删除，再删除正文，因此两步放在同一个触发器中
+    db.cursor.execute("DROP TABLE notes_fts")
+    execute_script(db.cursor, '''
+    CREATE VIEW IF NOT EXISTS note_texts AS
+    SELECT n.id, n.title, note_text(b.body) AS content, n.keywords_text
+    FROM notes n LEFT JOIN note_bodies b ON b.note_id = n.id;
+
+    CREATE VIRTUAL TABLE notes_fts USING fts5(
+        title, content, keywords_text,
+        content='note_texts', content_rowid='id',
+        tokenize='trigram'
+    );
+
+    CREATE TRIGGER IF NOT EXISTS notes_fts_ai AFTER INSERT ON notes BEGIN
+        INSERT INTO notes_fts(rowid, title, content, keywords_text)
+        VALUES (NEW.id, NEW.title, (SELECT note_text(body) FROM note_bodies WHERE note_id = NEW.id), NEW.keywords_text);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS notes_fts_ad AFTER DELETE ON notes BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, title, content, keywords_text)
+        VALUES ('delete', OLD.id, OLD.title, (SELECT note_text(body) FROM note_bodies WHERE note_id = OLD.id), OLD.keywords_text);
+        DELETE FROM note_bodies WHERE note_id = OLD.id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS notes_fts_au AFTER UPDATE OF title, keywords_text ON notes BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, title, content, keywords_text)
+        VALUES ('delete', OLD.id, OLD.title, (SELECT note_text(body) FROM note_bodies WHERE note_id = OLD.id), OLD.keywords_text);
+        INSERT INTO notes_fts(rowid, title, content, keywords_text)
+        VALUES (NEW.id, NEW.title, (SELECT note_text(body) FROM note_bodies WHERE note_id = NEW.id), NEW.keywords_text);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS note_bodies_fts_ai AFTER INSERT ON note_bodies BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, title, content, keywords_text)
+        SELECT 'delete', id, title, NULL, keywords_text FROM notes WHERE id = NEW.note_id;
+        INSERT INTO notes_fts(rowid, title, content, keywords_text)
+        SELECT id, title, note_text(NEW.body), keywords_text FROM notes WHERE id = NEW.note_id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS note_bodies_fts_au AFTER UPDATE OF body ON note_bodies BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, title, content, keywords_text)
+        SELECT 'delete', id, title, note_text(OLD.body), keywords_text FROM notes WHERE id = OLD.note_id;
+        INSERT INTO notes_fts(rowid, title, content, keywords_text)
+        SELECT id, title, note_text(NEW.body), keywords_text FROM notes WHERE id = NEW.note_id;
+    END;
+    ''')
+    db.cursor.execute("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')")
+    logger.info("已将笔记正文迁移到 note_bodies 并重建全文索引")
+
+
+def migrate_dedup_keys(db):
+    # 去重键：规范化后的 URL 和源文件内容哈希，均为本地派生列，不参与同步
+    # 唯一索引只约束非空值；已有的重复笔记只给 id 最小的一条回填 URL 键，其余留给去重工具合并
+    db.ensure_column('notes', 'normalized_url', 'TEXT')
+    db.ensure_column('notes', 'content_hash', 'TEXT')
+    db.cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_notes_normalized_url ON notes (normalized_url) WHERE normalized_url IS NOT NULL")
+    db.cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_notes_content_hash ON notes (content_hash) WHERE content_hash IS NOT NULL")
+
+    db.cursor.execute("SELECT id, url FROM notes WHERE url IS NOT NULL AND normalized_url IS NULL ORDER BY id")
+    keys = {}
+    for note_id, url in db.cursor.fetchall():
+        keys.setdefault(normalize_url(url), note_id)
+    db.cursor.execute("SELECT normalized_url FROM notes WHERE normalized_url IS NOT NULL")
+    for (taken,) in db.cursor.fetchall():
+        keys.pop(taken, None)
+    with without_trigger(db, 'notes_journal_au'):
+        db.cursor.executemany("UPDATE notes SET normalized_url = ? WHERE id = ?", [(key, note_id) for key, note_id in keys.items() if key])
+
+
+def migrate_term_stats(db):
+    # 关键词推荐用的语料统计：term_stats 为每个词出现在多少篇笔记中，corpus_stats 记录笔记总数和分词方式
+    # 正文增删改时由 note_bodies 上的触发器按 note_terms() 的结果增减，推荐时不必扫描全部正文
+    # 文档频率减到 0 的词保留在表中，评分时与不存在的词等价，重建时才清除
+    db.cursor.execute('''
+    CREATE TABLE IF NOT EXISTS term_stats (
+        term TEXT PRIMARY KEY,
+        df INTEGER NOT NULL
+    ) WITHOUT ROWID
+    ''')
+    db.cursor.execute('''
+    CREATE TABLE IF NOT EXISTS corpus_stats (
+        key TEXT PRIMARY KEY,
+        value
+    )
+    ''')
+    rebuild_term_stats(db.cursor)
+    execute_script(db.cursor, '''
+    CREATE TRIGGER IF NOT EXISTS note_bodies_terms_ai AFTER INSERT ON note_bodies BEGIN
+        INSERT INTO term_stats (term, df) SELECT value, 1 FROM json_each(note_terms(NEW.body)) WHERE true
+        ON CONFLICT(term) DO UPDATE SET df = df + 1;
+        UPDATE corpus_stats SET value = value + 1 WHERE key = 'doc_count';
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS note_bodies_terms_au AFTER UPDATE OF body ON note_bodies BEGIN
+        UPDATE term_stats SET df = df - 1 WHERE term IN (SELECT value FROM json_each(note_terms(OLD.body)));
+        INSERT INTO term_stats (term, df) SELECT value, 1 FROM json_each(note_terms(NEW.body)) WHERE true
+        ON CONFLICT(term) DO UPDATE SET df = df + 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS note_bodies_terms_ad AFTER DELETE ON note_bodies BEGIN
+        UPDATE term_stats SET df = df - 1 WHERE term IN (SELECT value FROM json_each(note_terms(OLD.body)));
+        UPDATE corpus_stats SET value = value - 1 WHERE key = 'doc_count';
+    END;
+    ''')
+
+
+def migrate_vector_queue(db):
+    # 相似度向量存放在数据库之外的映射文件中（见 vector_index），无法随事务回滚；
+    # 触发器只把正文或标题变化的笔记记入队列，由 VectorIndex.refresh 计算后出队。现有笔记全部入队
+    # 触发器中用 ON CONFLICT DO NOTHING 而不是 INSERT OR IGNORE：外层语句（如 write_note_body 的 upsert）
+    # 带冲突子句时，触发器内的 OR IGNORE 会被外层的冲突策略覆盖
+    db.cursor.execute('''
+    CREATE TABLE IF NOT EXISTS vector_queue (
+        note_id INTEGER PRIMARY KEY
+    )
+    ''')
+    execute_script(db.cursor, '''
+    CREATE TRIGGER IF NOT EXISTS note_bodies_vector_ai AFTER INSERT ON note_bodies BEGIN
+        INSERT INTO vector_queue (note_id) VALUES (NEW.note_id) ON CONFLICT(note_id) DO NOTHING;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS note_bodies_vector_au AFTER UPDATE OF body ON note_bodies BEGIN
+        INSERT INTO vector_queue (note_id) VALUES (NEW.note_id) ON CONFLICT(note_id) DO NOTHING;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS note_bodies_vector_ad AFTER DELETE ON note_bodies BEGIN
+        INSERT INTO vector_queue (note_id) VALUES (OLD.note_id) ON CONFLICT(note_id) DO NOTHING;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS notes_vector_au AFTER UPDATE OF title ON notes BEGIN
+        INSERT INTO vector_queue (note_id) VALUES (NEW.id) ON CONFLICT(note_id) DO NOTHING;
+    END;
+    ''')
+    db.cursor.execute("INSERT OR IGNORE INTO vector_queue (note_id) SELECT note_id FROM note_bodies")
+
+
+def migrate_minhash_index(db):
+    # 近似重复检测：note_minhash 存每篇笔记的 MinHash 签名，minhash_bands 是 LSH 分桶索引（见 minhash 模块）
+    # 签名随正文由触发器通过 note_minhash() 计算，分桶随签名由 minhash_buckets() 展开；正文太短时签名为 NULL，不入桶
+    db.cursor.execute('''
+    CREATE TABLE IF NOT EXISTS note_minhash (
+        note_id INTEGER PRIMARY KEY,
+        signature BLOB
+    )
+    ''')
+    db.cursor.execute('''
+    CREATE TABLE IF NOT EXISTS minhash_bands (
+        band INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        note_id INTEGER NOT NULL,
+        PRIMARY KEY (band, bucket, note_id)
+    ) WITHOUT ROWID
+    ''')
+    execute_script(db.cursor, '''
+    CREATE TRIGGER IF NOT EXISTS note_bodies_minhash_ai AFTER INSERT ON note_bodies BEGIN
+        INSERT INTO note_minhash (note_id, signature) VALUES (NEW.note_id, note_minhash(NEW.body))
+        ON CONFLICT(note_id) DO UPDATE SET signature = excluded.signature;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS note_bodies_minhash_au AFTER UPDATE OF body ON note_bodies BEGIN
+        INSERT INTO note_minhash (note_id, signature) VALUES (NEW.note_id, note_minhash(NEW.body))
+        ON CONFLICT(note_id) DO UPDATE SET signature = excluded.signature;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS note_bodies_minhash_ad AFTER DELETE ON note_bodies BEGIN
+        DELETE FROM note_minhash WHERE note_id = OLD.note_id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS note_minhash_bands_ai AFTER INSERT ON note_minhash WHEN NEW.signature IS NOT NULL BEGIN
+        INSERT INTO minhash_bands (band, bucket, note_id)
+        SELECT key, value, NEW.note_id FROM json_each(minhash_buckets(NEW.signature)) WHERE true
+        ON CONFLICT DO NOTHING;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS note_minhash_bands_au AFTER UPDATE OF signature ON note_minhash BEGIN
+        DELETE FROM minhash_bands WHERE note_id = OLD.note_id AND OLD.signature IS NOT NULL
+          AND (band, bucket) IN (SELECT key, value FROM json_each(minhash_buckets(OLD.signature)));
+        INSERT INTO minhash_bands (band, bucket, note_id)
+        SELECT key, value, NEW.note_id FROM json_each(minhash_buckets(NEW.signature)) WHERE true
+        ON CONFLICT DO NOTHING;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS note_minhash_bands_ad AFTER DELETE ON note_minhash WHEN OLD.signature IS NOT NULL BEGIN
+        DELETE FROM minhash_bands WHERE note_id = OLD.note_id
+          AND (band, bucket) IN (SELECT key, value FROM json_each(minhash_buckets(OLD.signature)));
+    END;
+    ''')
+    db.cursor.execute('''
+    INSERT OR IGNORE INTO note_minhash (note_id, signature)
+    SELECT note_id, note_minhash(body) FROM note_bodies
+    ''')
+
+
+def log_change_sql(table_name, row_key):
+    return f'''
+        INSERT INTO sync_log (table_name, row_key, seq) SELECT '{table_name}', {row_key}, {NEXT_SEQ_SQL} WHERE {row_key} IS NOT NULL
+        ON CONFLICT (table_name, row_key) DO UPDATE SET seq = excluded.seq;'''
+
+
+def migrate_sync_log(db):
+    # 同步水位不能用 updated_at：合并时保留的是对方机器的时间，各机器时钟也不一致。
+    # sync_log 记录每行在本库中最后一次变化的序号，序号由本库单调分配；
+    # 对端按 (本库 db_id, 序号) 记录已合并到的位置，下次只读取序号更大的行
+    db.cursor.execute('''
+    CREATE TABLE IF NOT EXISTS sync_log (
+        table_name TEXT NOT NULL,
+        row_key TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        PRIMARY KEY (table_name, row_key)
+    ) WITHOUT ROWID
+    ''')
+    db.cursor.execute("CREATE INDEX IF NOT EXISTS idx_sync_log_seq ON sync_log (seq)")
+    link_key = "(SELECT n.uid || '/' || k.word FROM notes n, keywords k WHERE n.id = NEW.note_id AND k.id = NEW.keyword_id)"
+    tombstone_key = "NEW.table_name || '/' || NEW.row_key"
+    # notes 上仅 keywords_text 变化的更新由 note_keyword 派生，不单独记录
+    execute_script(db.cursor, f'''
+    CREATE TRIGGER IF NOT EXISTS notes_sync_log_ai AFTER INSERT ON notes BEGIN{log_change_sql('notes', 'NEW.uid')}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS notes_sync_log_au AFTER UPDATE ON notes
+    WHEN NEW.keywords_text IS OLD.keywords_text BEGIN{log_change_sql('notes', 'NEW.uid')}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS keywords_sync_log_ai AFTER INSERT ON keywords BEGIN{log_change_sql('keywords', 'NEW.word')}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS keywords_sync_log_au AFTER UPDATE ON keywords BEGIN{log_change_sql('keywords', 'NEW.word')}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS note_keyword_sync_log_ai AFTER INSERT ON note_keyword BEGIN{log_change_sql('note_keyword', link_key)}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS note_keyword_sync_log_au AFTER UPDATE ON note_keyword BEGIN{log_change_sql('note_keyword', link_key)}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS sync_tombstones_sync_log_ai AFTER INSERT ON sync_tombstones BEGIN{log_change_sql('sync_tombstones', tombstone_key)}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS sync_tombstones_sync_log_au AFTER UPDATE ON sync_tombstones BEGIN{log_change_sql('sync_tombstones', tombstone_key)}
+    END;
+    ''')
+
+    # 已有的行记为序号 1，升级后第一次同步时对端完整合并一次
+    db.cursor.execute("INSERT OR IGNORE INTO sync_log (table_name, row_key, seq) SELECT 'notes', uid, 1 FROM notes")
+    db.cursor.execute("INSERT OR IGNORE INTO sync_log (table_name, row_key, seq) SELECT 'keywords', word, 1 FROM keywords")
+    db.cursor.execute('''
+    INSERT OR IGNORE INTO sync_log (table_name, row_key, seq)
+    SELECT 'note_keyword', n.uid || '/' || k.word, 1
+    FROM note_keyword nk JOIN notes n ON n.id = nk.note_id JOIN keywords k ON k.id = nk.keyword_id
+    ''')
+    db.cursor.execute('''
+    INSERT OR IGNORE INTO sync_log (table_name, row_key, seq)
+    SELECT 'sync_tombstones', table_name || '/' || row_key, 1 FROM sync_tombstones
+    ''')
+    # 旧的按时间记录的水位不再使用
+    db.cursor.execute("DELETE FROM sync_state WHERE key = 'last_sync_at'")
+
+
+def migrate_bigram_index(db):
+    # trigram 全文索引无法匹配少于 3 个字符的关键词，而中文关键词大多是两个字。
+    # note_bigrams 以正文中出现的二元组为词（见 text_analysis.bigram_terms），短关键词由它查找，不必解压正文；
+    # 标题和关键词就在 notes 行内，直接匹配。无内容表、detail=none 只存每个词对应的笔记 id，占用空间很小；
+    # 删除时须提供原来的词，由触发器从 OLD.body 重新计算
+    try:
+        db.cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS note_bigrams USING fts5(
+            bigrams, content='', detail=none, tokenize='ascii'
+        )
+        ''')
+    except sqlite3.OperationalError as e:
+        logger.warning(f"FTS5 不可用，短关键词搜索将使用 LIKE 查询: {e}")
+        return
+    execute_script(db.cursor, '''
+    CREATE TRIGGER IF NOT EXISTS note_bodies_bigrams_ai AFTER INSERT ON note_bodies BEGIN
+        INSERT INTO note_bigrams (rowid, bigrams) VALUES (NEW.note_id, bigram_terms(NEW.body));
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS note_bodies_bigrams_au AFTER UPDATE OF body ON note_bodies BEGIN
+        INSERT INTO note_bigrams (note_bigrams, rowid, bigrams) VALUES ('delete', OLD.note_id, bigram_terms(OLD.body));
+        INSERT INTO note_bigrams (rowid, bigrams) VALUES (NEW.note_id, bigram_terms(NEW.body));
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS note_bodies_bigrams_ad AFTER DELETE ON note_bodies BEGIN
+        INSERT INTO note_bigrams (note_bigrams, rowid, bigrams) VALUES ('delete', OLD.note_id, bigram_terms(OLD.body));
+    END;
+    ''')
+    db.cursor.execute("INSERT INTO note_bigrams (note_bigrams) VALUES ('delete-all')")
+    db.cursor.execute("INSERT INTO note_bigrams (rowid, bigrams) SELECT note_id, bigram_terms(body) FROM note_bodies")
+
+
+# (版本号, 迁移函数)，按顺序执行；新的迁移只能追加在末尾
+# 迁移需保持幂等：旧版本程序创建的库 user_version 为 0，但可能已有部分表和触发器
+MIGRATIONS = [
+    (1, migrate_base_tables),
+    (2, migrate_note_keyword_keys),
+    (3, migrate_fts_index),
+    (4, migrate_change_journal),
+    (5, migrate_ai_batch_tables),
+    (6, migrate_note_bodies),
+    (7, migrate_dedup_keys),
+    (8, migrate_term_stats),
+    (9, migrate_vector_queue),
+    (10, migrate_minhash_index),
+    (11, migrate_sync_log),
+    (12, migrate_bigram_index),
+]
+
+# 这些迁移会释放大量页面，完成后执行一次 VACUUM 收缩数据库文件（上传到 OSS 的也是这个文件）
+VACUUM_AFTER = {6}
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(db):
+    db.cursor.execute("PRAGMA user_version")
+    return db.cursor.fetchone()[0]
+
+
+def apply_migrations(db):
+    # 根据 PRAGMA user_version 依次执行未应用的迁移，每个迁移及版本号更新在同一个事务内
+    current = get_schema_version(db)
+    if current > SCHEMA_VERSION:
+        logger.warning(f"数据库版本 {current} 高于程序支持的版本 {SCHEMA_VERSION}")
+        return current
+    needs_vacuum = False
+    for version, migration in MIGRATIONS:
+        if version <= current:
+            continue
+        db.conn.commit()
+        db.cursor.execute("BEGIN")
+        try:
+            migration(db)
+            db.cursor.execute(f"PRAGMA user_version = {version}")
+            db.conn.commit()
+        except sqlite3.Error as e:
+            db.conn.rollback()
+            logger.error(f"数据库迁移到版本 {version} 失败: {e}")
+            raise
+        logger.info(f"数据库已迁移到版本 {version}: {migration.__name__}")
+        if version in VACUUM_AFTER:
+            needs_vacuum = True
+        current = version
+    if needs_vacuum:
+        db.cursor.execute("VACUUM")
+        logger.info("数据库已压缩")
+    return current
@@ -0,0 +1,73 @@
+import hashlib
+import json
+import re
+import zlib
+import numpy as np
+from src.core.note_body import decompress_text
+
+# 近似重复检测：正文去掉空白和标点后取 SHINGLE_CHARS 字的片段（shingle），用 NUM_PERM 个哈希函数求 MinHash 签名
+# 签名按 BANDS 段、每段 ROWS 个值做 LSH 分桶，任一段落入同一个桶的笔记才是候选，再比较完整签名估计 Jaccard 相似度
+# 16 段 × 4 行：相似度 0.8 的两篇笔记成为候选的概率超过 99.9%，0.3 的约 12%
+SHINGLE_CHARS = 5
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+# 只取正文开头的部分，超长的 PDF 也能很快算完
+MAX_SHINGLE_CHARS = 50000
+# 片段太少的短文本（如只有标题的笔记）无法可靠判断，不计算签名
+MIN_SHINGLES = 20
+NEAR_DUPLICATE_THRESHOLD = 0.8
+
+# 哈希函数为乘移位散列 ((a * x + b) mod 2^64) >> 32，a 为奇数；uint64 乘法自然按 2^64 回绕，不需要取模
+# 参数用固定种子生成，保证不同机器、不同版本算出的签名可以比较
+_rng = np.random.RandomState(20240607)
+PERM_A = (_rng.randint(0, 2 ** 63 - 1, size=(NUM_PERM, 1), dtype=np.uint64) << np.uint64(1)) | np.uint64(1)
+PERM_B = _rng.randint(0, 2 ** 63 - 1, size=(NUM_PERM, 1), dtype=np.uint64)
+NORMALIZE_RE = re.compile(r'[\W_]+')
+
+
+def shingle_hashes(text):
+    text = NORMALIZE_RE.sub('', (text or '')[:MAX_SHINGLE_CHARS].lower())
+    shingles = {text[i:i + SHINGLE_CHARS] for i in range(len(text) - SHINGLE_CHARS + 1)}
+    return np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+
+
+def signature(text):
+    # 返回 NUM_PERM 个 uint32 的签名；文本太短时返回 None
+    hashes = shingle_hashes(text)
+    if len(hashes) < MIN_SHINGLES:
+        return None
+    return ((PERM_A * hashes + PERM_B) >> np.uint64(32)).min(axis=1).astype(np.uint32)
+
+
+def band_buckets(sig):
+    # 每段的 ROWS 个值哈希成一个 64 位有符号整数，作为 minhash_bands 中的桶号
+    return [int.from_bytes(hashlib.blake2b(sig[band * ROWS:(band + 1) * ROWS].tobytes(), digest_size=8).digest(), 'little', signed=True)
+            for band in range(BANDS)]
+
+
+def similarity(sig, others):
+    # others 为 (n, NUM_PERM) 的签名矩阵，返回每行与 sig 的估计 Jaccard 相似度；sig 也可以是同形的矩阵，逐行比较
+    return (others == sig).mean(axis=1)
+
+
+def from_blob(blob):
+    return np.frombuffer(blob, dtype=np.uint32)
+
+
+def note_minhash(body):
+    # 供 SQL 触发器调用：压缩正文 -> 签名 BLOB（每篇笔记 NUM_PERM * 4 字节）
+    sig = signature(decompress_text(body))
+    return None if sig is None else sig.tobytes()
+
+
+def minhash_buckets(blob):
+    # 供 SQL 触发器调用：签名 BLOB -> 各段桶号的 JSON 数组，json_each 的 key 即段号；没有签名时为空数组
+    if blob is None:
+        return '[]'
+    return json.dumps(band_buckets(from_blob(blob)))
+
+
+def register_minhash_functions(conn):
+    conn.create_function('note_minhash', 1, note_minhash, deterministic=True)
+    conn.create_function('minhash_buckets', 1, minhash_buckets, deterministic=True)
@@ -0,0 +1,29 @@
+import zlib
+
+# 笔记正文压缩后单独存放在 note_bodies 表，notes 表只保留前 PREVIEW_CHARS 个字符作为预览
+# 列表、搜索和详情显示只读预览列，只有调用大模型、同步等需要全文的地方才解压正文
+PREVIEW_CHARS = 500
+COMPRESS_LEVEL = 6
+
+
+def compress_text(text):
+    if text is None:
+        return None
+    return zlib.compress(text.encode('utf-8'), COMPRESS_LEVEL)
+
+
+def decompress_text(body):
+    if body is None:
+        return None
+    return zlib.decompress(body).decode('utf-8')
+
+
+def make_preview(text):
+    if text is None:
+        return None
+    return text[:PREVIEW_CHARS]
+
+
+def register_functions(conn):
+    # 全文索引的触发器和视图通过 note_text() 读取正文，每个连接在访问数据库前都要注册
+    conn.create_function('note_text', 1, decompress_text, deterministic=True)
@@ -1,32 +1,131 @@
 import PyPDF2
 import os
+import json
+from contextlib import closing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from src.utils.file_utils import calculate_file_hash, data_path
 
-def extract_pdf_info(file_path):
+# 提取逻辑变化时递增，旧缓存自动失效
+EXTRACTOR_VERSION = 1
+# 未设置时为数据库所在目录下的 .cache/pdf
+PDF_CACHE_DIR = os.environ.get('PDF_CACHE_DIR')
+# 页数超过阈值时才使用进程池，小文件的进程启动开销不划算
+PARALLEL_PAGE_THRESHOLD = 40
+PAGES_PER_TASK = 20
+MAX_WORKERS = max(1, min(4, os.cpu_count() or 1))
+
+
+def extract_page_range(file_path, start, end):
+    # 在子进程中运行：独立打开文件，提取 [start, end) 页
+    with open(file_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        return start, [reader.pages[index].extract_text() or "" for index in range(start, end)]
+
+
+def iter_pdf_pages(file_path, page_count=None):
+    # 按完成顺序逐批产出 (页码, 文本)，大文件的页范围分散到进程池
+    if page_count is None:
+        with open(file_path, 'rb') as file:
+            page_count = len(PyPDF2.PdfReader(file).pages)
+
+    if page_count < PARALLEL_PAGE_THRESHOLD or MAX_WORKERS == 1:
+        with open(file_path, 'rb') as file:
+            reader = PyPDF2.PdfReader(file)
+            for index, page in enumerate(reader.pages):
+                yield index, page.extract_text() or ""
+        return
+
+    executor = ProcessPoolExecutor(max_workers=MAX_WORKERS)
     try:
+        futures = [executor.submit(extract_page_range, file_path, start, min(start + PAGES_PER_TASK, page_count))
+                   for start in range(0, page_count, PAGES_PER_TASK)]
+        for future in as_completed(futures):
+            start, texts = future.result()
+            for offset, text in enumerate(texts):
+                yield start + offset, text
+    finally:
+        # 调用方中途停止（如任务被取消）时不再启动排队中的页范围，也不等待正在运行的
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def get_cache_dir():
+    return PDF_CACHE_DIR or data_path('.cache', 'pdf')
+
+
+def get_cache_path(file_hash):
+    return os.path.join(get_cache_dir(), f"{file_hash}-v{EXTRACTOR_VERSION}.json")
+
+
+def load_cached_info(file_hash):
+    cache_path = get_cache_path(file_hash)
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_cached_info(file_hash, info):
+    os.makedirs(get_cache_dir(), exist_ok=True)
+    cache_path = get_cache_path(file_hash)
+    temp_path = cache_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(info, f, ensure_ascii=False)
+    os.replace(temp_path, cache_path)
+
+
+def extract_pdf_info(file_path, on_page=None, use_cache=True, file_hash=None):
+    # on_page(页码, 文本, 总页数) 在每页完成时回调，页码按完成顺序而非文档顺序
+    # 调用方已为去重计算过文件哈希时可以传入 file_hash，避免重复读取文件
+    # on_page 抛出的异常（如任务被取消时的 JobCancelled）不是解析错误，原样抛给调用方
+    in_callback = False
+    try:
+        # 以内容哈希为缓存键，同一文件换路径或改名也能命中
+        file_hash = file_hash or calculate_file_hash(file_path, 'sha256')
+        cached = load_cached_info(file_hash) if use_cache else None
+        if cached:
+            cached['title'] = os.path.splitext(os.path.basename(file_path))[0]
+            cached['file_path'] = file_path
+            return cached
+
         with open(file_path, 'rb') as file:
             reader = PyPDF2.PdfReader(file)
-            
-            # 提取标题（使用文件名作为默认标题）
-            title = os.path.splitext(os.path.basename(file_path))[0]
-            
-            # 提取内容
-            content = ""
-            for page in reader.pages:
-                content += page.extract_text() + "\n"
-            
+            page_count = len(reader.pages)
+
             # 提取元数据
             metadata = reader.metadata
-            author = metadata.author if metadata.author else "Unknown"
-            creation_date = metadata.creation_date if metadata.creation_date else "Unknown"
-            
-            return {
-                'title': title,
-                'content': content,
-                'author': author,
-                'creation_date': str(creation_date),
-                'file_path': file_path
-            }
+            author = metadata.author if metadata and metadata.author else "Unknown"
+            creation_date = metadata.creation_date if metadata and metadata.creation_date else "Unknown"
+
+        # 提取标题（使用文件名作为默认标题）
+        title = os.path.splitext(os.path.basename(file_path))[0]
+
+        # 提取内容
+        pages = [""] * page_count
+        with closing(iter_pdf_pages(file_path, page_count)) as page_texts:
+            for index, text in page_texts:
+                pages[index] = text
+                if on_page:
+                    in_callback = True
+                    on_page(index, text, page_count)
+                    in_callback = False
+        content = "".join(text + "\n" for text in pages)
+
+        info = {
+            'title': title,
+            'content': content,
+            'author': author,
+            'creation_date': str(creation_date),
+            'file_path': file_path,
+            'file_hash': file_hash
+        }
+        if use_cache:
+            save_cached_info(file_hash, info)
+        return info
     except Exception as e:
+        if in_callback:
+            raise
         print(f"处理 PDF 文件时出错: {e}")
         return None
-
@@ -0,0 +1,70 @@
+import json
+import os
+from src.core.logging_config import logger
+from src.utils.file_utils import calculate_file_hash
+
+
+# 记录上次同步完成时本地文件和云端对象的状态，判断是否需要同步时无需下载或重新哈希
+class SyncManifest:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.manifest_path = db_path + '.sync.json'
+        self.data = self.load()
+
+    def load(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取同步清单失败，将重新同步: {e}")
+            return {}
+
+    def save(self):
+        temp_path = self.manifest_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f)
+        os.replace(temp_path, self.manifest_path)
+
+    def local_changed(self):
+        if not os.path.exists(self.db_path):
+            return True
+        # WAL 模式下的写入先进入 -wal 文件，主文件 stat 不变；同步时会把 WAL 截断，非空即说明有未同步的修改
+        wal_path = self.db_path + '-wal'
+        if os.path.exists(wal_path) and os.path.getsize(wal_path) > 0:
+            return True
+        stat = os.stat(self.db_path)
+        if stat.st_size == self.data.get('local_size') and stat.st_mtime_ns == self.data.get('local_mtime_ns'):
+            return False
+        # stat 变化时才重新计算哈希；内容未变则只刷新 stat
+        file_hash = calculate_file_hash(self.db_path)
+        if file_hash != self.data.get('local_hash'):
+            return True
+        self.data['local_size'] = stat.st_size
+        self.data['local_mtime_ns'] = stat.st_mtime_ns
+        self.save()
+        return False
+
+    def cloud_changed(self, cloud_meta):
+        if cloud_meta is None:
+            return True
+        return (cloud_meta.etag != self.data.get('cloud_etag')
+                or cloud_meta.last_modified != self.data.get('cloud_last_modified'))
+
+    def snapshot_local_state(self):
+        stat = os.stat(self.db_path)
+        return {
+            'local_hash': calculate_file_hash(self.db_path),
+            'local_size': stat.st_size,
+            'local_mtime_ns': stat.st_mtime_ns
+        }
+
+    def record(self, cloud_meta, local_state=None):
+        # local_state 来自上传快照时的本地文件状态，之后的本地修改会在下次检查时被发现
+        self.data = dict(local_state or self.snapshot_local_state())
+        self.data.update({
+            'cloud_etag': cloud_meta.etag if cloud_meta else None,
+            'cloud_last_modified': cloud_meta.last_modified if cloud_meta else None
+        })
+        self.save()
@@ -0,0 +1,81 @@
+import json
+import re
+import numpy as np
+from src.core.note_body import decompress_text
+
+try:
+    import jieba
+    jieba.setLogLevel(60)
+except ImportError:
+    jieba = None
+
+# 装有 jieba 时按词切分中文，否则用相邻两字（二元组）；分词方式记录在 corpus_stats 中，变化后需重建词频统计
+TOKENIZER = 'jieba' if jieba else 'bigram'
+# 只分析正文开头的部分，超长的 PDF 也能在常数时间内完成统计和评分
+MAX_ANALYZED_CHARS = 20000
+
+# 二元组模式下在虚词处断开中文，避免产生“的一”“是人”这类跨词的二元组
+STOP_CHARS_RE = re.compile('[的了是在和与及或也就都把被着吗呢吧啊]')
+TOKEN_RE = re.compile(r'[a-z][a-z0-9+#]*(?:[.\-][a-z0-9+#]+)*|[\u3400-\u9fff]+')
+STOPWORDS = {
+    'the', 'and', 'for', 'are', 'but', 'not', 'you', 'all', 'any', 'can', 'had', 'her', 'was', 'one', 'our',
+    'out', 'has', 'his', 'how', 'its', 'may', 'new', 'now', 'see', 'two', 'who', 'did', 'get', 'use', 'with',
+    'this', 'that', 'from', 'they', 'will', 'have', 'been', 'were', 'what', 'when', 'which', 'there', 'their',
+    'then', 'than', 'them', 'these', 'those', 'into', 'also', 'more', 'some', 'such', 'only', 'other', 'about',
+    'would', 'could', 'should', 'each', 'like', 'just', 'over', 'most', 'very', 'your', 'http', 'https', 'www',
+    '我们', '你们', '他们', '一个', '这个', '那个', '这些', '那些', '没有', '可以', '因为', '所以', '但是', '如果',
+    '就是', '什么', '自己', '以及', '或者', '而且', '进行', '通过', '已经', '还是', '不是', '这样', '其中', '之后',
+    '之前', '时候', '如何', '为了', '需要', '这种', '一些', '可能', '对于', '由于', '并且', '同时', '然后', '其他',
+}
+
+
+def tokenize_runs(text):
+    # 按出现顺序返回词的分段：英文词各自成段，一段连续中文的词（或二元组）放在同一段
+    if not text:
+        return []
+    runs = []
+    for match in TOKEN_RE.finditer(text[:MAX_ANALYZED_CHARS].lower()):
+        token = match.group()
+        if token[0] < '\u3400':
+            if len(token) > 1 and token not in STOPWORDS:
+                runs.append([token])
+        elif jieba:
+            runs.append([word for word in jieba.lcut(token) if len(word) > 1 and word not in STOPWORDS])
+        else:
+            runs.extend([part[i:i + 2] for i in range(len(part) - 1)] for part in STOP_CHARS_RE.split(token) if len(part) > 1)
+    return runs
+
+
+def tokenize(text):
+    return [term for run in tokenize_runs(text) for term in run]
+
+
+def tfidf_weights(terms, counts, doc_count, frequencies):
+    # 词频取对数乘以平滑的 IDF；文档频率来自 term_stats（见 Database.get_term_frequencies）
+    tf = np.fromiter((counts[term] for term in terms), dtype=np.float64, count=len(terms))
+    df = np.fromiter((frequencies.get(term, 0) for term in terms), dtype=np.float64, count=len(terms))
+    return (1 + np.log(tf)) * (np.log((doc_count + 1) / (df + 1)) + 1)
+
+
+def note_terms(body):
+    # 供 SQL 触发器调用：压缩正文中出现的不同词，JSON 数组，由 json_each 展开后更新 term_stats
+    return json.dumps(sorted(set(tokenize(decompress_text(body)))), ensure_ascii=False)
+
+
+def bigram_term(text):
+    # 二元组（或单字前缀）按 UTF-8 的十六进制写成 ASCII 词，ascii 分词器原样切分，不受标点、空白和大小写规则影响；
+    # UTF-8 按字符无前缀冲突，单字的十六进制作为前缀只匹配以该字开头的二元组
+    return text.encode('utf-8').hex()
+
+
+def bigram_terms(body):
+    # 供 SQL 触发器调用：解压正文，小写后每个相邻的两个字符作为一个词，末尾补一个换行，使每个字符都是某个二元组的首字符。
+    # 与 tokenize 不同，这里不分词、不截断，保证索引命中与子串匹配一致
+    text = (decompress_text(body) or '').lower() + '\n'
+    return ' '.join(sorted({bigram_term(text[i:i + 2]) for i in range(len(text) - 1)}))
+
+
+def register_text_functions(conn):
+    # term_stats、note_bigrams 的触发器通过 note_terms()、bigram_terms() 分词，与 note_text() 一样须在每个连接上注册
+    conn.create_function('note_terms', 1, note_terms, deterministic=True)
+    conn.create_function('bigram_terms', 1, bigram_terms, deterministic=True)
@@ -0,0 +1,74 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import oss2
+
+DEFAULT_PART_SIZE = 1024 * 1024
+DEFAULT_NUM_THREADS = 4
+DEFAULT_MULTIPART_THRESHOLD = 2 * 1024 * 1024
+
+
+# 汇总多个并发传输的字节进度，回调签名与 oss2 一致：callback(consumed_bytes, total_bytes)
+class ProgressTracker:
+    def __init__(self, total_bytes, progress_callback=None):
+        self.total_bytes = total_bytes
+        self.consumed_bytes = 0
+        self.progress_callback = progress_callback
+        self.lock = threading.Lock()
+
+    def add(self, nbytes):
+        with self.lock:
+            self.consumed_bytes += nbytes
+            consumed = self.consumed_bytes
+        if self.progress_callback:
+            self.progress_callback(consumed, self.total_bytes)
+
+
+# 基于 oss2 断点续传接口的传输引擎：分片大小和并发数可配置，断点信息保存在本地目录
+class TransferEngine:
+    def __init__(self, bucket, checkpoint_dir, part_size=DEFAULT_PART_SIZE,
+                 num_threads=DEFAULT_NUM_THREADS, multipart_threshold=DEFAULT_MULTIPART_THRESHOLD):
+        self.bucket = bucket
+        self.checkpoint_dir = checkpoint_dir
+        self.part_size = part_size
+        self.num_threads = num_threads
+        self.multipart_threshold = multipart_threshold
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls, bucket, local_db_path):
+        checkpoint_dir = os.path.join(os.path.dirname(os.path.abspath(local_db_path)), '.oss_checkpoints')
+        return cls(
+            bucket,
+            checkpoint_dir,
+            part_size=int(os.environ.get('OSS_PART_SIZE', DEFAULT_PART_SIZE)),
+            num_threads=int(os.environ.get('OSS_TRANSFER_THREADS', DEFAULT_NUM_THREADS)),
+            multipart_threshold=int(os.environ.get('OSS_MULTIPART_THRESHOLD', DEFAULT_MULTIPART_THRESHOLD))
+        )
+
+    def upload_file(self, key, file_path, progress_callback=None):
+        oss2.resumable_upload(
+            self.bucket, key, file_path,
+            store=oss2.ResumableStore(root=self.checkpoint_dir, dir='upload'),
+            multipart_threshold=self.multipart_threshold,
+            part_size=self.part_size,
+            progress_callback=progress_callback,
+            num_threads=self.num_threads
+        )
+
+    def download_file(self, key, file_path, progress_callback=None):
+        oss2.resumable_download(
+            self.bucket, key, file_path,
+            store=oss2.ResumableDownloadStore(root=self.checkpoint_dir, dir='download'),
+            multiget_threshold=self.multipart_threshold,
+            part_size=self.part_size,
+            progress_callback=progress_callback,
+            num_threads=self.num_threads
+        )
+
+    def map_parallel(self, func, items):
+        # 并发执行 func(item)，任何一个失败都会在此抛出
+        if not items:
+            return []
+        with ThreadPoolExecutor(max_workers=self.num_threads) as executor:
+            return list(executor.map(func, items))
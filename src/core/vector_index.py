@@ -0,0 +1,173 @@
+import json
+import os
+import zlib
+import numpy as np
+from collections import Counter
+from src.core.logging_config import logger
+from src.core.note_body import decompress_text
+from src.core.text_analysis import TOKENIZER, STOPWORDS, tokenize, tfidf_weights
+
+# 每条笔记一个 VECTOR_DIM 维的 float32 向量（散列 TF-IDF，已归一化），按 note_id 作为行号存放在 <数据库>.vec 中
+# 文件通过 numpy.memmap 映射，余弦相似度即矩阵与查询向量的乘积；已删除或没有正文的笔记对应全零行
+VECTOR_DIM = 256
+ROW_BYTES = VECTOR_DIM * 4
+FORMAT_VERSION = 1
+# 第 0 行不对应任何笔记（id 从 1 开始），存放维度、分词方式和格式版本，与当前程序不一致时重建
+HEADER = np.array([VECTOR_DIM, 1 if TOKENIZER == 'jieba' else 0, FORMAT_VERSION], dtype=np.float32)
+# 文件按此行数的整数倍扩容，避免每新增一条笔记都重新映射
+GROW_ROWS = 1024
+REFRESH_BATCH = 500
+MIN_SIMILARITY = 0.05
+
+
+def vector_path(db_path):
+    return db_path + '.vec'
+
+
+def discard_vector_file(db_path):
+    # 向量文件由本地数据库派生，数据库文件被整体替换后必须删除，下次使用时按新数据库重建
+    path = vector_path(db_path)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def hash_terms(terms):
+    # 特征哈希：crc32 的低位决定维度，最高位决定符号，使碰撞的词相互抵消而不是累加
+    # 不能用 Python 的 hash()，它在每次启动时随机化
+    hashes = np.fromiter((zlib.crc32(term.encode('utf-8')) for term in terms), dtype=np.uint32, count=len(terms))
+    signs = np.where(hashes & 0x80000000, 1.0, -1.0)
+    return (hashes % VECTOR_DIM).astype(np.intp), signs
+
+
+def embed(counts, doc_count, frequencies):
+    vector = np.zeros(VECTOR_DIM, dtype=np.float32)
+    if not counts:
+        return vector
+    terms = list(counts)
+    indexes, signs = hash_terms(terms)
+    np.add.at(vector, indexes, tfidf_weights(terms, counts, doc_count, frequencies) * signs)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def count_terms(text):
+    return Counter(term for term in tokenize(text) if term not in STOPWORDS)
+
+
+class VectorIndex:
+    def __init__(self, db):
+        self.db = db
+        self.path = vector_path(db.db_path)
+        self.matrix = None
+        # (inode, 大小)：文件被替换或被其他连接扩容后需要重新映射
+        self.file_id = None
+
+    def open(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            stat = None
+        if stat is not None and self.matrix is not None and (stat.st_ino, stat.st_size) == self.file_id:
+            return
+        self.matrix = None
+        if stat is not None and stat.st_size >= ROW_BYTES and stat.st_size % ROW_BYTES == 0:
+            matrix = np.memmap(self.path, dtype=np.float32, mode='r+', shape=(stat.st_size // ROW_BYTES, VECTOR_DIM))
+            if np.array_equal(matrix[0, :len(HEADER)], HEADER):
+                self.matrix, self.file_id = matrix, (stat.st_ino, stat.st_size)
+                return
+            del matrix
+        logger.info("相似度索引不存在或格式不符，将重新建立")
+        self.create()
+        with self.db.transaction() as cursor:
+            cursor.execute("INSERT OR IGNORE INTO vector_queue (note_id) SELECT note_id FROM note_bodies")
+
+    def create(self):
+        # 先写临时文件再替换，其他连接仍在使用的旧映射不受影响
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(HEADER.tobytes())
+            f.truncate(GROW_ROWS * ROW_BYTES)
+        os.replace(temp_path, self.path)
+        self.remap()
+
+    def remap(self):
+        stat = os.stat(self.path)
+        self.matrix = np.memmap(self.path, dtype=np.float32, mode='r+', shape=(stat.st_size // ROW_BYTES, VECTOR_DIM))
+        self.file_id = (stat.st_ino, stat.st_size)
+
+    def ensure_rows(self, max_note_id):
+        if max_note_id < len(self.matrix):
+            return
+        rows = (max_note_id // GROW_ROWS + 1) * GROW_ROWS
+        self.matrix.flush()
+        self.matrix = None
+        with open(self.path, 'r+b') as f:
+            f.truncate(rows * ROW_BYTES)
+        self.remap()
+
+    def has_pending(self):
+        cursor = self.db.conn.cursor()
+        cursor.execute("SELECT 1 FROM vector_queue LIMIT 1")
+        return cursor.fetchone() is not None
+
+    def refresh(self):
+        # 正文和标题的变化由触发器记入 vector_queue；每批在一个写事务内计算向量、写入并刷新到文件后再出队，
+        # 中途崩溃时队列仍在，下次重做。每次查询相似笔记都会调用，队列为空时只做一次读查询，不取写锁
+        self.open()
+        updated = 0
+        while self.has_pending():
+            with self.db.transaction() as cursor:
+                cursor.execute('''
+                SELECT q.note_id, n.title, b.body FROM vector_queue q
+                LEFT JOIN notes n ON n.id = q.note_id
+                LEFT JOIN note_bodies b ON b.note_id = q.note_id
+                ORDER BY q.note_id LIMIT ?
+                ''', (REFRESH_BATCH,))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                counts = {row['note_id']: count_terms(f"{row['title'] or ''}\n{decompress_text(row['body']) or ''}")
+                          for row in rows if row['title'] is not None or row['body'] is not None}
+                doc_count, frequencies = self.db.get_term_frequencies({term for terms in counts.values() for term in terms})
+                self.ensure_rows(rows[-1]['note_id'])
+                for row in rows:
+                    note_id = row['note_id']
+                    self.matrix[note_id] = embed(counts.get(note_id), doc_count, frequencies)
+                self.matrix.flush()
+                cursor.execute("DELETE FROM vector_queue WHERE note_id IN (SELECT value FROM json_each(?))",
+                               (json.dumps([row['note_id'] for row in rows]),))
+            updated += len(rows)
+        if updated:
+            logger.info(f"已更新 {updated} 条笔记的相似度向量")
+        return updated
+
+    def top_matches(self, vector, limit, exclude=None):
+        # 一次矩阵乘法算出与所有笔记的余弦相似度，argpartition 取前 limit 个再排序
+        if limit <= 0 or not vector.any():
+            return []
+        scores = self.matrix @ vector
+        scores[0] = 0
+        if exclude is not None:
+            scores[exclude] = 0
+        limit = min(limit, len(scores) - 1)
+        top = np.argpartition(-scores, limit)[:limit]
+        top = top[np.argsort(-scores[top])]
+        return [(int(note_id), float(scores[note_id])) for note_id in top if scores[note_id] >= MIN_SIMILARITY]
+
+    def related(self, note_id, limit):
+        self.refresh()
+        if note_id >= len(self.matrix):
+            return []
+        return self.top_matches(np.array(self.matrix[note_id]), limit, exclude=note_id)
+
+    def search(self, text, limit):
+        self.refresh()
+        counts = count_terms(text)
+        doc_count, frequencies = self.db.get_term_frequencies(counts)
+        return self.top_matches(embed(counts, doc_count, frequencies), limit)
+
+    def close(self):
+        if self.matrix is not None:
+            self.matrix.flush()
+        self.matrix = None
+        self.file_id = None
@@ -1,41 +1,159 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
 from urllib.parse import urlparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from src.core.html_extractor import extract_content, extractor_id, decode_html
+from src.utils.file_utils import data_path
 
 import logging
 
 logging.basicConfig(level=logging.INFO)
 
-def scrape_webpage(url):
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36'
+}
+
+# 连接池：最多缓存 POOL_HOSTS 个主机的连接池，每个主机最多 POOL_MAXSIZE_PER_HOST 个连接，超出时等待
+POOL_HOSTS = int(os.environ.get('SCRAPER_POOL_HOSTS', 32))
+POOL_MAXSIZE_PER_HOST = int(os.environ.get('SCRAPER_POOL_MAXSIZE_PER_HOST', 4))
+# 未设置时为数据库所在目录下的 http_cache.db
+HTTP_CACHE_PATH = os.environ.get('HTTP_CACHE_PATH')
+# 缓存超过 HTTP_CACHE_MAX_AGE_DAYS 天未使用或超过 HTTP_CACHE_MAX_ROWS 条时，淘汰最久未使用的
+HTTP_CACHE_MAX_AGE_DAYS = float(os.environ.get('HTTP_CACHE_MAX_AGE_DAYS', 30))
+HTTP_CACHE_MAX_ROWS = int(os.environ.get('HTTP_CACHE_MAX_ROWS', 5000))
+
+_session = None
+_cache = None
+_lock = threading.Lock()
+
+
+def get_session():
+    # 所有抓取共享一个带连接池的 Session，复用 keep-alive 连接
+    global _session
+    with _lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_MAXSIZE_PER_HOST, pool_block=True)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update(HEADERS)
+            _session = session
+        return _session
+
+
+# 持久化的 HTTP 缓存：保存 ETag/Last-Modified 和解析结果，命中 304 时直接返回结果
+# 结果与产生它的提取引擎和版本（extractor）绑定，切换引擎或升级提取逻辑后按未缓存处理
+class HttpCache:
+    def __init__(self, path=None, max_age_days=HTTP_CACHE_MAX_AGE_DAYS, max_rows=HTTP_CACHE_MAX_ROWS):
+        self.path = path or HTTP_CACHE_PATH or data_path('http_cache.db')
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.max_age = max_age_days * 86400
+        self.max_rows = max_rows
+        with self.lock:
+            self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS http_cache (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                result TEXT,
+                fetched_at REAL
+            )
+            ''')
+            # 旧版本的缓存没有 extractor 列，这些行的 extractor 为 NULL，不会再被命中
+            columns = [row[1] for row in self.conn.execute('PRAGMA table_info(http_cache)')]
+            if 'extractor' not in columns:
+                self.conn.execute('ALTER TABLE http_cache ADD COLUMN extractor TEXT')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_http_cache_fetched_at ON http_cache(fetched_at)')
+            self.conn.commit()
+
+    def get(self, url, extractor):
+        with self.lock:
+            row = self.conn.execute('SELECT etag, last_modified, result FROM http_cache WHERE url = ? AND extractor = ?',
+                                    (url, extractor)).fetchone()
+        if row is None:
+            return None
+        return {'etag': row[0], 'last_modified': row[1], 'result': json.loads(row[2])}
+
+    def put(self, url, etag, last_modified, result, extractor):
+        now = time.time()
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO http_cache (url, etag, last_modified, result, fetched_at, extractor) VALUES (?, ?, ?, ?, ?, ?)',
+                              (url, etag, last_modified, json.dumps(result, ensure_ascii=False), now, extractor))
+            self.evict(now)
+            self.conn.commit()
+
+    def evict(self, now):
+        self.conn.execute('DELETE FROM http_cache WHERE fetched_at < ?', (now - self.max_age,))
+        self.conn.execute('''
+        DELETE FROM http_cache WHERE fetched_at <= (
+            SELECT fetched_at FROM http_cache ORDER BY fetched_at DESC LIMIT 1 OFFSET ?
+        )
+        ''', (self.max_rows,))
+
+    def touch(self, url):
+        with self.lock:
+            self.conn.execute('UPDATE http_cache SET fetched_at = ? WHERE url = ?', (time.time(), url))
+            self.conn.commit()
+
+
+def get_cache():
+    global _cache
+    with _lock:
+        if _cache is None:
+            _cache = HttpCache()
+        return _cache
+
+
+def parse_webpage(url, html, engine=None):
+    # 正文提取引擎可通过 HTML_EXTRACTOR 环境变量或 engine 参数切换
+    title, content = extract_content(html, engine)
+
+    # 获取域名
+    domain = urlparse(url).netloc
+
+    return {
+        'title': title or "无标题",
+        'content': content.strip(),
+        'url': url,
+        'domain': domain
+    }
+
+
+def scrape_webpage(url, use_cache=True):
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=10)
+        cache = get_cache() if use_cache else None
+        extractor = extractor_id()
+        cached = cache.get(url, extractor) if cache else None
+
+        # 条件请求：内容未变化时服务器返回 304，无需重新下载和解析
+        headers = {}
+        if cached:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        response = get_session().get(url, headers=headers, timeout=10)
+        if response.status_code == 304 and cached:
+            cache.touch(url)
+            return cached['result']
         response.raise_for_status()
-        
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # 尝试获取标题
-        title = soup.title.string if soup.title else "无标题"
-        title = title.strip() if title else "无标题"
-        
-        # 尝试获取主要内容
-        main_content = ""
-        for tag in soup.find_all(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
-            text = tag.get_text(strip=True)
-            if text:
-                main_content += text + "\n"
-        
-        # 获取域名
-        domain = urlparse(url).netloc
-        
-        return {
-            'title': title,
-            'content': main_content.strip(),
-            'url': url,
-            'domain': domain
-        }
+
+        # 只采用 HTTP 头中明确声明的 charset；未声明时 requests 对 text/* 默认的 ISO-8859-1 不可信，交给 decode_html 判断
+        declared = 'charset=' in response.headers.get('Content-Type', '').lower()
+        html = decode_html(response.content, response.encoding if declared else None)
+        result = parse_webpage(url, html)
+
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if cache and (etag or last_modified):
+            cache.put(url, etag, last_modified, result, extractor)
+        return result
     except Exception as e:
         print(f"抓取网页时出错: {e}")
         return None
@@ -3,6 +3,7 @@ from PyQt5.QtCore import Qt, pyqtSignal
 
 class DropArea(QLabel):
     url_dropped = pyqtSignal(str)
+    urls_dropped = pyqtSignal(list)
 
     def __init__(self):
         super().__init__()
@@ -37,7 +38,9 @@ class DropArea(QLabel):
 
     def dropEvent(self, event):
         urls = event.mimeData().urls()
-        if urls:
+        if len(urls) > 1:
+            self.urls_dropped.emit([url.toLocalFile() if url.isLocalFile() else url.toString() for url in urls])
+        elif urls:
             url = urls[0].toString()
             self.url_dropped.emit(url)
         self.setStyleSheet("""
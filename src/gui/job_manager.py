@@ -0,0 +1,131 @@
+import itertools
+import logging
+import threading
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+DEFAULT_MAX_WORKERS = 4
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobSignals(QObject):
+    started = pyqtSignal(int)
+    progress = pyqtSignal(int, int, int)
+    partial = pyqtSignal(int, object)
+    finished = pyqtSignal(int, object)
+    failed = pyqtSignal(int, str)
+    cancelled = pyqtSignal(int)
+
+
+# 线程池中的一个后台任务；func(job) 可调用 report_progress / emit_partial，并通过 check_cancelled 响应取消
+class Job(QRunnable):
+    def __init__(self, job_id, name, func):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.job_id = job_id
+        self.name = name
+        self.func = func
+        self.signals = JobSignals()
+        self.cancel_event = threading.Event()
+
+    def is_cancelled(self):
+        return self.cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    def report_progress(self, done, total):
+        self.signals.progress.emit(self.job_id, done, total)
+
+    def emit_partial(self, data):
+        self.signals.partial.emit(self.job_id, data)
+
+    def run(self):
+        if self.is_cancelled():
+            self.signals.cancelled.emit(self.job_id)
+            return
+        self.signals.started.emit(self.job_id)
+        try:
+            result = self.func(self)
+        except JobCancelled:
+            self.signals.cancelled.emit(self.job_id)
+            return
+        except Exception as e:
+            logging.error(f"任务 {self.name} 失败: {str(e)}", exc_info=True)
+            self.signals.failed.emit(self.job_id, str(e))
+            return
+        if self.is_cancelled():
+            self.signals.cancelled.emit(self.job_id)
+        else:
+            self.signals.finished.emit(self.job_id, result)
+
+
+# 统一管理抓取、PDF 解析和 AI 调用等后台任务：有界线程池、任务编号、取消和状态通知
+class JobManager(QObject):
+    job_added = pyqtSignal(int, str)
+    job_status_changed = pyqtSignal(int, str)
+    job_done = pyqtSignal(int)
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_workers)
+        self.jobs = {}
+        self.job_ids = itertools.count(1)
+
+    def submit(self, name, func, on_finished=None, on_failed=None, on_progress=None, on_partial=None, on_cancelled=None):
+        job = Job(next(self.job_ids), name, func)
+        self.jobs[job.job_id] = job
+
+        job.signals.started.connect(lambda job_id: self.job_status_changed.emit(job_id, "运行中"))
+        job.signals.progress.connect(self.handle_progress)
+        job.signals.finished.connect(lambda job_id, _: self.finish_job(job_id, "完成"))
+        job.signals.failed.connect(lambda job_id, error: self.finish_job(job_id, f"失败: {error}"))
+        job.signals.cancelled.connect(lambda job_id: self.finish_job(job_id, "已取消"))
+        if on_finished:
+            job.signals.finished.connect(lambda _, result: on_finished(result))
+        if on_failed:
+            job.signals.failed.connect(lambda _, error: on_failed(error))
+        if on_progress:
+            job.signals.progress.connect(lambda _, done, total: on_progress(done, total))
+        if on_partial:
+            job.signals.partial.connect(lambda _, data: on_partial(data))
+        if on_cancelled:
+            job.signals.cancelled.connect(lambda _: on_cancelled())
+
+        self.job_added.emit(job.job_id, name)
+        self.job_status_changed.emit(job.job_id, "排队中")
+        self.pool.start(job)
+        return job.job_id
+
+    def handle_progress(self, job_id, done, total):
+        if total:
+            self.job_status_changed.emit(job_id, f"运行中 {done * 100 // total}%")
+
+    def finish_job(self, job_id, status):
+        self.jobs.pop(job_id, None)
+        self.job_status_changed.emit(job_id, status)
+        self.job_done.emit(job_id)
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return False
+        job.cancel_event.set()
+        # 尚未开始的任务直接从队列中移除
+        if self.pool.tryTake(job):
+            job.signals.cancelled.emit(job_id)
+        else:
+            self.job_status_changed.emit(job_id, "正在取消")
+        return True
+
+    def active_count(self):
+        return len(self.jobs)
+
+    def shutdown(self):
+        for job_id in list(self.jobs):
+            self.cancel(job_id)
+        self.pool.waitForDone()
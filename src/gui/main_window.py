@@ -1,44 +1,28 @@
-from PyQt5.QtWidgets import QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QTreeView, QLineEdit, QTextEdit, QPushButton, QMessageBox, QProgressBar, QStatusBar, QLabel, QSplitter, QSpacerItem, QSizePolicy, QFrame
-from PyQt5.QtGui import QStandardItemModel, QStandardItem, QFont, QIcon, QColor, QPalette
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QModelIndex, QUrl
+from PyQt5.QtWidgets import QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QTreeView, QLineEdit, QTextEdit, QPushButton, QMessageBox, QProgressBar, QStatusBar, QLabel, QSplitter, QSpacerItem, QSizePolicy, QFrame, QListWidget, QListWidgetItem, QAbstractItemView, QCheckBox, QTabWidget, QComboBox
+from PyQt5.QtGui import QFont, QIcon, QColor, QPalette, QTextCursor
+from PyQt5.QtCore import Qt, QModelIndex, QUrl, QTimer
 from .drag_drop import DropArea
-from core.web_scraper import scrape_webpage
-from core.database import Database
-from core.keyword_manager import KeywordManager
-from core.cloud_storage import CloudStorage
-from core.pdf_handler import extract_pdf_info
-from core.ai_handler import call_ai_model
+from .sync_worker import SyncScheduler
+from .job_manager import JobManager
+from .note_tree_model import NoteTreeModel
+from src.core.web_scraper import scrape_webpage
+from src.core.database import Database
+from src.core.keyword_manager import KeywordManager
+from src.core.keyword_index import KeywordIndex
+from src.core.keyword_suggester import suggest_keywords
+from src.core.cloud_storage import CloudStorage
+from src.core.pdf_handler import extract_pdf_info
+from src.core.ai_handler import stream_ai_model, DEFAULT_MODEL
+from src.core.ai_batch import run_ai_batch
+from src.core.ai_chunking import needs_chunking, split_into_chunks, map_chunks, build_reduce_input, build_reduce_prompt
+from src.core.batch_ingest import ingest_batch, format_creation_date
+from src.utils.file_utils import calculate_file_hash
 import re
-from datetime import datetime
-import pytz
 import logging
-import hashlib
+import os
 
-class ScraperThread(QThread):
-    result_ready = pyqtSignal(dict)
-
-    def __init__(self, url):
-        super().__init__()
-        self.url = url
-        self.keyword_input = QLineEdit()
-        self.keyword_input.setPlaceholderText("输入关键词（用逗号分隔多个关键词）")
-
-    def run(self):
-        result = scrape_webpage(self.url)
-        if result:
-            self.result_ready.emit(result)
-
-class AIThread(QThread):
-    result_ready = pyqtSignal(str)
-
-    def __init__(self, content, prompt):
-        super().__init__()
-        self.content = content
-        self.prompt = prompt
-
-    def run(self):
-        result = call_ai_model(self.content, self.prompt)
-        self.result_ready.emit(result)
+# 关键词视图中最多列出的笔记数
+KEYWORD_NOTES_LIMIT = 500
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -94,10 +78,25 @@ class MainWindow(QMainWindow):
         # 左侧文件结构
         self.file_tree = QTreeView()
         self.file_tree.setIndentation(15)  # 设置缩进15像素
-        self.file_model = QStandardItemModel()
-        self.file_tree.setModel(self.file_model)
-        self.file_model.setHorizontalHeaderLabels(['笔记结构'])
-        left_layout.addWidget(self.file_tree)
+
+        # 按关键词浏览：多选关键词后按 AND/OR 组合筛选笔记
+        keyword_browser = QWidget()
+        keyword_browser_layout = QVBoxLayout(keyword_browser)
+        keyword_browser_layout.setContentsMargins(0, 0, 0, 0)
+        self.keyword_list = QListWidget()
+        self.keyword_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        keyword_browser_layout.addWidget(self.keyword_list, 2)
+        self.keyword_mode_combo = QComboBox()
+        self.keyword_mode_combo.addItem("包含全部关键词 (AND)", 'and')
+        self.keyword_mode_combo.addItem("包含任一关键词 (OR)", 'or')
+        keyword_browser_layout.addWidget(self.keyword_mode_combo)
+        self.keyword_notes_list = QListWidget()
+        keyword_browser_layout.addWidget(self.keyword_notes_list, 3)
+
+        self.left_tabs = QTabWidget()
+        self.left_tabs.addTab(self.file_tree, "笔记")
+        self.left_tabs.addTab(keyword_browser, "关键词")
+        left_layout.addWidget(self.left_tabs)
 
         # 搜索框
         self.search_input = QLineEdit()
@@ -111,6 +110,15 @@ class MainWindow(QMainWindow):
         """)
         left_layout.addWidget(self.search_input)
 
+        # 后台任务列表：抓取、PDF 解析、批量导入和 AI 调用共用一个线程池
+        self.job_list = QListWidget()
+        self.job_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.job_list.setFixedHeight(100)
+        left_layout.addWidget(QLabel("后台任务:"))
+        left_layout.addWidget(self.job_list)
+        self.cancel_job_button = QPushButton("取消任务")
+        left_layout.addWidget(self.cancel_job_button)
+
         splitter.addWidget(left_widget)
 
         # 拖放区域
@@ -126,9 +134,17 @@ class MainWindow(QMainWindow):
         self.ai_prompt_input.setFixedHeight(75)  # 设置固定高度，大约三行的高度
         self.call_ai_button = QPushButton("调用大模型")
         self.call_ai_button.setEnabled(False)
+        # 勾选后忽略缓存，重新调用大模型
+        self.refresh_ai_checkbox = QCheckBox("强制刷新")
+        ai_button_layout = QVBoxLayout()
+        ai_button_layout.addWidget(self.call_ai_button)
+        # 对搜索框中关键词/搜索词匹配的所有笔记批量调用
+        self.batch_ai_button = QPushButton("批量调用")
+        ai_button_layout.addWidget(self.batch_ai_button)
+        ai_button_layout.addWidget(self.refresh_ai_checkbox)
         ai_layout = QHBoxLayout()
         ai_layout.addWidget(self.ai_prompt_input, 3)  # 给予输入框更多的水平空间
-        ai_layout.addWidget(self.call_ai_button, 1)
+        ai_layout.addLayout(ai_button_layout, 1)
         right_layout.addLayout(ai_layout)
 
         # 关键词输入（保持不变，但位置调整到大模型调用之后）
@@ -140,10 +156,17 @@ class MainWindow(QMainWindow):
         keyword_layout.addWidget(self.add_keyword_button)
         right_layout.addLayout(keyword_layout)
 
-        # 内容预览（保持不变）
+        # 内容预览，右边是与当前笔记（或搜索词）内容相似的笔记
         self.content_preview = QTextEdit()
         self.content_preview.setReadOnly(True)
-        right_layout.addWidget(self.content_preview, 2)
+        self.related_notes_list = QListWidget()
+        related_layout = QVBoxLayout()
+        related_layout.addWidget(QLabel("相关笔记:"))
+        related_layout.addWidget(self.related_notes_list)
+        preview_layout = QHBoxLayout()
+        preview_layout.addWidget(self.content_preview, 3)
+        preview_layout.addLayout(related_layout, 1)
+        right_layout.addLayout(preview_layout, 2)
 
         # 添加删除按钮
         self.delete_button = QPushButton("删除笔记")
@@ -193,10 +216,26 @@ class MainWindow(QMainWindow):
         main_layout.addWidget(splitter)
 
         self.db = Database()
+        # 树模型按页懒加载笔记，滚动到底部时由视图触发 fetchMore
+        self.file_model = NoteTreeModel(self.db, parent=self)
+        self.file_model.rowsInserted.connect(self.expand_inserted_notes)
+        self.file_tree.setModel(self.file_model)
+        self.file_model.fetchMore()
+        self.keyword_index = KeywordIndex()
+        self.keyword_index.build(self.db)
+        self.update_keyword_list()
         self.keyword_manager = KeywordManager(self.db)
         self.cloud_storage = CloudStorage()
+        # 同步在后台线程执行；写操作后自动防抖同步，设置 AUTO_SYNC=0 可关闭
+        self.auto_sync_enabled = os.environ.get('AUTO_SYNC', '1') != '0'
+        self.sync_scheduler = SyncScheduler(self.cloud_storage, self.db.db_path, parent=self)
+        self.job_manager = JobManager(max_workers=int(os.environ.get('JOB_MAX_WORKERS', 4)), parent=self)
+        self.job_items = {}
+        # 正在流式生成的 AI 响应：note_id -> 已收到的文本
+        self.streaming_responses = {}
         self.init_connections()
-        self.update_file_tree()
+        QTimer.singleShot(0, self.resume_ai_batches)
+        QTimer.singleShot(0, self.build_vector_index)
 
         font = QFont("Arial", 11)
         self.setFont(font)
@@ -222,6 +261,8 @@ class MainWindow(QMainWindow):
         self.delete_button.setStyleSheet(self.button_style)
         self.sync_button.setStyleSheet(self.button_style)
         self.call_ai_button.setStyleSheet(self.button_style)
+        self.cancel_job_button.setStyleSheet(self.button_style)
+        self.batch_ai_button.setStyleSheet(self.button_style)
 
         # 预览样式
         preview_style = """
@@ -241,23 +282,43 @@ class MainWindow(QMainWindow):
 
     def init_connections(self):
         self.drop_area.url_dropped.connect(self.handle_url_drop)
+        self.drop_area.urls_dropped.connect(self.handle_batch_drop)
         self.keyword_input.returnPressed.connect(self.handle_keyword_input)
         self.add_keyword_button.clicked.connect(self.handle_keyword_input)
         self.search_input.returnPressed.connect(self.handle_search)
         self.delete_button.clicked.connect(self.handle_delete_note)
         self.file_tree.clicked.connect(self.handle_tree_item_click)
+        self.keyword_list.itemSelectionChanged.connect(self.update_keyword_notes)
+        self.keyword_mode_combo.currentIndexChanged.connect(self.update_keyword_notes)
+        self.keyword_notes_list.itemClicked.connect(self.handle_note_item_click)
+        self.related_notes_list.itemClicked.connect(self.handle_note_item_click)
         
         # 添加新的同步按钮连接
         self.sync_button.clicked.connect(self.sync_with_oss)
+        self.sync_scheduler.sync_started.connect(self.handle_sync_started)
+        self.sync_scheduler.progress.connect(self.progress_bar.setValue)
+        self.sync_scheduler.status_changed.connect(self.statusBar().showMessage)
+        self.sync_scheduler.sync_finished.connect(self.handle_sync_finished)
 
         # 在 init_connections 方法中添加新的连接
         self.call_ai_button.clicked.connect(self.handle_call_ai)
+        self.batch_ai_button.clicked.connect(self.handle_batch_ai)
+
+        self.job_manager.job_added.connect(self.handle_job_added)
+        self.job_manager.job_status_changed.connect(self.handle_job_status_changed)
+        self.job_manager.job_done.connect(self.handle_job_done)
+        self.cancel_job_button.clicked.connect(self.handle_cancel_jobs)
 
     def handle_url_drop(self, url):
+        # 已导入过的链接不再抓取，直接定位到已有笔记
+        note_id = self.db.find_duplicate_note(url=url)
+        if note_id is not None:
+            self.show_existing_note(note_id, "该链接已导入过")
+            return
         self.drop_area.setText("正在抓取网页内容...")
-        self.scraper_thread = ScraperThread(url)
-        self.scraper_thread.result_ready.connect(self.handle_scrape_result)
-        self.scraper_thread.start()
+        self.job_manager.submit(f"抓取 {url}", lambda job: scrape_webpage(url),
+                                on_finished=self.handle_scrape_result,
+                                on_failed=lambda error: self.handle_scrape_result(None))
 
     def handle_scrape_result(self, result):
         self.drop_area.setText("将链接拖放到这")
@@ -267,9 +328,28 @@ class MainWindow(QMainWindow):
                                          f"域名: {result['domain']}\n\n"
                                          f"内容预览:\n{result['content'][:500]}...")
             self.current_note = result
+            self.prefill_keywords(result)
+            self.flag_near_duplicates(result)
         else:
             self.content_preview.setText("抓取网页内容失败")
 
+    def prefill_keywords(self, note):
+        # 输入框为空时填入本地推荐的关键词并全选，可直接回车添加，也可直接输入覆盖
+        if self.keyword_input.text().strip():
+            return
+        suggestions = suggest_keywords(self.db, note['content'], note.get('title'))
+        if suggestions:
+            self.keyword_input.setText(', '.join(suggestions))
+            self.keyword_input.selectAll()
+
+    def flag_near_duplicates(self, note):
+        # 正文与已有笔记近似重复（转载、重新导出的 PDF）时在状态栏提示，并在相关笔记中列出，点击即可打开；
+        # 是否仍然添加由用户决定
+        matches = self.db.find_near_duplicates(note['content'])
+        if matches:
+            self.show_related_notes(matches)
+            self.statusBar().showMessage(f"可能与已有笔记重复: {matches[0]['title']}（相似度 {matches[0]['score']:.0%}）")
+
     def split_keywords(self, keyword_string):
         # 使用正则表达式拆分关键，同时处理英文逗号
         return [kw.strip() for kw in re.split(r'[,，]', keyword_string) if kw.strip()]
@@ -279,15 +359,6 @@ class MainWindow(QMainWindow):
         if keyword_string and hasattr(self, 'current_note'):
             keywords = self.split_keywords(keyword_string)
             
-            creation_date_str = self.current_note.get('creation_date')
-            if creation_date_str:
-                try:
-                    creation_date = datetime.strptime(creation_date_str, "%Y-%m-%d %H:%M:%S%z")
-                except ValueError:
-                    creation_date = datetime.now(pytz.utc)
-            else:
-                creation_date = datetime.now(pytz.utc)
-
             note_id = self.db.add_note(
                 self.current_note['title'],
                 self.current_note['content'],
@@ -295,12 +366,14 @@ class MainWindow(QMainWindow):
                 domain=self.current_note.get('domain'),
                 keywords=keywords,
                 author=self.current_note.get('author'),
-                creation_date=creation_date.strftime("%Y-%m-%d %H:%M:%S"),
-                file_path=self.current_note.get('file_path')
+                creation_date=format_creation_date(self.current_note.get('creation_date')),
+                file_path=self.current_note.get('file_path'),
+                content_hash=self.current_note.get('file_hash')
             )
             if note_id:
                 self.keyword_input.clear()
-                self.update_file_tree()
+                self.refresh_note_views(note_id)
+                self.schedule_auto_sync()
                 print(f"已添加笔记和关键词: {', '.join(keywords)}")
             else:
                 print("添加笔记失败")
@@ -312,36 +385,67 @@ class MainWindow(QMainWindow):
         if keyword:
             results = self.db.search_notes(keyword)
             self.display_search_results(results)
+            self.show_related_notes(self.db.semantic_search(keyword))
         else:
             QMessageBox.warning(self, "搜索错误", "请输入要搜索的关键词")
 
     def update_file_tree(self):
-        self.file_model.clear()
-        self.file_model.setHorizontalHeaderLabels(['笔记结构'])
-        root = self.file_model.invisibleRootItem()
-
-        notes = self.db.get_all_notes_with_keywords()
-        
-        if notes is None:
-            logger.error("获取笔记失败")
+        # 与数据库比对后只更新变化的行，保留滚动位置和选中项；同步可能改动任意笔记，关键词索引整体重建
+        self.file_model.refresh()
+        self.keyword_index.build(self.db)
+        self.update_keyword_list()
+
+    def refresh_note_views(self, note_id, update_keywords=True):
+        # 单条笔记新增、删除或关键词变化后，增量更新树和关键词索引
+        note = self.file_model.refresh_note(note_id)
+        if note is None:
+            self.keyword_index.remove_note(note_id)
+        else:
+            self.keyword_index.set_note_keywords(note_id, note['keywords'])
+        if update_keywords:
+            self.update_keyword_list()
+
+    def update_keyword_list(self):
+        selected = {item.data(Qt.UserRole) for item in self.keyword_list.selectedItems()}
+        self.keyword_list.blockSignals(True)
+        self.keyword_list.clear()
+        for word, count in self.keyword_index.keyword_counts():
+            item = QListWidgetItem(f"{word} ({count})")
+            item.setData(Qt.UserRole, word)
+            self.keyword_list.addItem(item)
+            item.setSelected(word in selected)
+        self.keyword_list.blockSignals(False)
+        self.update_keyword_notes()
+
+    def update_keyword_notes(self):
+        # 在内存中对倒排表求交/并，只为显示的笔记查询标题
+        words = [item.data(Qt.UserRole) for item in self.keyword_list.selectedItems()]
+        note_ids = self.keyword_index.query(words, self.keyword_mode_combo.currentData())
+        shown = note_ids[:KEYWORD_NOTES_LIMIT]
+        titles = self.db.get_note_titles(shown)
+        self.keyword_notes_list.clear()
+        for note_id in shown:
+            item = QListWidgetItem(titles.get(note_id, ''))
+            item.setData(Qt.UserRole, note_id)
+            self.keyword_notes_list.addItem(item)
+        if len(note_ids) > KEYWORD_NOTES_LIMIT:
+            self.keyword_notes_list.addItem(f"... 共 {len(note_ids)} 条笔记")
+
+    def handle_note_item_click(self, item):
+        note_id = item.data(Qt.UserRole)
+        if note_id is None:
             return
+        self.delete_button.setEnabled(True)
+        self.call_ai_button.setEnabled(True)
+        self.current_note_id = note_id
+        self.display_note_content(note_id)
 
-        for note in notes:
-            note_item = QStandardItem(note['title'])
-            note_item.setData(note['id'])
-            root.appendRow(note_item)
-            
-            if note['keywords']:
-                keywords_str = ", ".join(note['keywords'])
-                keywords_item = QStandardItem(f"关键词: {keywords_str}")
-                
-                font = QFont()
-                font.setItalic(True)
-                keywords_item.setFont(font)
-                
-                note_item.appendRow(keywords_item)
-
-        self.file_tree.expandAll()
+    def expand_inserted_notes(self, parent, first, last):
+        if parent.isValid():
+            self.file_tree.expand(parent)
+            return
+        for row in range(first, last + 1):
+            self.file_tree.expand(self.file_model.index(row, 0))
 
     def display_search_results(self, results):
         self.content_preview.clear()
@@ -357,29 +461,28 @@ class MainWindow(QMainWindow):
             self.content_preview.append("\n" + "-"*50 + "\n")
 
     def handle_tree_item_click(self, index):
-        item = self.file_model.itemFromIndex(index)
-        parent = item.parent()
-        if parent is None:  # 这是一个笔记项
-            self.delete_button.setEnabled(True)
-            self.call_ai_button.setEnabled(True)  # 启用 AI 调用按钮
-            self.current_note_id = item.data()
-            self.display_note_content(self.current_note_id)
-        else:  # 这是一个关键词项
-            self.delete_button.setEnabled(True)
-            self.call_ai_button.setEnabled(True)  # 启用 AI 调用按钮
-            self.current_note_id = parent.data()
-            self.display_note_content(self.current_note_id)
+        # 笔记项和关键词项都对应同一条笔记
+        note_id = self.file_model.note_id(index)
+        if note_id is None:
+            return
+        self.delete_button.setEnabled(True)
+        self.call_ai_button.setEnabled(True)  # 启用 AI 调用按钮
+        self.current_note_id = note_id
+        self.display_note_content(self.current_note_id)
 
     def display_note_content(self, note_id):
         note = self.db.get_note_by_id(note_id)
         if note:
+            self.show_related_notes(self.db.find_related_notes(note_id))
             self.content_preview.setText(f"标题: {note['title']}\n\n"
                                          f"URL: {note['url']}\n"
                                          f"作者: {note['author']}\n"
                                          f"创建日期: {note['creation_date']}\n"
                                          f"关键词: {', '.join(note['keywords'])}\n\n"
-                                         f"内容预览:\n{note['content'][:500]}...")
-            if note.get('ai_response'):
+                                         f"内容预览:\n{note['preview'] or ''}...")
+            if note_id in self.streaming_responses:
+                self.ai_response_display.setPlainText(self.streaming_responses[note_id])
+            elif note.get('ai_response'):
                 self.ai_response_display.setText(note['ai_response'])
             else:
                 self.ai_response_display.clear()
@@ -387,6 +490,30 @@ class MainWindow(QMainWindow):
             self.content_preview.setText("无法加载笔记内容")
             self.ai_response_display.clear()
 
+    def show_related_notes(self, matches):
+        self.related_notes_list.clear()
+        for match in matches:
+            item = QListWidgetItem(f"{match['title']} ({match['score']:.2f})")
+            item.setData(Qt.UserRole, match['id'])
+            self.related_notes_list.addItem(item)
+
+    def build_vector_index(self):
+        # 首次运行或向量文件被删除时要为全部笔记计算向量，放到后台线程，避免第一次点开笔记时卡住
+        self.job_manager.submit("建立相似度索引", lambda job: self.run_vector_job(self.db.db_path),
+                                on_finished=self.handle_vector_result)
+
+    def run_vector_job(self, db_path):
+        # 后台线程使用独立的数据库连接
+        db = Database(db_path)
+        try:
+            return db.refresh_vectors()
+        finally:
+            db.close()
+
+    def handle_vector_result(self, updated):
+        if updated:
+            self.statusBar().showMessage(f"已为 {updated} 条笔记建立相似度索引", 5000)
+
     def handle_delete_note(self):
         if hasattr(self, 'current_note_id'):
             note = self.db.get_note_by_id(self.current_note_id)
@@ -397,7 +524,8 @@ class MainWindow(QMainWindow):
                 if reply == QMessageBox.Yes:
                     if self.db.delete_note(self.current_note_id):
                         QMessageBox.information(self, "成功", "笔记已成功删除")
-                        self.update_file_tree()
+                        self.refresh_note_views(self.current_note_id)
+                        self.schedule_auto_sync()
                         self.content_preview.clear()
                     else:
                         QMessageBox.warning(self, "错误", "删除笔记失败")
@@ -410,7 +538,10 @@ class MainWindow(QMainWindow):
 
     def handle_drop(self, event):
         mime_data = event.mimeData()
-        if mime_data.hasUrls():
+        if mime_data.hasUrls() and len(mime_data.urls()) > 1:
+            urls = mime_data.urls()
+            self.handle_batch_drop([url.toLocalFile() if url.isLocalFile() else url.toString() for url in urls])
+        elif mime_data.hasUrls():
             url = mime_data.urls()[0]
             if url.isLocalFile():
                 file_path = url.toLocalFile()
@@ -423,10 +554,51 @@ class MainWindow(QMainWindow):
         event.acceptProposedAction()
 
     def handle_pdf_drop(self, file_path):
+        # 先计算文件哈希，已导入过的文件不再解析
         self.drop_area.setText("正在处理 PDF 文件...")
-        pdf_info = extract_pdf_info(file_path)
+        self.job_manager.submit(f"校验 {os.path.basename(file_path)}", lambda job: calculate_file_hash(file_path, 'sha256'),
+                                on_finished=lambda file_hash: self.handle_pdf_hash(file_path, file_hash),
+                                on_failed=lambda error: self.handle_pdf_result(None))
+
+    def handle_pdf_hash(self, file_path, file_hash):
+        note_id = self.db.find_duplicate_note(content_hash=file_hash)
+        if note_id is not None:
+            self.show_existing_note(note_id, "该文件已导入过")
+            return
+        self.job_manager.submit(f"解析 {os.path.basename(file_path)}", lambda job: self.run_pdf_job(job, file_path, file_hash),
+                                on_finished=self.handle_pdf_result,
+                                on_failed=lambda error: self.handle_pdf_result(None))
+
+    def show_existing_note(self, note_id, message):
+        self.drop_area.setText("将链接拖放到这里")
+        if hasattr(self, 'current_note'):
+            del self.current_note
+        index = self.file_model.index_for_note(note_id)
+        if index.isValid():
+            self.file_tree.setCurrentIndex(index)
+            self.file_tree.scrollTo(index)
+        self.current_note_id = note_id
+        self.delete_button.setEnabled(True)
+        self.call_ai_button.setEnabled(True)
+        self.display_note_content(note_id)
+        self.statusBar().showMessage(f"{message}，已定位到已有笔记", 5000)
+
+    def run_pdf_job(self, job, file_path, file_hash=None):
+        # 在线程池中执行；每解析完一页报告一次进度并检查是否已取消
+        pages_done = [0]
+
+        def on_page(index, text, page_count):
+            pages_done[0] += 1
+            job.report_progress(pages_done[0], page_count)
+            job.check_cancelled()
+
+        return extract_pdf_info(file_path, on_page=on_page, file_hash=file_hash)
+
+    def handle_pdf_result(self, pdf_info):
         if pdf_info:
             self.current_note = pdf_info
+            self.prefill_keywords(pdf_info)
+            self.flag_near_duplicates(pdf_info)
             self.content_preview.setText(f"标题: {pdf_info['title']}\n\n"
                                          f"作者: {pdf_info['author']}\n"
                                          f"创建日期: {pdf_info['creation_date']}\n"
@@ -436,73 +608,122 @@ class MainWindow(QMainWindow):
         else:
             self.drop_area.setText("PDF 文件处理失败")
 
+    def handle_batch_drop(self, sources):
+        # 批量导入时，关键词输入框中的关键词应用到所有笔记
+        keywords = self.split_keywords(self.keyword_input.text().strip())
+        self.drop_area.setText(f"正在批量导入 {len(sources)} 项...")
+        self.job_manager.submit(f"批量导入 {len(sources)} 项",
+                                lambda job: self.run_batch_job(job, self.db.db_path, sources, keywords),
+                                on_finished=self.handle_batch_results,
+                                on_failed=lambda error: self.handle_batch_results([]))
+
+    def run_batch_job(self, job, db_path, sources, keywords):
+        # SQLite 连接不能跨线程使用，在工作线程中单独打开；取消发生在写入数据库之前
+        def on_progress(done, total):
+            job.report_progress(done, total)
+            job.check_cancelled()
+
+        db = Database(db_path)
+        try:
+            return ingest_batch(db, sources, keywords=keywords, progress_callback=on_progress)
+        finally:
+            db.close()
+
+    def handle_batch_results(self, results):
+        self.drop_area.setText("将链接拖放到这里")
+        succeeded = [r for r in results if r['ok']]
+        failed = [r for r in results if not r['ok']]
+        self.content_preview.setText(f"批量导入完成: 成功 {len(succeeded)}，失败 {len(failed)}")
+        for result in succeeded:
+            suffix = "（已存在）" if result.get('duplicate') else ""
+            if result.get('similar_to'):
+                suffix = f"（可能与「{result['similar_to']['title']}」重复）"
+            self.content_preview.append(f"✓ {result['title']}{suffix}")
+        for result in failed:
+            self.content_preview.append(f"✗ {result['source']}: {result['error']}")
+        if succeeded:
+            self.keyword_input.clear()
+            for result in succeeded:
+                self.refresh_note_views(result['note_id'], update_keywords=False)
+            self.update_keyword_list()
+            self.schedule_auto_sync()
+
     def dragEnterEvent(self, event):
         if event.mimeData().hasUrls():
             event.acceptProposedAction()
 
     def sync_with_oss(self):
-        try:
-            self.sync_button.setEnabled(False)
-            self.sync_button.setText("正在同步...")
-            self.progress_bar.setVisible(True)
-            self.progress_bar.setValue(0)
-
-            local_hash = self.calculate_file_hash(self.db.db_path)
-            cloud_hash = self.cloud_storage.get_cloud_file_hash(self.cloud_storage.cloud_db_name)
-
-            if local_hash != cloud_hash:
-                self.progress_bar.setValue(25)
-                self.db.close()
+        self.sync_scheduler.sync_now()
 
-                cloud_db_path = self.cloud_storage.download_database_temp()
-                cloud_db = Database(cloud_db_path)
+    def schedule_auto_sync(self):
+        if self.auto_sync_enabled:
+            self.sync_scheduler.schedule_sync()
 
-                self.progress_bar.setValue(50)
-                self.merge_databases(self.db, cloud_db)
+    def handle_sync_started(self):
+        self.sync_button.setEnabled(False)
+        self.sync_button.setText("正在同步...")
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setValue(0)
 
-                self.progress_bar.setValue(75)
-                self.cloud_storage.upload_database()
-
-                self.db = Database()
-                self.keyword_manager = KeywordManager(self.db)
-
-                self.update_file_tree()
-                self.progress_bar.setValue(100)
-                self.statusBar().showMessage("同步成功", 3000)
-            else:
-                self.progress_bar.setValue(100)
-                self.statusBar().showMessage("本地数据已是最新，无需同步", 3000)
-        except Exception as e:
-            logging.error(f"同步失败: {str(e)}", exc_info=True)
-            self.statusBar().showMessage(f"同步失败: {str(e)}", 5000)
-        finally:
-            self.sync_button.setEnabled(True)
-            self.sync_button.setText("同步到阿里云 OSS")
-            self.progress_bar.setVisible(False)
-
-    def calculate_file_hash(self, file_path):
-        hasher = hashlib.md5()
-        with open(file_path, 'rb') as f:
-            buf = f.read()
-            hasher.update(buf)
-        return hasher.hexdigest()
-
-    def merge_databases(self, local_db, cloud_db):
-        # 实现数据库合并逻辑
-        pass
+    def handle_sync_finished(self, success, message):
+        self.sync_button.setEnabled(True)
+        self.sync_button.setText("同步到阿里云 OSS")
+        self.progress_bar.setVisible(False)
+        if success:
+            self.update_file_tree()
+            self.statusBar().showMessage(message, 3000)
+        else:
+            self.statusBar().showMessage(f"同步失败: {message}", 5000)
+
+    def handle_job_added(self, job_id, name):
+        item = QListWidgetItem()
+        item.setData(Qt.UserRole, job_id)
+        item.setData(Qt.UserRole + 1, name)
+        self.job_list.addItem(item)
+        self.job_items[job_id] = item
+
+    def handle_job_status_changed(self, job_id, status):
+        item = self.job_items.get(job_id)
+        if item:
+            item.setText(f"#{job_id} {item.data(Qt.UserRole + 1)} — {status}")
+
+    def handle_job_done(self, job_id):
+        # 结束的任务保留几秒以便查看结果，然后从列表中移除
+        QTimer.singleShot(5000, lambda: self.remove_job_item(job_id))
+
+    def remove_job_item(self, job_id):
+        item = self.job_items.pop(job_id, None)
+        if item:
+            self.job_list.takeItem(self.job_list.row(item))
+
+    def handle_cancel_jobs(self):
+        for item in self.job_list.selectedItems():
+            self.job_manager.cancel(item.data(Qt.UserRole))
+
+    def closeEvent(self, event):
+        self.job_manager.shutdown()
+        self.sync_scheduler.stop()
+        self.db.close()
+        super().closeEvent(event)
 
     # 添加新的方法来处理调用大模型的逻辑
     def handle_call_ai(self):
         if hasattr(self, 'current_note_id'):
             prompt = self.ai_prompt_input.toPlainText().strip()
             if prompt:
-                self.call_ai_button.setEnabled(False)
-                self.call_ai_button.setText("正在调用...")
                 note = self.db.get_note_by_id(self.current_note_id)
                 if note:
-                    self.ai_thread = AIThread(note['content'], prompt)
-                    self.ai_thread.result_ready.connect(self.handle_ai_result)
-                    self.ai_thread.start()
+                    # 提交时绑定笔记和 prompt，结果返回前切换笔记也不会写错位置
+                    note_id = note['id']
+                    content = self.db.get_note_content(note_id) or ''
+                    refresh = self.refresh_ai_checkbox.isChecked()
+                    self.streaming_responses[note_id] = ""
+                    self.ai_response_display.clear()
+                    self.job_manager.submit(f"AI: {note['title']}", lambda job: self.run_ai_job(job, content, prompt, refresh),
+                                            on_partial=lambda chunk: self.handle_ai_chunk(note_id, chunk),
+                                            on_finished=lambda result: self.handle_ai_result(note_id, prompt, result),
+                                            on_failed=lambda error: self.handle_ai_result(note_id, prompt, None),
+                                            on_cancelled=lambda: self.handle_ai_cancelled(note_id))
                 else:
                     QMessageBox.warning(self, "错误", "无法获取笔记内容")
             else:
@@ -510,31 +731,111 @@ class MainWindow(QMainWindow):
         else:
             QMessageBox.warning(self, "提示", "请先选择一个笔记")
 
-    def handle_ai_result(self, result):
-        self.call_ai_button.setEnabled(True)
-        self.call_ai_button.setText("调用大模型")
-        if result:
-            self.update_note_with_ai_response(result)
-            self.ai_response_display.setText(result)
+    def run_ai_job(self, job, content, prompt, refresh):
+        # 长笔记先分段并发处理，再对汇总调用流式输出
+        if needs_chunking(content):
+            def on_progress(done, total):
+                job.report_progress(done, total)
+                job.check_cancelled()
+
+            partials = map_chunks(split_into_chunks(content), prompt, refresh=refresh, progress_callback=on_progress)
+            content = build_reduce_input(partials)
+            prompt = build_reduce_prompt(prompt)
+
+        # 增量输出逐块发回界面线程，取消时停止读取剩余的流
+        chunks = []
+        for chunk in stream_ai_model(content, prompt, refresh=refresh):
+            job.check_cancelled()
+            chunks.append(chunk)
+            job.emit_partial(chunk)
+        return "".join(chunks)
+
+    def handle_ai_chunk(self, note_id, chunk):
+        if note_id not in self.streaming_responses:
+            return
+        self.streaming_responses[note_id] += chunk
+        if getattr(self, 'current_note_id', None) == note_id:
+            cursor = self.ai_response_display.textCursor()
+            cursor.movePosition(QTextCursor.End)
+            cursor.insertText(chunk)
             self.ai_response_display.ensureCursorVisible()
+
+    def handle_ai_result(self, note_id, prompt, result):
+        self.streaming_responses.pop(note_id, None)
+        if result:
+            self.update_note_with_ai_response(note_id, prompt, result)
         else:
             QMessageBox.warning(self, "错误", "调用大模型失败")
 
-    def update_note_with_ai_response(self, ai_response):
-        if hasattr(self, 'current_note_id'):
-            current_note = self.db.get_note_by_id(self.current_note_id)
-            if current_note:
-                ai_prompt = self.ai_prompt_input.toPlainText().strip()
-                success = self.db.update_note(self.current_note_id, ai_prompt=ai_prompt, ai_response=ai_response)
-                if success:
-                    self.display_note_content(self.current_note_id)  # 刷新显示
-                    QMessageBox.information(self, "成功", "笔记已更新")
-                else:
-                    QMessageBox.warning(self, "错误", "更新笔记失败")
+    def handle_ai_cancelled(self, note_id):
+        # 取消后丢弃已生成的部分，恢复显示已保存的响应
+        self.streaming_responses.pop(note_id, None)
+        if getattr(self, 'current_note_id', None) == note_id:
+            self.display_note_content(note_id)
+
+    def handle_batch_ai(self):
+        query = self.search_input.text().strip()
+        prompt = self.ai_prompt_input.toPlainText().strip()
+        if not query or not prompt:
+            QMessageBox.warning(self, "提示", "请在搜索框输入关键词或搜索词，并输入 prompt")
+            return
+        note_ids = self.db.get_note_ids_matching(query)
+        if not note_ids:
+            QMessageBox.information(self, "提示", "没有匹配的笔记")
+            return
+        reply = QMessageBox.question(self, '确认批量调用',
+                                     f'将对 {len(note_ids)} 条笔记调用大模型，已有的 AI 响应会被覆盖。继续吗？',
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply == QMessageBox.Yes:
+            batch_id = self.db.create_ai_batch(prompt, DEFAULT_MODEL, note_ids, query=query)
+            if batch_id:
+                self.start_ai_batch(batch_id, f"批量 AI: {query}")
+            else:
+                QMessageBox.warning(self, "错误", "创建批量任务失败")
+
+    def resume_ai_batches(self):
+        # 上次退出或崩溃时未完成的批次，询问后继续
+        batches = self.db.get_unfinished_ai_batches()
+        if not batches:
+            return
+        pending = sum(batch['pending'] or 0 for batch in batches)
+        reply = QMessageBox.question(self, '继续批量调用',
+                                     f'有 {len(batches)} 个未完成的批量 AI 任务（{pending} 条笔记待处理），是否继续？',
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+        for batch in batches:
+            if reply == QMessageBox.Yes:
+                self.start_ai_batch(batch['id'], f"批量 AI: {batch['query']}")
             else:
-                QMessageBox.warning(self, "错误", "无法获取当前笔记")
+                self.db.finish_ai_batch(batch['id'])
+
+    def start_ai_batch(self, batch_id, name):
+        self.job_manager.submit(name, lambda job: self.run_ai_batch_job(job, self.db.db_path, batch_id),
+                                on_finished=self.handle_ai_batch_result,
+                                on_failed=lambda error: QMessageBox.warning(self, "错误", f"批量调用失败: {error}"))
+
+    def run_ai_batch_job(self, job, db_path, batch_id):
+        db = Database(db_path)
+        try:
+            return run_ai_batch(db, batch_id, progress_callback=job.report_progress, should_stop=job.is_cancelled)
+        finally:
+            db.close()
+
+    def handle_ai_batch_result(self, batch):
+        self.statusBar().showMessage(f"批量调用完成: 成功 {batch['done']}，失败 {batch['failed']}", 5000)
+        if hasattr(self, 'current_note_id'):
+            self.display_note_content(self.current_note_id)
+        self.schedule_auto_sync()
+
+    def update_note_with_ai_response(self, note_id, ai_prompt, ai_response):
+        success = self.db.update_note(note_id, ai_prompt=ai_prompt, ai_response=ai_response)
+        if success:
+            if getattr(self, 'current_note_id', None) == note_id:
+                self.display_note_content(note_id)  # 刷新显示
+                self.ai_response_display.ensureCursorVisible()
+            self.schedule_auto_sync()
+            self.statusBar().showMessage("笔记已更新", 3000)
         else:
-            QMessageBox.warning(self, "错误", "没有选中的笔记")
+            QMessageBox.warning(self, "错误", "更新笔记失败")
 
     def create_horizontal_line(self):
         line = QFrame()
@@ -0,0 +1,183 @@
+import bisect
+from PyQt5.QtCore import Qt, QAbstractItemModel, QModelIndex
+from PyQt5.QtGui import QFont
+
+PAGE_SIZE = 200
+
+
+# 笔记树模型：第一层是笔记，每条笔记下最多一行关键词
+# 按 id 分页懒加载，增删改只更新受影响的行，不重建整个模型
+class NoteTreeModel(QAbstractItemModel):
+    def __init__(self, db, page_size=PAGE_SIZE, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.page_size = page_size
+        self.notes = []
+        self.ids = []
+        self.exhausted = False
+        self.fetching = False
+        # 所有关键词行共用一个字体对象
+        self.keyword_font = QFont()
+        self.keyword_font.setItalic(True)
+
+    # 笔记行的 internalId 为 0，关键词行的 internalId 为所属笔记的 id
+    def index(self, row, column, parent=QModelIndex()):
+        if column != 0 or row < 0:
+            return QModelIndex()
+        if not parent.isValid():
+            if row < len(self.notes):
+                return self.createIndex(row, 0, 0)
+            return QModelIndex()
+        if parent.internalId() == 0 and row == 0 and self.notes[parent.row()]['keywords']:
+            return self.createIndex(0, 0, self.notes[parent.row()]['id'])
+        return QModelIndex()
+
+    def parent(self, index):
+        if not index.isValid() or index.internalId() == 0:
+            return QModelIndex()
+        row = self.row_of(index.internalId())
+        if row is None:
+            return QModelIndex()
+        return self.createIndex(row, 0, 0)
+
+    def rowCount(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return len(self.notes)
+        if parent.internalId() == 0:
+            return 1 if self.notes[parent.row()]['keywords'] else 0
+        return 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole and section == 0:
+            return '笔记结构'
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if index.internalId() == 0:
+            note = self.notes[index.row()]
+            if role == Qt.DisplayRole:
+                return note['title']
+            if role == Qt.UserRole:
+                return note['id']
+            return None
+        row = self.row_of(index.internalId())
+        if row is None:
+            return None
+        note = self.notes[row]
+        if role == Qt.DisplayRole:
+            return f"关键词: {', '.join(note['keywords'])}"
+        if role == Qt.FontRole:
+            return self.keyword_font
+        if role == Qt.UserRole:
+            return note['id']
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted and not self.fetching
+
+    def fetchMore(self, parent=QModelIndex()):
+        # 视图可能在插入通知中再次调用 fetchMore，此时上一页尚未加入，需避免重复加载
+        if parent.isValid() or self.exhausted or self.fetching:
+            return
+        self.fetching = True
+        try:
+            after_id = self.ids[-1] if self.ids else 0
+            page = self.db.get_notes_page(after_id, self.page_size)
+            if len(page) < self.page_size:
+                self.exhausted = True
+            if not page:
+                return
+            self.beginInsertRows(QModelIndex(), len(self.notes), len(self.notes) + len(page) - 1)
+            self.notes.extend(page)
+            self.ids.extend(note['id'] for note in page)
+            self.endInsertRows()
+        finally:
+            self.fetching = False
+
+    def row_of(self, note_id):
+        row = bisect.bisect_left(self.ids, note_id)
+        if row < len(self.ids) and self.ids[row] == note_id:
+            return row
+        return None
+
+    def note_id(self, index):
+        return self.data(index, Qt.UserRole) if index.isValid() else None
+
+    def index_for_note(self, note_id):
+        row = self.row_of(note_id)
+        return self.createIndex(row, 0, 0) if row is not None else QModelIndex()
+
+    def loaded_max_id(self):
+        # 还有未加载的页时，新笔记留给 fetchMore 加载
+        if self.exhausted:
+            return None
+        return self.ids[-1] if self.ids else 0
+
+    def insert_note(self, note):
+        max_id = self.loaded_max_id()
+        if max_id is not None and note['id'] > max_id:
+            return
+        row = bisect.bisect_left(self.ids, note['id'])
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.notes.insert(row, note)
+        self.ids.insert(row, note['id'])
+        self.endInsertRows()
+
+    def remove_note(self, note_id):
+        row = self.row_of(note_id)
+        if row is None:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.notes[row]
+        del self.ids[row]
+        self.endRemoveRows()
+
+    def update_note(self, note):
+        row = self.row_of(note['id'])
+        if row is None:
+            return
+        parent = self.createIndex(row, 0, 0)
+        old = self.notes[row]
+        # 关键词行的出现或消失要作为行插入/删除通知视图
+        if old['keywords'] and not note['keywords']:
+            self.beginRemoveRows(parent, 0, 0)
+            self.notes[row] = note
+            self.endRemoveRows()
+        elif not old['keywords'] and note['keywords']:
+            self.beginInsertRows(parent, 0, 0)
+            self.notes[row] = note
+            self.endInsertRows()
+        else:
+            self.notes[row] = note
+            if note['keywords']:
+                child = self.createIndex(0, 0, note['id'])
+                self.dataChanged.emit(child, child)
+        self.dataChanged.emit(parent, parent)
+
+    def refresh_note(self, note_id):
+        # 单条笔记新增、修改或删除后调用，返回笔记摘要（已删除时为 None）
+        note = self.db.get_note_summary(note_id)
+        if note is None:
+            self.remove_note(note_id)
+        elif self.row_of(note_id) is None:
+            self.insert_note(note)
+        elif note != self.notes[self.row_of(note_id)]:
+            self.update_note(note)
+        return note
+
+    def refresh(self):
+        # 批量导入或同步后与数据库比对已加载的范围，只对变化的行发出增删改通知
+        current = {note['id']: note for note in self.db.get_notes_page(0, -1, self.loaded_max_id())}
+        for note_id in [note_id for note_id in self.ids if note_id not in current]:
+            self.remove_note(note_id)
+        for note_id, note in current.items():
+            row = self.row_of(note_id)
+            if row is None:
+                self.insert_note(note)
+            elif self.notes[row] != note:
+                self.update_note(note)
@@ -0,0 +1,114 @@
+import os
+import logging
+from PyQt5.QtCore import QObject, QThread, QTimer, pyqtSignal, pyqtSlot
+
+# 写操作后等待的静默期，期间的多次修改合并为一次同步
+DEFAULT_SYNC_DELAY_MS = 10 * 1000
+RETRY_BASE_DELAY_MS = 2 * 1000
+RETRY_MAX_DELAY_MS = 5 * 60 * 1000
+
+
+# 在工作线程中执行同步：下载云端变更、合并、上传本地快照（CloudStorage.sync_database），使用独立的数据库连接
+class SyncWorker(QObject):
+    progress = pyqtSignal(int)
+    status_changed = pyqtSignal(str)
+    finished = pyqtSignal(bool, str)
+
+    def __init__(self, cloud_storage, db_path):
+        super().__init__()
+        self.cloud_storage = cloud_storage
+        self.db_path = db_path
+
+    @pyqtSlot()
+    def run_sync(self):
+        try:
+            self.progress.emit(0)
+            self.status_changed.emit("正在检查同步状态...")
+            # 同步清单记录了上次同步的状态，只需一次 HEAD 请求和本地 stat
+            if not self.cloud_storage.needs_sync():
+                self.progress.emit(100)
+                self.finished.emit(True, "本地数据已是最新，无需同步")
+                return
+
+            self.cloud_storage.sync_database(self.db_path, progress_callback=self.progress.emit,
+                                             status_callback=self.status_changed.emit)
+            self.progress.emit(100)
+            self.finished.emit(True, "同步成功")
+        except Exception as e:
+            logging.error(f"同步失败: {str(e)}", exc_info=True)
+            self.finished.emit(False, str(e))
+
+
+# 运行在界面线程：对写操作做防抖，串行调度工作线程中的同步，失败后指数退避重试
+class SyncScheduler(QObject):
+    start_requested = pyqtSignal()
+    sync_started = pyqtSignal()
+    progress = pyqtSignal(int)
+    status_changed = pyqtSignal(str)
+    sync_finished = pyqtSignal(bool, str)
+
+    def __init__(self, cloud_storage, db_path, delay_ms=None, parent=None):
+        super().__init__(parent)
+        self.delay_ms = delay_ms if delay_ms is not None else int(os.environ.get('AUTO_SYNC_DELAY_MS', DEFAULT_SYNC_DELAY_MS))
+        self.running = False
+        self.pending = False
+        self.retry_count = 0
+
+        self.thread = QThread()
+        self.worker = SyncWorker(cloud_storage, db_path)
+        self.worker.moveToThread(self.thread)
+        self.start_requested.connect(self.worker.run_sync)
+        self.worker.progress.connect(self.progress)
+        self.worker.status_changed.connect(self.status_changed)
+        self.worker.finished.connect(self.handle_worker_finished)
+        self.thread.start()
+
+        self.debounce_timer = QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.timeout.connect(self.start_sync)
+
+        self.retry_timer = QTimer(self)
+        self.retry_timer.setSingleShot(True)
+        self.retry_timer.timeout.connect(self.start_sync)
+
+    def schedule_sync(self):
+        # 每次写操作重新计时，静默期结束后只同步一次
+        self.pending = True
+        if not self.running and not self.retry_timer.isActive():
+            self.debounce_timer.start(self.delay_ms)
+
+    def sync_now(self):
+        self.pending = True
+        self.debounce_timer.stop()
+        self.retry_timer.stop()
+        self.start_sync()
+
+    def start_sync(self):
+        if self.running:
+            return
+        self.running = True
+        self.pending = False
+        self.sync_started.emit()
+        self.start_requested.emit()
+
+    def handle_worker_finished(self, success, message):
+        self.running = False
+        if success:
+            self.retry_count = 0
+            self.sync_finished.emit(True, message)
+            if self.pending:
+                self.debounce_timer.start(self.delay_ms)
+            return
+
+        # 离线或云端出错时保留待同步状态，按指数退避重试
+        self.pending = True
+        delay = min(RETRY_BASE_DELAY_MS * (2 ** self.retry_count), RETRY_MAX_DELAY_MS)
+        self.retry_count += 1
+        self.retry_timer.start(delay)
+        self.sync_finished.emit(False, f"{message}（{delay // 1000} 秒后重试）")
+
+    def stop(self):
+        self.debounce_timer.stop()
+        self.retry_timer.stop()
+        self.thread.quit()
+        self.thread.wait()
@@ -5,8 +5,8 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from PyQt5.QtWidgets import QApplication
-from gui.main_window import MainWindow
-from core.cloud_storage import CloudStorage
+from src.gui.main_window import MainWindow
+from src.core.cloud_storage import CloudStorage
 from src.core.logging_config import logger
 
 def main():
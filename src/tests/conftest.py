@@ -0,0 +1,33 @@
+import os
+import pytest
+from src.core.database import Database
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / 'notes.db'))
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def open_db(tmp_path):
+    # 同步的两端等需要多个数据库时使用；不切换到 WAL，与从云端下载的副本一样保持文件原有的日志模式
+    opened = []
+
+    def open_db(name):
+        db = Database(str(tmp_path / name), journal_mode=None)
+        opened.append(db)
+        return db
+
+    yield open_db
+    for db in opened:
+        db.close()
+
+
+@pytest.fixture(scope='session')
+def qapp():
+    # 界面模型和定时器需要 Qt 应用实例；无显示环境时用 offscreen 平台
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtGui import QGuiApplication
+    return QGuiApplication.instance() or QGuiApplication([])
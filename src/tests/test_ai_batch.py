@@ -0,0 +1,89 @@
+import pytest
+from src.core import ai_batch
+from src.core.ai_handler import AIRequestError, EMPTY_RESPONSE_CODE
+
+
+class CountingLimiter:
+    def __init__(self):
+        self.acquired = 0
+
+    def acquire(self):
+        self.acquired += 1
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(ai_batch.time, 'sleep', lambda seconds: None)
+
+
+def test_cache_hit_takes_no_token(monkeypatch):
+    monkeypatch.setattr(ai_batch, 'get_cached_response', lambda *args: '缓存结果')
+    monkeypatch.setattr(ai_batch, 'generate', lambda *args, **kwargs: pytest.fail("不应发出请求"))
+    limiter = CountingLimiter()
+    assert ai_batch.call_with_retry('正文', 'prompt', limiter) == '缓存结果'
+    assert limiter.acquired == 0
+
+
+def test_refresh_skips_cache(monkeypatch):
+    monkeypatch.setattr(ai_batch, 'get_cached_response', lambda *args: '缓存结果')
+    monkeypatch.setattr(ai_batch, 'generate', lambda *args, **kwargs: '新结果')
+    limiter = CountingLimiter()
+    assert ai_batch.call_with_retry('正文', 'prompt', limiter, refresh=True) == '新结果'
+    assert limiter.acquired == 1
+
+
+def test_empty_response_is_retried(monkeypatch):
+    responses = [AIRequestError(200, EMPTY_RESPONSE_CODE, ''), '结果']
+
+    def generate(*args, **kwargs):
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    monkeypatch.setattr(ai_batch, 'get_cached_response', lambda *args: None)
+    monkeypatch.setattr(ai_batch, 'generate', generate)
+    limiter = CountingLimiter()
+    assert ai_batch.call_with_retry('正文', 'prompt', limiter) == '结果'
+    assert limiter.acquired == 2
+
+
+def test_persistent_empty_response_fails(monkeypatch):
+    def generate(*args, **kwargs):
+        raise AIRequestError(200, EMPTY_RESPONSE_CODE, '')
+
+    monkeypatch.setattr(ai_batch, 'get_cached_response', lambda *args: None)
+    monkeypatch.setattr(ai_batch, 'generate', generate)
+    with pytest.raises(AIRequestError):
+        ai_batch.call_with_retry('正文', 'prompt', CountingLimiter())
+
+
+def test_generate_rejects_empty_text(monkeypatch):
+    from src.core import ai_handler
+
+    class Output:
+        text = ''
+
+    class Response:
+        status_code = 200
+        output = Output()
+
+    monkeypatch.setattr(ai_handler.dashscope.Generation, 'call', lambda **kwargs: Response())
+    with pytest.raises(AIRequestError) as error:
+        ai_handler.generate('正文', 'prompt', use_cache=False)
+    assert error.value.is_retryable()
+
+
+def test_deleted_note_does_not_block_batch(db, monkeypatch):
+    monkeypatch.setattr(ai_batch, 'get_cached_response', lambda *args: None)
+    monkeypatch.setattr(ai_batch, 'generate', lambda *args, **kwargs: '结果')
+    kept = db.add_note('保留', '正文', url='https://example.com/a')
+    deleted = db.add_note('删除', '正文', url='https://example.com/b')
+    batch_id = db.create_ai_batch('prompt', 'model', [kept, deleted])
+    db.delete_note(deleted)
+    assert db.get_ai_batch(batch_id)['pending'] == 1
+
+    batch = ai_batch.run_ai_batch(db, batch_id, limiter=CountingLimiter())
+    assert (batch['pending'], batch['done'], batch['skipped']) == (0, 1, 1)
+    assert batch['finished_at'] is not None
+    assert db.get_unfinished_ai_batches() == []
@@ -0,0 +1,40 @@
+from src.core import ai_chunking
+from src.core.ai_chunking import split_into_chunks, map_chunks, estimate_tokens
+
+MAX_TOKENS = 1000
+
+
+def make_paragraphs(count):
+    return [f'第 {index} 段。' + '这一段讨论文档分段处理的细节，内容各不相同。' * (1 + index % 5) for index in range(count)]
+
+
+def test_chunks_respect_budget_and_keep_all_text():
+    paragraphs = make_paragraphs(400)
+    chunks = split_into_chunks('\n\n'.join(paragraphs), MAX_TOKENS)
+    assert len(chunks) > 5
+    assert all(estimate_tokens(chunk) <= MAX_TOKENS for chunk in chunks)
+    assert '\n\n'.join(chunks) == '\n\n'.join(paragraphs)
+
+
+def test_editing_first_chunk_keeps_later_chunks_cached(monkeypatch):
+    cache = {}
+    requests = []
+
+    def call_ai_model(content, prompt, *args):
+        if content not in cache:
+            requests.append(content)
+            cache[content] = f'摘要{len(cache)}'
+        return cache[content]
+
+    monkeypatch.setattr(ai_chunking, 'call_ai_model', call_ai_model)
+    paragraphs = make_paragraphs(400)
+    chunks = split_into_chunks('\n\n'.join(paragraphs), MAX_TOKENS)
+    map_chunks(chunks, 'prompt', max_workers=1)
+
+    # 在第一段补充内容：按长度贪心合并时之后的切分点全部后移；内容定义的切分点不受影响，其余各段命中缓存
+    paragraphs[0] += '补充的说明。' * 20
+    requests.clear()
+    edited = split_into_chunks('\n\n'.join(paragraphs), MAX_TOKENS)
+    map_chunks(edited, 'prompt', max_workers=1)
+    assert edited[1:] == chunks[1:]
+    assert requests == [edited[0]]
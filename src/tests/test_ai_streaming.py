@@ -0,0 +1,92 @@
+from http import HTTPStatus
+from types import SimpleNamespace
+import pytest
+from src.core import ai_handler
+from src.core.ai_cache import AICache
+from src.core.ai_handler import AIRequestError, stream_ai_model
+
+
+def chunk(text):
+    return SimpleNamespace(status_code=HTTPStatus.OK, code='', message='', output=SimpleNamespace(text=text))
+
+
+def failure(status_code, code):
+    return SimpleNamespace(status_code=status_code, code=code, message='出错了', output=None)
+
+
+class FakeGeneration:
+    # 每次调用依次取出一组流式响应；元素为异常时在迭代到该处时抛出，模拟连接中断
+    def __init__(self, *streams):
+        self.streams = list(streams)
+        self.calls = []
+
+    def call(self, **kwargs):
+        self.calls.append(kwargs)
+        return self.iterate(self.streams.pop(0))
+
+    def iterate(self, stream):
+        for item in stream:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = AICache(str(tmp_path / 'ai_cache.db'))
+    monkeypatch.setattr(ai_handler, 'get_ai_cache', lambda: cache)
+    yield cache
+    cache.conn.close()
+
+
+def use_generation(monkeypatch, *streams):
+    generation = FakeGeneration(*streams)
+    monkeypatch.setattr(ai_handler.dashscope, 'Generation', generation)
+    return generation
+
+
+def test_chunks_are_streamed_and_cached(cache, monkeypatch):
+    generation = use_generation(monkeypatch, [chunk('你好'), chunk(''), chunk('，世界'), chunk('。')])
+    assert list(stream_ai_model('正文', 'prompt')) == ['你好', '，世界', '。']
+    assert generation.calls[0]['stream'] and generation.calls[0]['incremental_output']
+
+    # 完整结果写入缓存，再次请求一次性产出，不再调用模型
+    assert list(stream_ai_model('正文', 'prompt')) == ['你好，世界。']
+    assert len(generation.calls) == 1
+
+
+def test_error_mid_stream_is_raised_and_not_cached(cache, monkeypatch):
+    generation = use_generation(monkeypatch,
+                                [chunk('前半'), failure(HTTPStatus.TOO_MANY_REQUESTS, 'Throttling.RateQuota')],
+                                [chunk('前半'), ConnectionError('连接中断')],
+                                [chunk('完整'), chunk('结果')])
+    received = []
+    with pytest.raises(AIRequestError) as error:
+        for text in stream_ai_model('正文', 'prompt'):
+            received.append(text)
+    # 出错前的增量已交给调用方，错误本身可据此判断是否重试
+    assert received == ['前半']
+    assert error.value.is_retryable()
+
+    with pytest.raises(ConnectionError):
+        list(stream_ai_model('正文', 'prompt'))
+
+    # 不完整的结果没有写入缓存，下一次仍然请求模型
+    assert list(stream_ai_model('正文', 'prompt')) == ['完整', '结果']
+    assert len(generation.calls) == 3
+    assert list(stream_ai_model('正文', 'prompt')) == ['完整结果']
+
+
+def test_refresh_streams_again_and_replaces_cache(cache, monkeypatch):
+    generation = use_generation(monkeypatch, [chunk('旧')], [chunk('新'), chunk('结果')])
+    list(stream_ai_model('正文', 'prompt'))
+    assert list(stream_ai_model('正文', 'prompt', refresh=True)) == ['新', '结果']
+    assert list(stream_ai_model('正文', 'prompt')) == ['新结果']
+    assert len(generation.calls) == 2
+
+
+def test_stream_without_cache(cache, monkeypatch):
+    use_generation(monkeypatch, [chunk('不缓存')])
+    assert list(stream_ai_model('正文', 'prompt', use_cache=False)) == ['不缓存']
+    assert cache.get(ai_handler.make_cache_key('正文', 'prompt', ai_handler.DEFAULT_MODEL,
+                                               ai_handler.DEFAULT_SYSTEM_MESSAGE)) is None
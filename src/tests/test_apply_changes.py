@@ -0,0 +1,152 @@
+import pytest
+
+NOW = 1700000000000
+
+
+@pytest.fixture
+def source(open_db):
+    return open_db('source.db')
+
+
+@pytest.fixture
+def target(open_db):
+    return open_db('target.db')
+
+
+def set_note_time(db, note_id, updated_at, version=None):
+    # 显式写入 updated_at 时变更日志触发器不会再改写它
+    db.cursor.execute('UPDATE notes SET updated_at = ?, version = COALESCE(?, version) WHERE id = ?', (updated_at, version, note_id))
+    db.conn.commit()
+
+
+def note_by_uid(db, uid):
+    db.cursor.execute('SELECT id, title, updated_at, version FROM notes WHERE uid = ?', (uid,))
+    row = db.cursor.fetchone()
+    return dict(row) if row else None
+
+
+def uid_of(db, note_id):
+    db.cursor.execute('SELECT uid FROM notes WHERE id = ?', (note_id,))
+    return db.cursor.fetchone()['uid']
+
+
+def sync(source, target):
+    return target.apply_changes(source.get_changes_since(0))
+
+
+def test_new_note_is_inserted(source, target):
+    note_id = source.add_note('标题', '正文', url='https://example.com/a', keywords=['k1', 'k2'])
+    stats = sync(source, target)
+    assert stats['inserted'] == 1
+    copy = note_by_uid(target, uid_of(source, note_id))
+    assert copy['title'] == '标题'
+    assert target.get_note_content(copy['id']) == '正文'
+    assert sorted(target.get_note_by_id(copy['id'])['keywords']) == ['k1', 'k2']
+
+
+def test_newer_update_wins(source, target):
+    note_id = source.add_note('旧标题', '正文', url='https://example.com/a')
+    sync(source, target)
+    uid = uid_of(source, note_id)
+
+    source.update_note(note_id, title='新标题')
+    set_note_time(source, note_id, NOW + 2)
+    set_note_time(target, note_by_uid(target, uid)['id'], NOW + 1)
+    assert sync(source, target)['updated'] == 1
+    assert note_by_uid(target, uid)['title'] == '新标题'
+
+
+def test_older_update_loses(source, target):
+    note_id = source.add_note('标题', '正文', url='https://example.com/a')
+    sync(source, target)
+    uid = uid_of(source, note_id)
+    target_id = note_by_uid(target, uid)['id']
+
+    source.update_note(note_id, title='远端修改')
+    set_note_time(source, note_id, NOW + 1)
+    target.update_note(target_id, title='本地修改')
+    set_note_time(target, target_id, NOW + 2)
+    assert sync(source, target)['skipped'] == 1
+    assert note_by_uid(target, uid)['title'] == '本地修改'
+
+
+def test_same_time_higher_version_wins(source, target):
+    note_id = source.add_note('标题', '正文', url='https://example.com/a')
+    sync(source, target)
+    uid = uid_of(source, note_id)
+    target_id = note_by_uid(target, uid)['id']
+
+    source.update_note(note_id, title='远端修改')
+    set_note_time(source, note_id, NOW, version=5)
+    target.update_note(target_id, title='本地修改')
+    set_note_time(target, target_id, NOW, version=3)
+    sync(source, target)
+    assert note_by_uid(target, uid)['title'] == '远端修改'
+
+
+def test_conflict_resolution_is_symmetric(source, target):
+    # 时间和版本都相同时按内容指纹决定，两端合并后结果一致
+    note_id = source.add_note('标题', '正文', url='https://example.com/a')
+    sync(source, target)
+    uid = uid_of(source, note_id)
+    target_id = note_by_uid(target, uid)['id']
+    source.update_note(note_id, title='甲')
+    set_note_time(source, note_id, NOW, version=2)
+    target.update_note(target_id, title='乙')
+    set_note_time(target, target_id, NOW, version=2)
+
+    source_changes, target_changes = source.get_changes_since(0), target.get_changes_since(0)
+    target.apply_changes(source_changes)
+    source.apply_changes(target_changes)
+    assert note_by_uid(source, uid)['title'] == note_by_uid(target, uid)['title']
+
+
+def test_tombstone_deletes_unmodified_note(source, target):
+    note_id = source.add_note('标题', '正文', url='https://example.com/a', keywords=['k'])
+    sync(source, target)
+    uid = uid_of(source, note_id)
+    source.delete_note(note_id)
+    assert sync(source, target)['deleted'] == 1
+    assert note_by_uid(target, uid) is None
+    assert target.get_tombstone_time('notes', uid) is not None
+
+
+def test_note_modified_after_deletion_survives(source, target):
+    note_id = source.add_note('标题', '正文', url='https://example.com/a')
+    sync(source, target)
+    uid = uid_of(source, note_id)
+    source.delete_note(note_id)
+    source.cursor.execute("UPDATE sync_tombstones SET deleted_at = ? WHERE row_key = ?", (NOW, uid))
+    source.conn.commit()
+    target_id = note_by_uid(target, uid)['id']
+    target.update_note(target_id, title='删除之后的修改')
+    set_note_time(target, target_id, NOW + 1)
+
+    sync(source, target)
+    assert note_by_uid(target, uid)['title'] == '删除之后的修改'
+
+
+def test_tombstone_prevents_resurrection(source, target):
+    note_id = source.add_note('标题', '正文', url='https://example.com/a')
+    set_note_time(source, note_id, NOW)
+    sync(source, target)
+    uid = uid_of(source, note_id)
+    target.delete_note(note_by_uid(target, uid)['id'])
+
+    # 删除晚于对方的修改：对方的旧版本不能让笔记复活
+    assert sync(source, target)['skipped'] == 1
+    assert note_by_uid(target, uid) is None
+
+
+def test_keyword_link_tombstone(source, target):
+    note_id = source.add_note('标题', '正文', url='https://example.com/a', keywords=['保留', '移除'])
+    sync(source, target)
+    uid = uid_of(source, note_id)
+    source.cursor.execute('''
+    DELETE FROM note_keyword WHERE note_id = ? AND keyword_id = (SELECT id FROM keywords WHERE word = '移除')
+    ''', (note_id,))
+    source.conn.commit()
+
+    sync(source, target)
+    assert target.get_note_by_id(note_by_uid(target, uid)['id'])['keywords'] == ['保留']
+    assert target.get_tombstone_time('note_keyword', f'{uid}/移除') is not None
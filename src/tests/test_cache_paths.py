@@ -0,0 +1,28 @@
+import os
+from src.core import ai_cache, pdf_handler, web_scraper
+
+
+def test_caches_live_next_to_database(tmp_path, monkeypatch):
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    monkeypatch.setenv('LOCAL_DB_PATH', str(data_dir / 'notes.db'))
+    # 从其他目录启动时缓存仍在数据库旁边
+    monkeypatch.chdir(tmp_path)
+
+    http_cache = web_scraper.HttpCache()
+    http_cache.conn.close()
+    assert http_cache.path == str(data_dir / 'http_cache.db')
+    cache = ai_cache.AICache()
+    cache.conn.close()
+    assert cache.path == str(data_dir / 'ai_cache.db')
+    pdf_handler.save_cached_info('abc', {'title': 'x'})
+    assert pdf_handler.load_cached_info('abc') == {'title': 'x'}
+    assert os.path.dirname(pdf_handler.get_cache_path('abc')) == str(data_dir / '.cache' / 'pdf')
+    assert sorted(os.listdir(tmp_path)) == ['data']
+
+
+def test_explicit_cache_path_wins(tmp_path, monkeypatch):
+    monkeypatch.setattr(web_scraper, 'HTTP_CACHE_PATH', str(tmp_path / 'custom.db'))
+    http_cache = web_scraper.HttpCache()
+    http_cache.conn.close()
+    assert http_cache.path == str(tmp_path / 'custom.db')
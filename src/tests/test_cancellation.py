@@ -0,0 +1,45 @@
+import time
+import PyPDF2
+import pytest
+from src.core import batch_ingest, pdf_handler
+
+
+class Cancelled(Exception):
+    pass
+
+
+class FakeDatabase:
+    def find_duplicate_note(self, url=None, content_hash=None):
+        return None
+
+
+def test_pdf_callback_error_propagates(tmp_path):
+    writer = PyPDF2.PdfWriter()
+    for _ in range(pdf_handler.PARALLEL_PAGE_THRESHOLD + 1):
+        writer.add_blank_page(width=100, height=100)
+    path = tmp_path / 'blank.pdf'
+    with open(path, 'wb') as f:
+        writer.write(f)
+
+    def on_page(index, text, page_count):
+        raise Cancelled()
+
+    with pytest.raises(Cancelled):
+        pdf_handler.extract_pdf_info(str(path), on_page=on_page, use_cache=False)
+
+
+def test_batch_cancel_does_not_wait_for_queue(monkeypatch):
+    def slow_fetch(source, file_hash=None):
+        time.sleep(0.2)
+        return {'title': source, 'content': ''}
+
+    def on_progress(done, total):
+        raise Cancelled()
+
+    monkeypatch.setattr(batch_ingest, 'fetch_source', slow_fetch)
+    monkeypatch.setattr(batch_ingest, 'source_hash', lambda source: None)
+    sources = [f"https://example.com/{index}" for index in range(40)]
+    start = time.monotonic()
+    with pytest.raises(Cancelled):
+        batch_ingest.ingest_batch(FakeDatabase(), sources, max_workers=2, progress_callback=on_progress)
+    assert time.monotonic() - start < 1
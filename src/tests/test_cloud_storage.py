@@ -0,0 +1,77 @@
+import json
+import time
+import oss2
+import pytest
+from src.core import cloud_storage
+from src.core.database import Database
+from src.tests.fake_oss import FakeBucket
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    bucket = FakeBucket()
+    for name in ('OSS_ACCESS_KEY_ID', 'OSS_ACCESS_KEY_SECRET', 'OSS_BUCKET_NAME', 'OSS_ENDPOINT'):
+        monkeypatch.setenv(name, 'test')
+    monkeypatch.setenv('LOCAL_DB_PATH', str(tmp_path / 'notes.db'))
+    monkeypatch.setenv('OSS_DELTA_SYNC', '1')
+    monkeypatch.setenv('OSS_DELTA_CHUNK_SIZE', '4096')
+    monkeypatch.setattr(oss2, 'Bucket', lambda *args: bucket)
+    return cloud_storage.CloudStorage()
+
+
+def test_download_prefers_manifest_over_stale_file(storage, tmp_path):
+    local = tmp_path / 'notes.db'
+    storage.bucket.put_object('notes.db', b'old' * 2000)
+    local.write_bytes(b'new' * 2000)
+    storage.upload_database()
+
+    local.write_bytes(b'')
+    assert storage.download_database_temp() == str(local) + '.temp'
+    assert (tmp_path / 'notes.db.temp').read_bytes() == b'new' * 2000
+
+
+def test_failed_delta_download_does_not_fall_back(storage, tmp_path):
+    (tmp_path / 'notes.db').write_bytes(b'new' * 2000)
+    storage.bucket.put_object('notes.db', b'old' * 2000)
+    storage.upload_database()
+    for key in [key for key in storage.bucket.objects if key.startswith('notes.db.chunks/')]:
+        storage.bucket.delete_object(key)
+
+    (tmp_path / 'notes.db').write_bytes(b'')
+    assert storage.download_database_temp() is None
+    with pytest.raises(oss2.exceptions.NoSuchKey):
+        storage.download_database()
+
+
+def test_incompatible_manifest_is_an_error(storage, tmp_path):
+    storage.bucket.put_object('notes.db', b'old')
+    storage.bucket.put_object('notes.db.manifest.json', json.dumps({'version': 99}))
+    with pytest.raises(ValueError):
+        storage.download_database()
+
+
+
+def note_titles(path):
+    db = Database(path, journal_mode=None)
+    try:
+        return sorted(row['title'] for row in db.cursor.execute('SELECT title FROM notes'))
+    finally:
+        db.close()
+
+
+def test_init_database_merges_newer_cloud_copy(storage, tmp_path, open_db):
+    # 另一台机器上传的版本比本地文件新，本地尚未同步的笔记不能被云端副本覆盖
+    other = open_db('other.db')
+    other.add_note('云端笔记', '正文', url='https://example.com/cloud')
+    other.snapshot_to(str(tmp_path / 'other.upload'))
+    local = Database(str(tmp_path / 'notes.db'))
+    local.add_note('本地未同步', '正文', url='https://example.com/local')
+    local.close()
+    storage.bucket.clock = int(time.time()) + 3600
+    storage.upload_database(source_path=str(tmp_path / 'other.upload'))
+
+    storage.init_database()
+    assert note_titles(str(tmp_path / 'notes.db')) == ['云端笔记', '本地未同步']
+    # 合并结果已上传，其他客户端也能看到本地的笔记
+    assert note_titles(storage.download_database_temp()) == ['云端笔记', '本地未同步']
+    assert not storage.needs_sync()
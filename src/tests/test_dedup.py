@@ -0,0 +1,63 @@
+from src.utils.url_utils import normalize_url
+
+
+def count_notes(db):
+    db.cursor.execute('SELECT COUNT(*) FROM notes')
+    return db.cursor.fetchone()[0]
+
+
+def test_normalize_url():
+    assert normalize_url('HTTPS://Example.com:443/a/?utm_source=x&b=2&a=1#top') == 'https://example.com/a?a=1&b=2'
+    assert normalize_url('http://example.com') == 'http://example.com/'
+    assert normalize_url('file:///tmp/a.pdf') == 'file:///tmp/a.pdf'
+    assert normalize_url(None) is None
+    assert normalize_url('https://x.com/#/article/1') == 'https://x.com/#/article/1'
+    assert normalize_url('https://x.com/#!/article/1') == 'https://x.com/#!/article/1'
+    assert normalize_url('https://x.com/page#section-2') == 'https://x.com/page'
+
+
+def test_add_note_merges_duplicate_url(db):
+    first = db.add_note('标题', '正文', url='https://example.com/a?utm_source=feed', keywords=['k1'])
+    second = db.add_note('另一个标题', '其他正文', url='https://EXAMPLE.com/a/', keywords=['k2'])
+    assert second == first
+    assert count_notes(db) == 1
+    assert sorted(db.get_note_by_id(first)['keywords']) == ['k1', 'k2']
+    assert db.get_note_by_id(first)['title'] == '标题'
+
+
+def test_hash_routes_are_distinct_notes(db):
+    first = db.add_note('文章一', '正文一', url='https://x.com/#/article/1')
+    second = db.add_note('文章二', '正文二', url='https://x.com/#/article/2')
+    assert second != first
+    assert db.add_note('文章一', '正文一', url='https://X.com/?utm_source=feed#/article/1') == first
+
+
+def test_add_note_merges_duplicate_file_hash(db):
+    first = db.add_note('a', '正文', file_path='/tmp/a.pdf', content_hash='abc')
+    assert db.add_note('b', '正文', file_path='/tmp/b.pdf', content_hash='abc') == first
+    assert db.add_note('c', '正文', file_path='/tmp/c.pdf', content_hash='def') != first
+    assert count_notes(db) == 2
+
+
+def test_notes_without_keys_are_not_deduplicated(db):
+    first = db.add_note('标题', '正文')
+    assert db.add_note('标题', '正文') != first
+
+
+def test_add_notes_dedup_against_database_and_batch(db):
+    existing = db.add_note('已有', '正文', url='https://example.com/old', keywords=['旧'])
+    note_ids = db.add_notes([
+        {'title': '新的', 'content': '一', 'url': 'https://example.com/new', 'keywords': ['甲']},
+        {'title': '重复已有', 'content': '二', 'url': 'https://example.com/old#section', 'keywords': ['乙']},
+        {'title': '批内重复', 'content': '三', 'url': 'https://example.com/new/', 'keywords': ['丙']},
+        {'title': '文件', 'content': '四', 'content_hash': 'h1'},
+        {'title': '同一文件', 'content': '五', 'content_hash': 'h1'},
+    ])
+    assert note_ids[1] == existing
+    assert note_ids[2] == note_ids[0]
+    assert note_ids[4] == note_ids[3]
+    assert len(set(note_ids)) == 3
+    assert count_notes(db) == 3
+    assert sorted(db.get_note_by_id(existing)['keywords']) == ['乙', '旧']
+    assert sorted(db.get_note_by_id(note_ids[0])['keywords']) == ['丙', '甲']
+    assert db.get_note_content(note_ids[0]) == '一'
@@ -0,0 +1,125 @@
+import os
+import pytest
+from src.core.delta_sync import DeltaSync, ManifestConflict
+from src.core.transfer import TransferEngine
+from src.tests.fake_oss import FakeBucket
+
+CHUNK_SIZE = 4096
+
+
+def make_sync(bucket, tmp_path, name):
+    return DeltaSync(TransferEngine(bucket, str(tmp_path / name)), 'notes.db', CHUNK_SIZE)
+
+
+def write_chunks(path, *fills):
+    # 每个参数生成一个内容不同的完整块
+    with open(path, 'wb') as f:
+        for fill in fills:
+            f.write(bytes([fill]) * CHUNK_SIZE)
+
+
+def chunk_keys(bucket):
+    return {key for key in bucket.objects if key.startswith('notes.db.chunks/')}
+
+
+@pytest.fixture
+def bucket():
+    return FakeBucket()
+
+
+def test_round_trip(bucket, tmp_path):
+    source = tmp_path / 'a.db'
+    write_chunks(source, 1, 2, 3)
+    with open(source, 'ab') as f:
+        f.write(b'tail')
+    uploader = make_sync(bucket, tmp_path, 'a')
+    uploader.upload(str(source))
+    assert uploader.is_in_sync(str(source))
+
+    target = tmp_path / 'b.db'
+    assert make_sync(bucket, tmp_path, 'b').download(str(target))
+    assert target.read_bytes() == source.read_bytes()
+    assert not os.path.exists(str(target) + '.part')
+
+
+def test_download_reuses_seed_chunks(bucket, tmp_path):
+    source = tmp_path / 'a.db'
+    write_chunks(source, 1, 2, 3)
+    uploader = make_sync(bucket, tmp_path, 'a')
+    uploader.upload(str(source))
+    seed = tmp_path / 'seed.db'
+    seed.write_bytes(source.read_bytes())
+
+    write_chunks(source, 1, 9, 3)
+    assert uploader.upload(str(source)) == CHUNK_SIZE
+    fetched = []
+    downloader = make_sync(bucket, tmp_path, 'b')
+    downloader.transfer.map_parallel = lambda func, items: fetched.extend(items) or [func(item) for item in items]
+    target = tmp_path / 'b.db'
+    assert downloader.download(str(target), seed_path=str(seed))
+    assert fetched == [1]
+    assert target.read_bytes() == source.read_bytes()
+
+
+def test_unused_chunks_kept_for_one_generation(bucket, tmp_path):
+    path = tmp_path / 'a.db'
+    uploader = make_sync(bucket, tmp_path, 'a')
+    write_chunks(path, 1, 2)
+    uploader.upload(str(path))
+    first = set(uploader.get_remote_manifest()['chunks'])
+
+    # 上一代清单的块仍在云端，按旧清单下载的客户端不受影响
+    write_chunks(path, 3, 4)
+    uploader.upload(str(path))
+    assert first <= {key.rsplit('/', 1)[1] for key in chunk_keys(bucket)}
+    assert set(uploader.get_remote_manifest()['retired']) == first
+
+    write_chunks(path, 5, 6)
+    uploader.upload(str(path))
+    remaining = {key.rsplit('/', 1)[1] for key in chunk_keys(bucket)}
+    assert not first & remaining
+    assert len(remaining) == 4
+
+
+def test_retired_chunks_are_reused(bucket, tmp_path):
+    path = tmp_path / 'a.db'
+    uploader = make_sync(bucket, tmp_path, 'a')
+    write_chunks(path, 1, 2)
+    uploader.upload(str(path))
+    write_chunks(path, 3, 4)
+    uploader.upload(str(path))
+    # 恢复到上一代的内容：块还没被清理，不需要重新上传，也不能在这次上传后删除
+    write_chunks(path, 1, 2)
+    assert uploader.upload(str(path)) == 0
+    target = tmp_path / 'b.db'
+    make_sync(bucket, tmp_path, 'b').download(str(target))
+    assert target.read_bytes() == path.read_bytes()
+
+
+def test_concurrent_upload_conflict(bucket, tmp_path):
+    path = tmp_path / 'a.db'
+    first = make_sync(bucket, tmp_path, 'a')
+    second = make_sync(bucket, tmp_path, 'b')
+    write_chunks(path, 1)
+    first.upload(str(path))
+
+    stale_manifest, stale_etag = second.read_remote_manifest()
+    write_chunks(path, 2)
+    first.upload(str(path))
+    second.read_remote_manifest = lambda: (stale_manifest, stale_etag)
+    write_chunks(path, 3)
+    with pytest.raises(ManifestConflict):
+        second.upload(str(path))
+    # 云端仍是第一个客户端写入的版本
+    write_chunks(path, 2)
+    assert first.is_in_sync(str(path))
+
+
+def test_create_conflict(bucket, tmp_path):
+    path = tmp_path / 'a.db'
+    write_chunks(path, 1)
+    second = make_sync(bucket, tmp_path, 'b')
+    second.read_remote_manifest = lambda: (None, None)
+    make_sync(bucket, tmp_path, 'a').upload(str(path))
+    with pytest.raises(ManifestConflict):
+        second.upload(str(path))
@@ -0,0 +1,105 @@
+import pytest
+from src.core import web_scraper
+from src.core.html_extractor import EXTRACTORS, decode_html, extract_content
+
+PARAGRAPH = '这是一段用来测试正文提取的中文段落，长度需要超过最短段落的限制才会被计分。'
+PAGE = f'<html><head><title>中文标题</title></head><body><div><p>{PARAGRAPH}</p><p>{PARAGRAPH}</p></div></body></html>'
+
+
+class FakeResponse:
+    def __init__(self, content, content_type):
+        self.content = content
+        self.status_code = 200
+        self.headers = {'Content-Type': content_type}
+        # 与 requests 一致：Content-Type 未声明 charset 的 text/* 默认 ISO-8859-1
+        self.encoding = content_type.split('charset=')[1] if 'charset=' in content_type else 'ISO-8859-1'
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, response):
+        self.response = response
+
+    def get(self, url, headers=None, timeout=None):
+        return self.response
+
+
+@pytest.mark.parametrize('engine', sorted(EXTRACTORS))
+def test_charset_from_header_only(engine):
+    html = decode_html(PAGE.encode('gbk'), 'gbk')
+    title, content = extract_content(html, engine)
+    assert title == '中文标题'
+    assert PARAGRAPH in content
+
+
+@pytest.mark.parametrize('engine', sorted(EXTRACTORS))
+def test_charset_from_meta(engine):
+    page = PAGE.replace('<head>', '<head><meta charset="gbk">')
+    title, content = extract_content(page.encode('gbk'), engine)
+    assert title == '中文标题'
+    assert PARAGRAPH in content
+
+
+def test_str_with_encoding_declaration():
+    page = '<?xml version="1.0" encoding="gbk"?>' + PAGE
+    assert extract_content(page)[0] == '中文标题'
+
+
+def test_scrape_uses_header_charset(monkeypatch):
+    response = FakeResponse(PAGE.encode('gbk'), 'text/html; charset=GBK')
+    monkeypatch.setattr(web_scraper, '_session', FakeSession(response))
+    result = web_scraper.scrape_webpage('https://example.com/a', use_cache=False)
+    assert result['title'] == '中文标题'
+    assert PARAGRAPH in result['content']
+
+
+def test_scrape_ignores_default_latin1(monkeypatch):
+    response = FakeResponse(PAGE.replace('<head>', '<head><meta charset="utf-8">').encode('utf-8'), 'text/html')
+    monkeypatch.setattr(web_scraper, '_session', FakeSession(response))
+    result = web_scraper.scrape_webpage('https://example.com/b', use_cache=False)
+    assert result['title'] == '中文标题'
+
+
+def test_cache_is_keyed_by_extractor(tmp_path):
+    cache = web_scraper.HttpCache(str(tmp_path / 'cache.db'))
+    cache.put('https://example.com/a', '"1"', None, {'title': 'lxml'}, 'lxml:1')
+    assert cache.get('https://example.com/a', 'lxml:1')['result'] == {'title': 'lxml'}
+    assert cache.get('https://example.com/a', 'bs4:1') is None
+
+
+def test_cache_eviction(tmp_path, monkeypatch):
+    cache = web_scraper.HttpCache(str(tmp_path / 'cache.db'), max_age_days=1, max_rows=3)
+    now = [1000000.0]
+    monkeypatch.setattr(web_scraper.time, 'time', lambda: now[0])
+    for index in range(5):
+        now[0] += 1
+        cache.put(f'https://example.com/{index}', '"1"', None, {}, 'lxml:1')
+    assert [index for index in range(5) if cache.get(f'https://example.com/{index}', 'lxml:1')] == [2, 3, 4]
+
+    now[0] += 86400 + 1.5
+    cache.put('https://example.com/new', '"1"', None, {}, 'lxml:1')
+    assert [index for index in range(5) if cache.get(f'https://example.com/{index}', 'lxml:1')] == []
+
+
+@pytest.mark.parametrize('engine', sorted(EXTRACTORS))
+def test_form_wrapped_page(engine):
+    # ASP.NET 页面把整个 body 放进 <form>，标题在 <header> 里
+    page = f'''<html><head><title>T</title></head><body><form id="form1" method="post">
+    <header><h1>文章标题</h1></header>
+    <nav class="menu"><a href="/">首页</a><a href="/news">新闻</a><a href="/about">关于我们</a></nav>
+    <div class="article"><p>{PARAGRAPH}</p><p>{PARAGRAPH}</p></div>
+    <div id="comments"><p>这是一条评论，内容和正文无关，长度也超过了最短段落的限制。</p></div>
+    </form></body></html>'''
+    title, content = extract_content(page, engine)
+    assert title == 'T'
+    assert PARAGRAPH in content
+    if engine == 'lxml':
+        assert '首页' not in content
+        assert '评论' not in content
+
+
+def test_header_title_kept_on_short_page():
+    page = '<html><body><form id="form1"><header><h1>只有标题的短页面</h1></header><p>一句话。</p></form></body></html>'
+    assert extract_content(page, 'lxml')[1].split('\n') == ['只有标题的短页面', '一句话。']
@@ -0,0 +1,84 @@
+import random
+from src.core.keyword_index import KeywordIndex, intersect_sorted, union_sorted
+from src.core.keyword_manager import KeywordManager
+
+
+def add_notes(db, count):
+    return [db.add_note(f'笔记{index}', '正文', url=f'https://example.com/{index}') for index in range(count)]
+
+
+def random_index(seed, notes=500, words=8):
+    # 各关键词出现频率差别很大，覆盖长短倒排表求交的情况
+    rng = random.Random(seed)
+    index = KeywordIndex()
+    expected = {}
+    for word_index in range(words):
+        word = f'词{word_index}'
+        probability = 0.9 / (word_index + 1)
+        for note_id in range(1, notes + 1):
+            if rng.random() < probability:
+                index.add(note_id, word)
+                expected.setdefault(word, set()).add(note_id)
+    return index, expected
+
+
+def test_query_matches_set_semantics():
+    for seed in range(5):
+        index, expected = random_index(seed)
+        rng = random.Random(seed)
+        for _ in range(20):
+            words = rng.sample(sorted(expected) + ['不存在'], rng.randint(1, 4))
+            postings = [expected.get(word, set()) for word in words]
+            assert list(index.query(words, 'and')) == sorted(set.intersection(*postings))
+            assert list(index.query(words, 'or')) == sorted(set.union(*postings))
+
+
+def test_query_edge_cases():
+    index = KeywordIndex()
+    assert list(index.query([])) == []
+    index.add(3, '甲')
+    index.add(1, '甲')
+    index.add(1, '甲')
+    index.add(2, '乙')
+    assert list(index.notes_for('甲')) == [1, 3]
+    assert list(index.query(['甲'])) == [1, 3]
+    assert list(index.query(['甲', '乙'])) == []
+    assert list(index.query(['甲', '乙'], 'or')) == [1, 2, 3]
+    # AND 中有未知关键词时结果为空，OR 中忽略
+    assert list(index.query(['甲', '未知'])) == []
+    assert list(index.query(['甲', '未知'], 'or')) == [1, 3]
+
+
+def test_sorted_set_operations():
+    large = list(range(0, 10000, 3))
+    assert list(intersect_sorted([0, 2999, 3000, 9999, 20000], large)) == [0, 3000, 9999]
+    assert list(intersect_sorted(large, [5, 6])) == [6]
+    assert list(intersect_sorted([], large)) == []
+    assert list(union_sorted([[1, 4], [2, 4, 9], []])) == [1, 2, 4, 9]
+
+
+def test_incremental_updates_match_rebuild(db):
+    first, second, third = add_notes(db, 3)
+    manager = KeywordManager(db)
+    manager.tag_notes([first, second], ['甲'])
+    manager.tag_notes([second, third], ['乙'])
+    index = KeywordIndex()
+    index.build(db)
+    assert list(index.query(['甲', '乙'])) == [second]
+    assert index.keyword_counts() == [('乙', 2), ('甲', 2)]
+
+    # 写操作后增量维护，与重新构建的结果一致
+    manager.untag_notes([second], ['甲'])
+    manager.tag_notes([third], ['丙'])
+    index.set_note_keywords(second, ['乙'])
+    index.set_note_keywords(third, ['乙', '丙'])
+    db.delete_note(first)
+    index.remove_note(first)
+
+    rebuilt = KeywordIndex()
+    rebuilt.build(db)
+    assert index.postings == rebuilt.postings
+    assert index.note_keywords == rebuilt.note_keywords
+    assert '甲' not in index.postings
+    assert list(index.query(['乙', '丙'])) == [third]
+    assert list(index.query(['甲', '丙'], 'or')) == [third]
@@ -0,0 +1,89 @@
+import pytest
+from src.core.keyword_manager import KeywordManager
+
+
+@pytest.fixture
+def manager(db):
+    return KeywordManager(db)
+
+
+def keywords_of(db, note_id):
+    return sorted(db.get_note_by_id(note_id)['keywords'])
+
+
+def all_words(db):
+    db.cursor.execute('SELECT word FROM keywords ORDER BY word')
+    return [row['word'] for row in db.cursor.fetchall()]
+
+
+def add_notes(db, count):
+    return [db.add_note(f'笔记{index}', '正文', url=f'https://example.com/{index}') for index in range(count)]
+
+
+def test_tag_and_untag_notes(db, manager):
+    first, second, third = add_notes(db, 3)
+    assert manager.tag_notes([first, second], ['甲', '乙', '甲']) == 4
+    # 已有的关联忽略
+    assert manager.tag_notes([first, third], ['甲']) == 1
+    assert keywords_of(db, first) == ['乙', '甲']
+    assert keywords_of(db, third) == ['甲']
+
+    assert manager.untag_notes([first, second], ['甲', '不存在']) == 2
+    assert keywords_of(db, first) == ['乙']
+    assert keywords_of(db, second) == ['乙']
+    assert keywords_of(db, third) == ['甲']
+    assert manager.tag_notes([first], []) == 0
+
+
+def test_rename_keyword(db, manager):
+    first, second = add_notes(db, 2)
+    manager.tag_notes([first, second], ['旧名'])
+    assert manager.rename_keyword('旧名', '新名') == 2
+    assert keywords_of(db, first) == ['新名']
+    assert '旧名' not in all_words(db)
+    # 改名后旧名称写入墓碑，关联随新名称重新同步
+    assert db.get_tombstone_time('keywords', '旧名') is not None
+    assert manager.rename_keyword('不存在', '任意') == 0
+    assert manager.rename_keyword('新名', '新名') == 0
+
+
+def test_rename_to_existing_keyword_merges(db, manager):
+    first, second = add_notes(db, 2)
+    manager.tag_notes([first], ['a'])
+    manager.tag_notes([first, second], ['b'])
+    assert manager.rename_keyword('a', 'b') == 0
+    assert keywords_of(db, first) == ['b']
+    assert 'a' not in all_words(db)
+
+
+def test_merge_keywords(db, manager):
+    first, second, third = add_notes(db, 3)
+    manager.tag_notes([first], ['机器学习'])
+    manager.tag_notes([first, second], ['ML'])
+    manager.tag_notes([third], ['machine learning'])
+    assert manager.merge_keywords(['ML', 'machine learning', '机器学习'], '机器学习') == 2
+    assert keywords_of(db, first) == ['机器学习']
+    assert keywords_of(db, second) == ['机器学习']
+    assert keywords_of(db, third) == ['机器学习']
+    assert all_words(db) == ['机器学习']
+
+
+def test_failed_merge_during_rename_is_rolled_back(db, manager):
+    first, second = add_notes(db, 2)
+    manager.tag_notes([first], ['a'])
+    manager.tag_notes([second], ['b'])
+    # 合并的最后一步（删除源关键词）失败时，已并入的关联也必须撤销
+    db.cursor.execute("CREATE TEMP TRIGGER fail_keyword_delete BEFORE DELETE ON keywords BEGIN SELECT RAISE(ABORT, 'boom'); END")
+    assert manager.rename_keyword('a', 'b') is None
+    assert not db.conn.in_transaction
+    assert keywords_of(db, first) == ['a']
+    assert keywords_of(db, second) == ['b']
+    assert all_words(db) == ['a', 'b']
+
+
+def test_delete_orphan_keywords(db, manager):
+    note_id, = add_notes(db, 1)
+    manager.tag_notes([note_id], ['留下', '孤立'])
+    manager.untag_notes([note_id], ['孤立'])
+    assert manager.delete_orphan_keywords() == 1
+    assert all_words(db) == ['留下']
@@ -0,0 +1,81 @@
+import os
+import shutil
+import sqlite3
+import pytest
+from src.core.database import Database
+from src.core.migrations import SCHEMA_VERSION
+
+# 仓库附带的 notes.db 是迁移之前的旧版本数据库；测试只在副本上进行
+SHIPPED_DB = os.path.join(os.path.dirname(__file__), '..', '..', 'notes.db')
+
+
+def read_legacy(path):
+    conn = sqlite3.connect(path)
+    try:
+        notes = {row[0]: (row[1], row[2]) for row in conn.execute('SELECT id, title, content FROM notes')}
+        links = {(row[0], row[1]) for row in conn.execute('''
+        SELECT nk.note_id, k.word FROM note_keyword nk JOIN keywords k ON k.id = nk.keyword_id
+        ''')}
+    finally:
+        conn.close()
+    return notes, links
+
+
+@pytest.fixture
+def legacy_copy(tmp_path):
+    if not os.path.exists(SHIPPED_DB):
+        pytest.skip("notes.db 不存在")
+    path = str(tmp_path / 'notes.db')
+    shutil.copyfile(SHIPPED_DB, path)
+    return path
+
+
+def test_migrate_shipped_database(legacy_copy):
+    notes, links = read_legacy(legacy_copy)
+    db = Database(legacy_copy)
+    try:
+        db.cursor.execute('PRAGMA user_version')
+        assert db.cursor.fetchone()[0] == SCHEMA_VERSION
+        # 正文移入压缩的 note_bodies 后内容不变
+        for note_id, (title, content) in notes.items():
+            assert db.get_note_by_id(note_id)['title'] == title
+            assert db.get_note_content(note_id) == content
+        for note_id, word in links:
+            assert word in db.get_note_by_id(note_id)['keywords']
+        db.cursor.execute('SELECT COUNT(*) FROM notes WHERE content IS NOT NULL')
+        assert db.cursor.fetchone()[0] == 0
+        # 派生的索引和统计在迁移时回填
+        db.cursor.execute('SELECT COUNT(*) FROM notes_fts')
+        assert db.cursor.fetchone()[0] == len(notes)
+        assert db.get_corpus_stat('doc_count') == len(notes)
+        assert db.refresh_vectors() == len(notes)
+        db.cursor.execute('SELECT COUNT(*) FROM note_bigrams')
+        assert db.cursor.fetchone()[0] == len(notes)
+        db.cursor.execute('SELECT COUNT(*) FROM sync_log WHERE table_name = ?', ('notes',))
+        assert db.cursor.fetchone()[0] == len(notes)
+        assert db.get_database_id()
+        assert db.get_changes_since(0)['notes']
+    finally:
+        db.close()
+
+
+def test_migrated_database_reopens(legacy_copy):
+    Database(legacy_copy).close()
+    db = Database(legacy_copy)
+    try:
+        db.cursor.execute('PRAGMA user_version')
+        assert db.cursor.fetchone()[0] == SCHEMA_VERSION
+        note_id = db.add_note('新笔记', '迁移后仍可写入', url='https://example.com/new')
+        assert db.search_notes('迁移后')[0]['id'] == note_id
+    finally:
+        db.close()
+
+
+def test_shipped_database_is_untouched():
+    if not os.path.exists(SHIPPED_DB):
+        pytest.skip("notes.db 不存在")
+    conn = sqlite3.connect(f'file:{SHIPPED_DB}?mode=ro', uri=True)
+    try:
+        assert conn.execute('PRAGMA user_version').fetchone()[0] == 0
+    finally:
+        conn.close()
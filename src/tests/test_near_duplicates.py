@@ -0,0 +1,43 @@
+from src.core.dedup import find_near_duplicate_groups
+
+ARTICLE = ('近似重复检测用于在导入时发现转载的文章和重新导出的文档。'
+           '正文去掉空白和标点之后切成固定长度的片段，每篇笔记计算一个 MinHash 签名，'
+           '签名分段之后做局部敏感哈希分桶，只有落入同一个桶的笔记才需要进一步比较。'
+           '这样检查一篇新笔记时不必扫描整个数据库，笔记很多的时候也能很快给出结果。')
+
+
+def test_near_identical_text_is_found(db):
+    note_id = db.add_note('原文', ARTICLE, url='https://example.com/a')
+    matches = db.find_near_duplicates(ARTICLE.replace('。', '！') + '（转载）')
+    assert [match['id'] for match in matches] == [note_id]
+    assert matches[0]['title'] == '原文'
+    assert matches[0]['score'] >= 0.8
+
+
+def test_unrelated_and_short_text_is_not_found(db):
+    db.add_note('原文', ARTICLE, url='https://example.com/a')
+    assert db.find_near_duplicates('五花肉切块，冰糖炒出糖色，加入酱油和黄酒，小火焖煮一个小时，最后大火收汁即可出锅。') == []
+    # 片段太少的短文本不计算签名
+    assert db.find_near_duplicates(ARTICLE[:10]) == []
+    db.add_note('短笔记', ARTICLE[:10], url='https://example.com/b')
+    assert db.find_near_duplicates(ARTICLE[:10]) == []
+
+
+def test_index_follows_updates_and_deletes(db):
+    note_id = db.add_note('原文', ARTICLE, url='https://example.com/a')
+    db.update_note(note_id, content='五花肉切块，冰糖炒出糖色，加入酱油和黄酒，小火焖煮一个小时，最后大火收汁即可出锅。')
+    assert db.find_near_duplicates(ARTICLE) == []
+    db.update_note(note_id, content=ARTICLE)
+    assert [match['id'] for match in db.find_near_duplicates(ARTICLE)] == [note_id]
+    db.delete_note(note_id)
+    assert db.find_near_duplicates(ARTICLE) == []
+    assert db.get_minhash_signatures() == {}
+
+
+def test_near_duplicate_groups(db):
+    first = db.add_note('原文', ARTICLE, url='https://example.com/a')
+    second = db.add_note('转载', ARTICLE + '（转载）', url='https://example.com/b')
+    db.add_note('菜谱', '五花肉切块，冰糖炒出糖色，加入酱油和黄酒，小火焖煮一个小时，最后大火收汁即可出锅。', url='https://example.com/c')
+    groups, similar = find_near_duplicate_groups(db)
+    assert groups == [[first, second]]
+    assert similar[(first, second)] >= 0.8
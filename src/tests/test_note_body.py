@@ -0,0 +1,63 @@
+import pytest
+from src.core.note_body import PREVIEW_CHARS, compress_text, decompress_text, make_preview
+
+TEXTS = ['', 'a', '中文正文，带标点。', 'emoji 😀 与\n换行\t制表符', '重复的段落。' * 2000]
+
+
+@pytest.mark.parametrize('text', TEXTS)
+def test_compress_round_trip(text):
+    body = compress_text(text)
+    assert isinstance(body, bytes)
+    assert decompress_text(body) == text
+
+
+def test_compress_none_and_ratio():
+    assert compress_text(None) is None
+    assert decompress_text(None) is None
+    text = '重复的段落。' * 2000
+    assert len(compress_text(text)) < len(text.encode('utf-8')) // 10
+
+
+def test_preview_counts_characters():
+    # 按字符而不是字节截断，多字节字符不会被截断一半
+    text = '汉' * (PREVIEW_CHARS + 10)
+    assert make_preview(text) == '汉' * PREVIEW_CHARS
+    assert make_preview('短文本') == '短文本'
+    assert make_preview(None) is None
+
+
+def stored_body(db, note_id):
+    db.cursor.execute('SELECT body FROM note_bodies WHERE note_id = ?', (note_id,))
+    return db.cursor.fetchone()['body']
+
+
+def stored_preview(db, note_id):
+    db.cursor.execute('SELECT preview FROM notes WHERE id = ?', (note_id,))
+    return db.cursor.fetchone()['preview']
+
+
+def test_database_round_trip(db):
+    content = '第一段，' + '正文内容。' * 500 + '😀结尾'
+    note_id = db.add_note('长笔记', content, url='https://example.com/long')
+    # 正文压缩存储，预览列保存开头部分，读取全文时解压
+    assert stored_body(db, note_id) == compress_text(content)
+    assert stored_preview(db, note_id) == content[:PREVIEW_CHARS]
+    assert db.get_note_content(note_id) == content
+    assert db.get_note_by_id(note_id)['preview'] == content[:PREVIEW_CHARS]
+
+    updated = '改写后的正文'
+    assert db.update_note(note_id, content=updated)
+    assert db.get_note_content(note_id) == updated
+    assert stored_preview(db, note_id) == updated
+
+    # 只改其他字段时正文和预览保持不变
+    assert db.update_note(note_id, title='新标题')
+    assert db.get_note_content(note_id) == updated
+    assert stored_preview(db, note_id) == updated
+
+
+def test_empty_content_round_trip(db):
+    note_id = db.add_note('空笔记', '', url='https://example.com/empty')
+    assert db.get_note_content(note_id) == ''
+    assert stored_preview(db, note_id) == ''
+    assert db.get_note_content(note_id + 1) is None
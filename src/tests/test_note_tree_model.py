@@ -0,0 +1,153 @@
+import pytest
+from PyQt5.QtCore import QModelIndex
+from PyQt5.QtTest import QAbstractItemModelTester
+from src.core.keyword_manager import KeywordManager
+from src.gui.note_tree_model import NoteTreeModel
+
+
+class SignalLog:
+    # 记录模型发出的增删改通知：(信号, 父行的笔记 id 或 None, first, last)
+    def __init__(self, model):
+        self.model = model
+        self.events = []
+        model.rowsInserted.connect(lambda parent, first, last: self.record('inserted', parent, first, last))
+        model.rowsRemoved.connect(lambda parent, first, last: self.record('removed', parent, first, last))
+        model.dataChanged.connect(lambda top_left, bottom_right: self.record(
+            'changed', top_left.parent(), top_left.row(), bottom_right.row(), model.note_id(top_left)))
+
+    def record(self, name, parent, first, last, note_id=None):
+        event = (name, self.model.note_id(parent), first, last)
+        self.events.append(event + (note_id,) if name == 'changed' else event)
+
+    def take(self):
+        events, self.events = self.events, []
+        return events
+
+
+def add_notes(db, count):
+    return [db.add_note(f'笔记{index}', '正文', url=f'https://example.com/{index}') for index in range(count)]
+
+
+@pytest.fixture
+def make_model(qapp, db):
+    def make(page_size=2):
+        model = NoteTreeModel(db, page_size=page_size)
+        return model, SignalLog(model)
+
+    return make
+
+
+def titles(model):
+    return [model.data(model.index(row, 0)) for row in range(model.rowCount())]
+
+
+def test_fetch_more_loads_pages_lazily(db, make_model):
+    add_notes(db, 5)
+    model, log = make_model()
+    assert model.rowCount() == 0
+    assert model.canFetchMore(QModelIndex())
+
+    model.fetchMore(QModelIndex())
+    assert titles(model) == ['笔记0', '笔记1']
+    assert log.take() == [('inserted', None, 0, 1)]
+
+    model.fetchMore(QModelIndex())
+    model.fetchMore(QModelIndex())
+    assert titles(model) == [f'笔记{index}' for index in range(5)]
+    assert log.take() == [('inserted', None, 2, 3), ('inserted', None, 4, 4)]
+    # 不满一页说明已加载完，不再查询
+    assert not model.canFetchMore(QModelIndex())
+    model.fetchMore(QModelIndex())
+    assert log.take() == []
+
+
+def test_exact_page_boundary_ends_with_empty_fetch(db, make_model):
+    add_notes(db, 4)
+    model, log = make_model()
+    model.fetchMore(QModelIndex())
+    model.fetchMore(QModelIndex())
+    assert model.canFetchMore(QModelIndex())
+    model.fetchMore(QModelIndex())
+    assert model.rowCount() == 4
+    assert not model.canFetchMore(QModelIndex())
+    assert log.take() == [('inserted', None, 0, 1), ('inserted', None, 2, 3)]
+
+
+def test_new_note_waits_for_unloaded_page(db, make_model):
+    add_notes(db, 3)
+    model, log = make_model()
+    model.fetchMore(QModelIndex())
+    log.take()
+
+    # 还有未加载的页时，新笔记排在最后一页之后，由 fetchMore 加载
+    note_id = db.add_note('新笔记', '正文', url='https://example.com/new')
+    assert model.refresh_note(note_id)['title'] == '新笔记'
+    assert log.take() == []
+
+    model.fetchMore(QModelIndex())
+    assert titles(model) == ['笔记0', '笔记1', '笔记2', '新笔记']
+    assert log.take() == [('inserted', None, 2, 3)]
+    model.fetchMore(QModelIndex())
+    assert not model.canFetchMore(QModelIndex())
+
+    # 全部加载后，新笔记直接插入对应的行
+    note_id = db.add_note('又一条', '正文', url='https://example.com/another')
+    model.refresh_note(note_id)
+    assert log.take() == [('inserted', None, 4, 4)]
+    assert titles(model)[-1] == '又一条'
+
+
+def test_single_note_updates_emit_row_signals(db, make_model):
+    first, second, third = add_notes(db, 3)
+    manager = KeywordManager(db)
+    model, log = make_model(page_size=10)
+    model.fetchMore(QModelIndex())
+    log.take()
+    # 全部加载后再挂上检查器（它会自行调用 fetchMore），每次变更后检查父子索引、行数等是否自洽
+    tester = QAbstractItemModelTester(model, QAbstractItemModelTester.FailureReportingMode.Fatal)
+
+    # 关键词行出现：在笔记行下插入子行
+    manager.tag_notes([second], ['甲'])
+    model.refresh_note(second)
+    assert log.take() == [('inserted', second, 0, 0), ('changed', None, 1, 1, second)]
+    child = model.index(0, 0, model.index_for_note(second))
+    assert model.data(child) == '关键词: 甲'
+
+    # 关键词变化：子行和笔记行都通知刷新
+    manager.tag_notes([second], ['乙'])
+    model.refresh_note(second)
+    assert log.take() == [('changed', second, 0, 0, second), ('changed', None, 1, 1, second)]
+    assert model.data(child) in ('关键词: 甲, 乙', '关键词: 乙, 甲')
+
+    # 关键词行消失：删除子行
+    manager.untag_notes([second], ['甲', '乙'])
+    model.refresh_note(second)
+    assert log.take() == [('removed', second, 0, 0), ('changed', None, 1, 1, second)]
+    assert model.rowCount(model.index_for_note(second)) == 0
+
+    # 标题修改只刷新该行；没有变化时不发通知
+    db.update_note(third, title='改名')
+    model.refresh_note(third)
+    model.refresh_note(third)
+    assert log.take() == [('changed', None, 2, 2, third)]
+
+    db.delete_note(first)
+    assert model.refresh_note(first) is None
+    assert log.take() == [('removed', None, 0, 0)]
+    assert titles(model) == ['笔记1', '改名']
+
+
+def test_refresh_diffs_loaded_range(db, make_model):
+    first, second, third, fourth = add_notes(db, 4)
+    model, log = make_model(page_size=3)
+    model.fetchMore(QModelIndex())
+    log.take()
+
+    # 批量变更后只对已加载范围内变化的行发通知，未加载的第四条不受影响
+    db.delete_note(first)
+    db.update_note(third, title='改名')
+    db.update_note(fourth, title='未加载')
+    model.refresh()
+    assert log.take() == [('removed', None, 0, 0), ('changed', None, 1, 1, third)]
+    assert titles(model) == ['笔记1', '改名']
+    assert model.canFetchMore(QModelIndex())
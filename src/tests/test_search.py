@@ -0,0 +1,63 @@
+from src.core.note_body import decompress_text
+
+
+def test_search_returns_snippet_of_match(db):
+    # 命中的词远在预览之外，结果中的片段仍应包含它
+    content = '无关的开头内容。' * 200 + '这里提到了全文检索的关键词。'
+    note_id = db.add_note('标题', content, url='https://example.com/a')
+    results = db.search_notes('全文检索')
+    assert [note['id'] for note in results] == [note_id]
+    assert '全文检索' in results[0]['content']
+    assert len(results[0]['content']) < len(content)
+
+
+def test_search_without_snippets_uses_preview(db):
+    content = '无关的开头内容。' * 200 + '这里提到了全文检索的关键词。'
+    db.add_note('标题', content, url='https://example.com/a')
+    results = db.search_notes('全文检索', snippets=False)
+    assert results[0]['content'] == content[:len(results[0]['content'])]
+
+
+def test_title_only_match(db):
+    db.add_note('全文检索入门', '正文', url='https://example.com/a')
+    assert db.search_notes('全文检索')[0]['content'] == '正文'
+
+
+def count_body_reads(db):
+    # 用计数的包装替换 note_text()，统计查询中解压正文的次数
+    calls = []
+
+    def note_text(body):
+        calls.append(1)
+        return decompress_text(body)
+
+    db.conn.create_function('note_text', 1, note_text, deterministic=True)
+    return calls
+
+
+def test_short_keyword_uses_bigram_index(db):
+    body = db.add_note('标题', '无关的开头内容。' * 200 + '这里讲的是索引。', url='https://example.com/a')
+    title = db.add_note('索引入门', '正文', url='https://example.com/b')
+    keyword = db.add_note('其他', '正文', url='https://example.com/c', keywords=['索引'])
+    db.add_note('无关', '没有命中的内容', url='https://example.com/d')
+    calls = count_body_reads(db)
+    assert [note['id'] for note in db.search_notes('索引')] == [title, body, keyword]
+    assert [note['id'] for note in db.search_notes('讲')] == [body]
+    assert calls == []
+
+
+def test_short_keyword_follows_updates(db):
+    note_id = db.add_note('标题', '第一版正文', url='https://example.com/a')
+    assert [note['id'] for note in db.search_notes('一版')] == [note_id]
+    db.update_note(note_id, content='第二版正文，大小写 AB')
+    assert db.search_notes('一版') == []
+    assert [note['id'] for note in db.search_notes('ab')] == [note_id]
+    db.delete_note(note_id)
+    assert db.search_notes('二版') == []
+    db.cursor.execute("INSERT INTO note_bigrams (note_bigrams) VALUES ('integrity-check')")
+
+
+def test_short_keyword_wildcards_are_literal(db):
+    db.add_note('百分之百', '正文', url='https://example.com/a')
+    assert db.search_notes('%') == []
+    assert db.search_notes('_') == []
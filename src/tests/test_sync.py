@@ -0,0 +1,71 @@
+from src.core.database import Database, reset_database_id
+
+
+def upload(db, tmp_path, name):
+    # 模拟上传到云端再被其他客户端下载：得到上传方数据库的一份快照
+    path = str(tmp_path / name)
+    db.snapshot_to(path)
+    return path
+
+
+def merge(local_db, cloud_path):
+    cloud_db = Database(cloud_path, journal_mode=None)
+    try:
+        local_db.merge_from(cloud_db)
+    finally:
+        cloud_db.close()
+
+
+def note_titles(db):
+    return sorted(row['title'] for row in db.cursor.execute('SELECT title FROM notes'))
+
+
+def test_merge_ignores_clock_skew(open_db, tmp_path):
+    fast, slow, reader = open_db('fast.db'), open_db('slow.db'), open_db('reader.db')
+    # fast 的时钟快了很多，reader 合并它上传的库之后，旧实现会把水位推到这个时间
+    fast.add_note('来自快时钟', '正文', url='https://example.com/fast')
+    fast.cursor.execute("UPDATE notes SET updated_at = 4102444800000")
+    fast.conn.commit()
+    merge(reader, upload(fast, tmp_path, 'cloud1.db'))
+    merge(slow, upload(fast, tmp_path, 'cloud2.db'))
+
+    # slow 的时钟落后，新笔记的 updated_at 早于 reader 见过的任何时间，仍须被合并
+    slow.add_note('来自慢时钟', '正文', url='https://example.com/slow')
+    slow.cursor.execute("UPDATE notes SET updated_at = 1000 WHERE title = '来自慢时钟'")
+    slow.conn.commit()
+    merge(reader, upload(slow, tmp_path, 'cloud3.db'))
+    assert note_titles(reader) == ['来自快时钟', '来自慢时钟']
+
+
+def test_watermark_is_per_peer(open_db, tmp_path):
+    first, second, reader = open_db('first.db'), open_db('second.db'), open_db('reader.db')
+    for index in range(3):
+        first.add_note(f'first {index}', '正文', url=f'https://example.com/first/{index}')
+    merge(reader, upload(first, tmp_path, 'cloud1.db'))
+    assert reader.get_sync_watermark(first.get_database_id()) == first.get_change_seq()
+
+    # second 的变更序号比 first 小，不能被 first 的水位挡住
+    second.add_note('second', '正文', url='https://example.com/second')
+    assert second.get_change_seq() < first.get_change_seq()
+    merge(reader, upload(second, tmp_path, 'cloud2.db'))
+    assert 'second' in note_titles(reader)
+
+
+def test_changes_since_watermark(open_db):
+    db = open_db('a.db')
+    note_id = db.add_note('a', '正文', url='https://example.com/a', keywords=['k'])
+    seq = db.get_change_seq()
+    assert db.get_changes_since(seq) == {'notes': [], 'keywords': [], 'links': [], 'tombstones': []}
+
+    db.delete_note(note_id)
+    changes = db.get_changes_since(seq)
+    assert 'notes' in {t['table_name'] for t in changes['tombstones']}
+    assert changes['notes'] == []
+
+
+def test_downloaded_copy_gets_new_identity(open_db, tmp_path):
+    db = open_db('a.db')
+    path = upload(db, tmp_path, 'copy.db')
+    reset_database_id(path)
+    copy = open_db('copy.db')
+    assert copy.get_database_id() not in (None, db.get_database_id())
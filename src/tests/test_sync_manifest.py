@@ -0,0 +1,68 @@
+import os
+from src.core.sync_manifest import SyncManifest
+from src.tests.fake_oss import FakeMeta
+
+
+def write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def test_fresh_manifest_is_stale(tmp_path):
+    path = str(tmp_path / 'notes.db')
+    write(path, b'data')
+    manifest = SyncManifest(path)
+    assert manifest.local_changed()
+    assert manifest.cloud_changed(FakeMeta(1, 'A', 4))
+    assert manifest.cloud_changed(None)
+
+
+def test_recorded_state_is_current(tmp_path):
+    path = str(tmp_path / 'notes.db')
+    write(path, b'data')
+    SyncManifest(path).record(FakeMeta(1, 'A', 4))
+    # 重新加载后仍以记录的状态为准
+    manifest = SyncManifest(path)
+    assert not manifest.local_changed()
+    assert not manifest.cloud_changed(FakeMeta(1, 'A', 4))
+    assert manifest.cloud_changed(FakeMeta(2, 'A', 4))
+    assert manifest.cloud_changed(FakeMeta(1, 'B', 4))
+
+
+def test_local_edit_is_detected(tmp_path):
+    path = str(tmp_path / 'notes.db')
+    write(path, b'data')
+    manifest = SyncManifest(path)
+    manifest.record(FakeMeta(1, 'A', 4))
+    write(path, b'more data')
+    assert manifest.local_changed()
+
+
+def test_touch_without_change_refreshes_stat(tmp_path):
+    path = str(tmp_path / 'notes.db')
+    write(path, b'data')
+    manifest = SyncManifest(path)
+    manifest.record(FakeMeta(1, 'A', 4))
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    # 内容未变只是 mtime 变化：按哈希判断为未修改，并记下新的 stat，下次不必重新哈希
+    assert not manifest.local_changed()
+    assert SyncManifest(path).data['local_mtime_ns'] == stat.st_mtime_ns + 10 ** 9
+
+
+def test_non_empty_wal_means_local_changes(tmp_path):
+    path = str(tmp_path / 'notes.db')
+    write(path, b'data')
+    manifest = SyncManifest(path)
+    manifest.record(FakeMeta(1, 'A', 4))
+    write(path + '-wal', b'')
+    assert not manifest.local_changed()
+    write(path + '-wal', b'frame')
+    assert manifest.local_changed()
+
+
+def test_corrupt_manifest_forces_sync(tmp_path):
+    path = str(tmp_path / 'notes.db')
+    write(path, b'data')
+    write(path + '.sync.json', b'{not json')
+    assert SyncManifest(path).local_changed()
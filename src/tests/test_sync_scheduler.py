@@ -0,0 +1,131 @@
+import time
+import threading
+import pytest
+from PyQt5.QtCore import QCoreApplication
+from src.gui import sync_worker
+from src.gui.sync_worker import SyncScheduler
+
+
+class FakeCloudStorage:
+    # outcomes 依次决定每次同步成功（None）或抛出的异常；用完后一律成功
+    def __init__(self, outcomes=()):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def needs_sync(self):
+        return True
+
+    def sync_database(self, db_path, progress_callback=None, status_callback=None):
+        with self.lock:
+            self.calls += 1
+            outcome = self.outcomes.pop(0) if self.outcomes else None
+        if outcome:
+            raise outcome
+
+
+@pytest.fixture
+def make_scheduler(qapp):
+    schedulers = []
+
+    def make(cloud_storage, delay_ms=50):
+        scheduler = SyncScheduler(cloud_storage, 'notes.db', delay_ms=delay_ms)
+        schedulers.append(scheduler)
+        return scheduler
+
+    yield make
+    for scheduler in schedulers:
+        scheduler.stop()
+
+
+def process_events(seconds):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        QCoreApplication.processEvents()
+        time.sleep(0.005)
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, '等待超时'
+        QCoreApplication.processEvents()
+        time.sleep(0.005)
+
+
+def test_debounce_coalesces_writes(make_scheduler):
+    cloud = FakeCloudStorage()
+    scheduler = make_scheduler(cloud, delay_ms=200)
+    results = []
+    scheduler.sync_finished.connect(lambda success, message: results.append(success))
+
+    # 静默期内的连续写操作不断重新计时，最终只同步一次
+    for _ in range(5):
+        scheduler.schedule_sync()
+        process_events(0.02)
+    assert cloud.calls == 0
+    wait_until(lambda: results)
+    process_events(0.2)
+    assert cloud.calls == 1
+    assert results == [True]
+    assert not scheduler.pending
+
+
+def test_write_during_sync_triggers_one_more_sync(make_scheduler):
+    cloud = FakeCloudStorage()
+    scheduler = make_scheduler(cloud)
+    results = []
+    scheduler.sync_finished.connect(lambda success, message: results.append(success))
+
+    scheduler.sync_now()
+    # 同步进行中的写操作只标记待同步，完成后再同步一次
+    scheduler.schedule_sync()
+    scheduler.schedule_sync()
+    wait_until(lambda: len(results) == 2)
+    process_events(0.2)
+    assert cloud.calls == 2
+
+
+def test_retry_backoff_grows_and_resets(make_scheduler, monkeypatch):
+    monkeypatch.setattr(sync_worker, 'RETRY_BASE_DELAY_MS', 10)
+    monkeypatch.setattr(sync_worker, 'RETRY_MAX_DELAY_MS', 40)
+    cloud = FakeCloudStorage([OSError('离线')] * 4)
+    scheduler = make_scheduler(cloud)
+    delays = []
+    results = []
+
+    def on_finished(success, message):
+        results.append(success)
+        if not success:
+            delays.append(scheduler.retry_timer.interval())
+
+    scheduler.sync_finished.connect(on_finished)
+    scheduler.sync_now()
+    wait_until(lambda: results[-1:] == [True])
+    # 失败后按指数退避重试，封顶后保持不变；成功后清零
+    assert delays == [10, 20, 40, 40]
+    assert results == [False] * 4 + [True]
+    assert scheduler.retry_count == 0
+
+    cloud.outcomes = [OSError('离线')]
+    scheduler.sync_now()
+    wait_until(lambda: len(results) == 7)
+    assert delays[4:] == [10]
+
+
+def test_write_during_backoff_waits_for_retry(make_scheduler, monkeypatch):
+    monkeypatch.setattr(sync_worker, 'RETRY_BASE_DELAY_MS', 300)
+    cloud = FakeCloudStorage([OSError('离线')])
+    scheduler = make_scheduler(cloud, delay_ms=10)
+    results = []
+    scheduler.sync_finished.connect(lambda success, message: results.append(success))
+
+    scheduler.sync_now()
+    wait_until(lambda: results == [False])
+    # 退避期间的写操作不启动防抖计时，由重试统一处理
+    scheduler.schedule_sync()
+    assert not scheduler.debounce_timer.isActive()
+    process_events(0.1)
+    assert cloud.calls == 1
+    wait_until(lambda: results == [False, True])
+    assert cloud.calls == 2
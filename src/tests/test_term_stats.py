@@ -0,0 +1,66 @@
+from src.core.keyword_suggester import suggest_keywords
+from src.core.migrations import rebuild_term_stats
+from src.core.text_analysis import tokenize
+
+
+def current_stats(db):
+    # 文档频率为 0 的词在评分时等价于不存在，比较时忽略
+    db.cursor.execute('SELECT term, df FROM term_stats WHERE df > 0')
+    terms = {row['term']: row['df'] for row in db.cursor.fetchall()}
+    return db.get_corpus_stat('doc_count'), terms
+
+
+def assert_matches_rebuild(db):
+    # 触发器增量维护的结果应与全量重新统计一致
+    incremental = current_stats(db)
+    rebuild_term_stats(db.cursor)
+    assert current_stats(db) == incremental
+    return incremental
+
+
+def test_stats_follow_insert_update_delete(db):
+    first = db.add_note('Python', 'python sqlite trigger python', url='https://example.com/1')
+    second = db.add_note('SQLite', 'sqlite index', url='https://example.com/2')
+    doc_count, terms = assert_matches_rebuild(db)
+    assert doc_count == 2
+    assert terms == {'python': 1, 'sqlite': 2, 'trigger': 1, 'index': 1}
+
+    # 修改正文：旧词减一，新词加一，笔记总数不变
+    assert db.update_note(first, content='rust trigger')
+    doc_count, terms = assert_matches_rebuild(db)
+    assert doc_count == 2
+    assert terms == {'rust': 1, 'sqlite': 1, 'trigger': 1, 'index': 1}
+
+    # 只改标题不影响正文的统计
+    db.update_note(second, title='改名')
+    assert assert_matches_rebuild(db) == (doc_count, terms)
+
+    assert db.delete_note(second)
+    doc_count, terms = assert_matches_rebuild(db)
+    assert doc_count == 1
+    assert terms == {'rust': 1, 'trigger': 1}
+
+
+def test_batch_insert_updates_stats(db):
+    contents = ['机器学习入门，机器学习的基本概念', '深度学习与机器学习', 'database index design']
+    db.add_notes([{'title': f'笔记{index}', 'content': content, 'url': f'https://example.com/{index}'}
+                  for index, content in enumerate(contents)])
+    doc_count, terms = assert_matches_rebuild(db)
+    assert doc_count == 3
+    for term in set(tokenize(contents[1])):
+        assert terms[term] == sum(term in set(tokenize(content)) for content in contents)
+
+
+def test_get_term_frequencies(db):
+    first = db.add_note('a', 'alpha beta', url='https://example.com/1')
+    db.add_note('b', 'beta gamma', url='https://example.com/2')
+    db.delete_note(first)
+    # 删除后减到 0 的词不再返回
+    assert db.get_term_frequencies(['alpha', 'beta', 'missing']) == (1, {'beta': 1})
+
+
+def test_rare_terms_rank_higher(db):
+    for index in range(5):
+        db.add_note(f'笔记{index}', 'common words database', url=f'https://example.com/{index}')
+    suggestions = suggest_keywords(db, 'database database common words transformer transformer')
+    assert suggestions[0] == 'transformer'
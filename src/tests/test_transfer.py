@@ -0,0 +1,116 @@
+import os
+import threading
+import pytest
+from src.core.transfer import ProgressTracker, TransferEngine
+from src.tests.fake_oss import FakeBucket
+
+# oss2 要求分片不小于 100KB
+PART_SIZE = 100 * 1024
+PARTS = 5
+
+
+class FlakyBucket(FakeBucket):
+    # 第 fail_part 个分片第一次传输时失败，模拟传输中途断线
+    def __init__(self, fail_part):
+        super().__init__()
+        self.fail_part = fail_part
+        self.failed = False
+        self.uploaded_parts = []
+        self.downloaded_ranges = []
+
+    def maybe_fail(self, part_number):
+        if part_number == self.fail_part and not self.failed:
+            self.failed = True
+            raise ConnectionError('断线')
+
+    def upload_part(self, key, upload_id, part_number, data, headers=None):
+        self.maybe_fail(part_number)
+        self.uploaded_parts.append(part_number)
+        return super().upload_part(key, upload_id, part_number, data, headers)
+
+    def get_object(self, key, byte_range=None, headers=None, params=None):
+        if byte_range:
+            self.maybe_fail(byte_range[0] // PART_SIZE + 1)
+            self.downloaded_ranges.append(byte_range)
+        return super().get_object(key, byte_range, headers, params)
+
+
+def make_engine(bucket, tmp_path):
+    # 单线程保证分片按顺序传输，失败点确定
+    return TransferEngine(bucket, str(tmp_path / 'checkpoints'), part_size=PART_SIZE,
+                          num_threads=1, multipart_threshold=PART_SIZE)
+
+
+def payload():
+    return os.urandom(PART_SIZE * PARTS)
+
+
+def test_upload_resumes_from_checkpoint(tmp_path):
+    bucket = FlakyBucket(fail_part=3)
+    engine = make_engine(bucket, tmp_path)
+    data = payload()
+    source = tmp_path / 'notes.db'
+    source.write_bytes(data)
+
+    with pytest.raises(ConnectionError):
+        engine.upload_file('notes.db', str(source))
+    assert bucket.uploaded_parts == [1, 2]
+    assert 'notes.db' not in bucket.objects
+
+    progress = []
+    engine.upload_file('notes.db', str(source), progress_callback=lambda consumed, total: progress.append((consumed, total)))
+    # 续传只补传剩余分片，进度从已完成的字节数起步
+    assert bucket.uploaded_parts == [1, 2, 3, 4, 5]
+    assert bucket.objects['notes.db'][0] == data
+    assert progress[0] == (2 * PART_SIZE, len(data))
+    assert progress[-1] == (len(data), len(data))
+    assert [consumed for consumed, _ in progress] == sorted(consumed for consumed, _ in progress)
+    assert not os.listdir(tmp_path / 'checkpoints' / 'upload')
+
+
+def test_download_resumes_from_checkpoint(tmp_path):
+    bucket = FlakyBucket(fail_part=4)
+    engine = make_engine(bucket, tmp_path)
+    data = payload()
+    bucket.put_object('notes.db', data)
+    target = tmp_path / 'notes.db'
+
+    with pytest.raises(ConnectionError):
+        engine.download_file('notes.db', str(target))
+    assert len(bucket.downloaded_ranges) == 3
+    assert not target.exists()
+
+    progress = []
+    engine.download_file('notes.db', str(target), progress_callback=lambda consumed, total: progress.append((consumed, total)))
+    assert [start for start, _ in bucket.downloaded_ranges[3:]] == [3 * PART_SIZE, 4 * PART_SIZE]
+    assert target.read_bytes() == data
+    assert progress[0] == (3 * PART_SIZE, len(data))
+    assert progress[-1] == (len(data), len(data))
+    assert not os.listdir(tmp_path / 'checkpoints' / 'download')
+
+
+def test_progress_tracker_sums_parallel_transfers(tmp_path):
+    engine = TransferEngine(FakeBucket(), str(tmp_path / 'checkpoints'), num_threads=4)
+    reports = []
+    lock = threading.Lock()
+
+    def callback(consumed, total):
+        with lock:
+            reports.append((consumed, total))
+
+    tracker = ProgressTracker(100 * 10, callback)
+    engine.map_parallel(lambda _: [tracker.add(10) for _ in range(10)], range(10))
+    assert tracker.consumed_bytes == 1000
+    assert len(reports) == 100
+    assert sorted(consumed for consumed, _ in reports) == list(range(10, 1001, 10))
+    assert {total for _, total in reports} == {1000}
+
+
+def test_engine_from_env(tmp_path, monkeypatch):
+    monkeypatch.setenv('OSS_PART_SIZE', str(PART_SIZE))
+    monkeypatch.setenv('OSS_TRANSFER_THREADS', '2')
+    monkeypatch.setenv('OSS_MULTIPART_THRESHOLD', '1')
+    engine = TransferEngine.from_env(FakeBucket(), str(tmp_path / 'notes.db'))
+    assert engine.checkpoint_dir == str(tmp_path / '.oss_checkpoints')
+    assert os.path.isdir(engine.checkpoint_dir)
+    assert (engine.part_size, engine.num_threads, engine.multipart_threshold) == (PART_SIZE, 2, 1)
@@ -0,0 +1,18 @@
+def test_related_notes(db):
+    first = db.add_note('机器学习入门', '机器学习是人工智能的分支。机器学习算法训练模型。深度学习 神经网络', url='https://example.com/1')
+    second = db.add_note('深度学习笔记', '深度学习和神经网络是机器学习的重要方法。训练模型需要数据。', url='https://example.com/2')
+    db.add_note('红烧肉做法', '五花肉切块，冰糖炒色，加酱油焖煮一小时。', url='https://example.com/3')
+    assert db.find_related_notes(first, 2)[0]['id'] == second
+
+
+def test_refresh_without_pending_work_takes_no_write_lock(db):
+    db.add_note('标题', '一些正文内容', url='https://example.com/1')
+    assert db.refresh_vectors() == 1
+
+    statements = []
+    db.conn.set_trace_callback(statements.append)
+    try:
+        assert db.refresh_vectors() == 0
+    finally:
+        db.conn.set_trace_callback(None)
+    assert not [statement for statement in statements if statement.strip().upper().startswith('BEGIN')]
@@ -0,0 +1,20 @@
+import hashlib
+import os
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def data_path(*parts):
+    # 缓存等本地文件与数据库放在同一目录（LOCAL_DB_PATH 所在目录，与 <数据库>.vec 一致），不随启动时的工作目录变化；
+    # 调用时才读取环境变量，.env 在此之前已由 cloud_storage / ai_handler 加载
+    db_path = os.path.abspath(os.environ.get('LOCAL_DB_PATH', 'notes.db'))
+    return os.path.join(os.path.dirname(db_path), *parts)
+
+
+def calculate_file_hash(file_path, algorithm='md5', chunk_size=HASH_CHUNK_SIZE):
+    # 分块读取，避免把整个文件读入内存
+    hasher = hashlib.new(algorithm)
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
@@ -0,0 +1,39 @@
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+# 只用于统计来源的参数，不影响页面内容
+TRACKING_PARAMS = {'fbclid', 'gclid', 'dclid', 'msclkid', 'yclid', 'spm', 'from', 'share_source', 'share_medium',
+                   'scene', 'srcid', 'ref', 'ref_src', 'mc_cid', 'mc_eid', 'igshid'}
+
+# 以这些字符开头的锚点是单页应用的路由
+HASH_ROUTE_PREFIXES = ('/', '!')
+
+
+def normalize_url(url):
+    # 同一页面的不同写法归一为同一个字符串：协议和域名小写，去掉默认端口、锚点、跟踪参数和末尾斜杠，参数排序
+    # hash 路由（#/article/1、#!/article/1）指向不同页面，不是锚点，予以保留
+    # 非 http(s) 链接和无法解析的字符串原样返回（去掉首尾空白）
+    if not url:
+        return None
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return url
+
+    host = parts.hostname.rstrip('.')
+    if ':' in host:
+        host = f"[{host}]"
+    if port and port != DEFAULT_PORTS[scheme]:
+        host = f"{host}:{port}"
+    path = parts.path or '/'
+    if len(path) > 1:
+        path = path.rstrip('/')
+    query = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if key.lower() not in TRACKING_PARAMS and not key.lower().startswith('utm_'))
+    fragment = parts.fragment if parts.fragment.startswith(HASH_ROUTE_PREFIXES) else ''
+    return urlunsplit((scheme, host, path, urlencode(query), fragment))